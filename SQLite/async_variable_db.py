@@ -0,0 +1,368 @@
+"""asyncio interface to the SQLite variable management system.
+
+VariableDB methods block while SQLite works, which stalls an event loop
+that drives many agent subprocesses. AsyncVariableDB runs every operation
+on one dedicated I/O thread that owns the SQLite connection. Calls made
+while the thread is busy are queued and then executed together: queued
+writes share a single transaction (one commit instead of one per call)
+and queued ``get_variable`` calls are answered with one query.
+
+Example::
+
+    async with AsyncVariableDB("variables.db") as db:
+        await db.save_variable("agent_1_theme", "spring")
+        themes = await asyncio.gather(*(db.get_variable(f"agent_{i}_theme") for i in range(1, 4)))
+"""
+
+import asyncio
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from variable_db import VariableDB, expiry_time
+
+
+# Upper bound on requests executed together in one batch
+MAX_BATCH_SIZE = 256
+
+# Longest a single blocking wait for changes occupies an executor thread (seconds)
+WAIT_SLICE = 0.5
+
+# Writes that can share one transaction with neighbouring writes
+_BATCHED_WRITES = {"save_variable", "save_variables", "delete_variable"}
+
+
+class _Request:
+    """One queued operation and the future that receives its result."""
+
+    def __init__(self, op: str, args: tuple, future: asyncio.Future):
+        self.op = op
+        self.args = args
+        self.future = future
+
+
+def _resolve(future: asyncio.Future, result=None, error: BaseException | None = None) -> None:
+    """Complete a future on its event loop unless the caller gave up on it."""
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class AsyncVariableDB:
+    """VariableDB whose operations are awaitable and never block the event loop."""
+
+    def __init__(
+        self,
+        db_path: str | Path = "variables.db",
+        timeout: float = 30.0,
+        cache: bool = False,
+        max_batch_size: int = MAX_BATCH_SIZE,
+    ):
+        """Initialize the database and its I/O thread.
+
+        Parameters
+        ----------
+        db_path : str or Path, optional
+            Path to the SQLite database file, by default "variables.db"
+        timeout : float, optional
+            Busy timeout in seconds, by default 30.0
+        cache : bool, optional
+            Enable the VariableDB read cache, by default False
+        max_batch_size : int, optional
+            Maximum number of queued requests executed together, by default 256
+        """
+        self.db = VariableDB(db_path, timeout=timeout, cache=cache)
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self.requests = 0
+        self._queue: queue.SimpleQueue[_Request | None] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._thread_lock = threading.Lock()
+
+    async def __aenter__(self) -> "AsyncVariableDB":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Finish queued requests, stop the I/O thread and close its connection."""
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            await asyncio.get_running_loop().run_in_executor(None, thread.join)
+
+    def _submit(self, op: str, *args) -> asyncio.Future:
+        """Queue an operation for the I/O thread and return its future."""
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="AsyncVariableDB", daemon=True)
+                self._thread.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put(_Request(op, args, future))
+        return future
+
+    def _run(self) -> None:
+        """I/O thread: execute queued requests in batches until close()."""
+        try:
+            while True:
+                request = self._queue.get()
+                if request is None:
+                    return
+                batch = [request]
+                # Everything queued meanwhile is executed together with this request
+                while len(batch) < self.max_batch_size:
+                    try:
+                        request = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if request is None:
+                        self._execute_batch(batch)
+                        return
+                    batch.append(request)
+                self._execute_batch(batch)
+        finally:
+            self.db.close()
+
+    def _execute_batch(self, batch: list[_Request]) -> None:
+        """Execute requests in order, grouping runs of writes and of get_variable calls."""
+        self.batches += 1
+        self.requests += len(batch)
+        start = 0
+        while start < len(batch):
+            op = batch[start].op
+            end = start + 1
+            if op in _BATCHED_WRITES:
+                while end < len(batch) and batch[end].op in _BATCHED_WRITES:
+                    end += 1
+                self._execute_writes(batch[start:end])
+            elif op == "get_variable":
+                while end < len(batch) and batch[end].op == "get_variable":
+                    end += 1
+                self._execute_reads(batch[start:end])
+            else:
+                self._execute_one(batch[start])
+            start = end
+
+    def _execute_one(self, request: _Request) -> None:
+        """Execute a single request with the corresponding VariableDB method."""
+        try:
+            result = getattr(self.db, request.op)(*request.args)
+        except Exception as e:
+            self._complete(request, error=e)
+        else:
+            self._complete(request, result)
+
+    def _execute_reads(self, requests: list[_Request]) -> None:
+        """Answer consecutive get_variable calls with one get_variables query."""
+        if len(requests) == 1:
+            self._execute_one(requests[0])
+            return
+        try:
+            values = self.db.get_variables([request.args[0] for request in requests])
+        except Exception as e:
+            for request in requests:
+                self._complete(request, error=e)
+            return
+        for request in requests:
+            self._complete(request, values[request.args[0]])
+
+    def _execute_writes(self, requests: list[_Request]) -> None:
+        """Apply consecutive writes in submission order within one transaction.
+
+        If the shared transaction fails, it is rolled back and every write is
+        executed on its own, so one invalid request cannot fail the others.
+        """
+        if len(requests) == 1:
+            self._execute_one(requests[0])
+            return
+
+        db = self.db
+
+        def _batch_operation():
+            conn = db._connect()
+            results = []
+            with conn:
+                db._begin_write(conn)
+                for request in requests:
+                    if request.op == "save_variable":
+                        name, value, ttl = request.args
+                        db._write_values(conn, [(name, value)], expiry_time(ttl))
+                        results.append(None)
+                    elif request.op == "save_variables":
+                        variables, ttl = request.args
+                        db._write_values(conn, variables.items(), expiry_time(ttl))
+                        results.append(None)
+                    else:  # delete_variable
+                        results.append(db._delete_rows(conn, "WHERE name = ?", request.args) > 0)
+            return results
+
+        try:
+            results = db._execute_with_retry(_batch_operation, operation_name="async_batch")
+        except (sqlite3.Error, TypeError, ValueError, AttributeError):
+            for request in requests:
+                self._execute_one(request)
+            return
+        finally:
+            db._invalidate_cache()
+        for request, result in zip(requests, results):
+            self._complete(request, result)
+
+    @staticmethod
+    def _complete(request: _Request, result=None, error: BaseException | None = None) -> None:
+        """Hand a result back to the event loop that submitted the request."""
+        request.future.get_loop().call_soon_threadsafe(_resolve, request.future, result, error)
+
+    async def save_variable(self, name: str, value: str, ttl: float | None = None) -> None:
+        """Save or update a variable.
+
+        Parameters
+        ----------
+        name : str
+            Variable name (without the {{}} brackets)
+        value : str
+            Variable value to store
+        ttl : float, optional
+            Seconds until the variable expires, by default never
+        """
+        await self._submit("save_variable", name, value, ttl)
+
+    async def get_variable(self, name: str) -> str:
+        """Retrieve a variable value, or empty string if not found.
+
+        Parameters
+        ----------
+        name : str
+            Variable name (without the {{}} brackets)
+
+        Returns
+        -------
+        str
+            Variable value, or empty string if not found
+        """
+        return await self._submit("get_variable", name)
+
+    async def list_variables(self, prefix: str = "", include_values: bool = True) -> dict[str, str] | list[str]:
+        """List all variables, or those whose names start with a prefix.
+
+        Parameters
+        ----------
+        prefix : str, optional
+            Only list names starting with this prefix, by default all variables
+        include_values : bool, optional
+            If False, return only the sorted names, by default True
+
+        Returns
+        -------
+        Dict[str, str] or List[str]
+            Variable names and values, or just the names
+        """
+        return await self._submit("list_variables", prefix, include_values)
+
+    async def delete_variable(self, name: str) -> bool:
+        """Delete a variable and return whether it existed."""
+        return await self._submit("delete_variable", name)
+
+    async def clear_all(self) -> int:
+        """Delete all variables and return how many were deleted."""
+        return await self._submit("clear_all")
+
+    async def get_variable_info(self, name: str) -> dict[str, str] | None:
+        """Return name, value, created_at and updated_at of a variable, or None."""
+        return await self._submit("get_variable_info", name)
+
+    async def save_variables(self, variables: dict[str, str], ttl: float | None = None) -> None:
+        """Save or update several variables (optionally expiring after ttl seconds) in one transaction."""
+        await self._submit("save_variables", dict(variables), ttl)
+
+    async def get_variables(self, names: list[str]) -> dict[str, str]:
+        """Retrieve several variables with one query."""
+        return await self._submit("get_variables", list(names))
+
+    async def delete_variables(self, names: list[str]) -> int:
+        """Delete several variables in one transaction and return how many were deleted."""
+        return await self._submit("delete_variables", list(names))
+
+    async def delete_prefix(self, prefix: str) -> int:
+        """Delete all variables whose names start with a prefix."""
+        return await self._submit("delete_prefix", prefix)
+
+    async def compare_and_set(self, name: str, expected: str, value: str) -> bool:
+        """Set a variable only if it currently holds the expected value."""
+        return await self._submit("compare_and_set", name, expected, value)
+
+    async def increment(self, name: str, delta: int | float = 1) -> int | float:
+        """Add to a numeric variable atomically and return the new value."""
+        return await self._submit("increment", name, delta)
+
+    async def changes_since(self, seq: int = 0) -> list[dict]:
+        """Return changes after a change sequence number (see VariableDB.changes_since)."""
+        return await self._submit("changes_since", seq)
+
+    async def get_change_seq(self) -> int:
+        """Return the latest change sequence number."""
+        return await self._submit("get_change_seq")
+
+    async def wait_for_changes(
+        self, seq: int = 0, timeout: float | None = None, interval: float = WAIT_SLICE
+    ) -> list[dict]:
+        """Wait until variables change after a sequence number and return the changes.
+
+        The blocking VariableDB.wait_for_changes() sleeps on the same
+        ChangeNotifier as watch_variables.py, so changes are seen within
+        milliseconds of their commit. It runs in the event loop's default
+        executor rather than on the I/O thread, which keeps executing
+        queued operations meanwhile, and in slices of at most ``interval``
+        seconds so that a cancelled wait releases its thread soon.
+
+        Parameters
+        ----------
+        seq : int, optional
+            Last sequence number already processed, by default 0
+        timeout : float, optional
+            Maximum seconds to wait, by default forever
+        interval : float, optional
+            Longest single blocking wait, by default WAIT_SLICE
+
+        Returns
+        -------
+        list[dict]
+            Changes as returned by changes_since(), or [] on timeout
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = interval if deadline is None else max(0.0, min(interval, deadline - time.monotonic()))
+            changes = await loop.run_in_executor(None, self.db.wait_for_changes, seq, wait)
+            if changes or (deadline is not None and time.monotonic() >= deadline):
+                return changes
+
+    async def watch(self, seq: int | None = None, interval: float = WAIT_SLICE):
+        """Yield changes as they are committed.
+
+        Parameters
+        ----------
+        seq : int, optional
+            Change sequence number to start after, by default the current one
+            (only future changes are reported); 0 replays the current state first
+        interval : float, optional
+            Longest single blocking wait (see wait_for_changes()), by default WAIT_SLICE
+
+        Yields
+        ------
+        dict
+            Changes as returned by changes_since(): seq, name, value, deleted
+        """
+        if seq is None:
+            seq = await self.get_change_seq()
+        while True:
+            changes = await self.wait_for_changes(seq, interval=interval)
+            for change in changes:
+                yield change
+            seq = changes[-1]["seq"]
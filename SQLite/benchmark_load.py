@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""Multi-process load benchmark for the SQLite blackboard implementations.
+
+Spawns N reader and M writer processes against one database file and
+reports throughput, p50/p99 latency, lock errors and database/WAL growth
+for each backend and workload:
+
+Backends
+    variable_db  SQLite/variable_db.py VariableDB
+    audit        audit/audit_logger.py AuditLogger (every write is audit-logged)
+    schema       schema/variable_db.py VariableDB (typed variables)
+    sharded      SQLite/variable_db.py ShardedVariableDB (4 shard files)
+    log          SQLite/log_variable_db.py LogVariableDB (append-only memory-mapped log)
+
+Workloads
+    haiku     per-agent keys (agent_N_theme / agent_N_haiku), uniform access
+    ensemble  one large shared article read by everyone, one summary key per writer
+    dice      a handful of hot game-state keys (assets, round, ...), Zipf-skewed
+
+Results can be written as JSON (--json) for regression tracking.
+"""
+
+import argparse
+import bisect
+import contextlib
+import importlib
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# Backend name -> (directory, module, class)
+BACKENDS = {
+    "variable_db": ("SQLite", "variable_db", "VariableDB"),
+    "audit": ("audit", "audit_logger", "AuditLogger"),
+    "schema": ("schema", "variable_db", "VariableDB"),
+    "sharded": ("SQLite", "variable_db", "ShardedVariableDB"),
+    "log": ("SQLite", "log_variable_db", "LogVariableDB"),
+}
+
+# Workload name -> key layout, default key distribution and value size (characters)
+WORKLOADS = {
+    "haiku": {"distribution": "uniform", "value_size": 80},
+    "ensemble": {"distribution": "uniform", "value_size": 2000},
+    "dice": {"distribution": "zipf", "value_size": 16},
+}
+
+DICE_KEYS = ["assets", "round", "last_roll", "last_bet", "last_action", "game_over", "history"]
+
+
+def _workload_keys(workload: str, agents: int, writers: int) -> tuple[list[str], list[list[str]]]:
+    """Return the keys readers choose from and, per writer, the keys it writes.
+
+    Parameters
+    ----------
+    workload : str
+        Workload name
+    agents : int
+        Number of simulated agents for per-agent keys
+    writers : int
+        Number of writer processes
+
+    Returns
+    -------
+    tuple[list[str], list[list[str]]]
+        Reader key space (hottest first for Zipf) and write keys per writer
+    """
+    if workload == "haiku":
+        keys = [f"agent_{i}_{kind}" for i in range(1, agents + 1) for kind in ("theme", "haiku")]
+        return keys, [keys] * writers
+    if workload == "ensemble":
+        summaries = [f"summary_{writer}" for writer in range(1, writers + 1)]
+        return ["article"] + summaries, [[summary] for summary in summaries]
+    return DICE_KEYS, [DICE_KEYS] * writers
+
+
+def _open_backend(backend: str, db_path: str, timeout: float):
+    """Import a backend in this process and open the database."""
+    directory, module_name, class_name = BACKENDS[backend]
+    sys.path.insert(0, str(REPO_DIR / directory))
+    db_class = getattr(importlib.import_module(module_name), class_name)
+    # schema/variable_db.py reports which schema definitions it loaded
+    with contextlib.redirect_stdout(io.StringIO()):
+        return db_class(db_path, timeout=timeout)
+
+
+def _make_values(value_size: int, seed: int) -> list[str]:
+    """Generate a few distinct values of the requested size."""
+    rng = random.Random(seed)
+    return ["".join(rng.choices("abcdefghijklmnopqrstuvwxyz ", k=value_size)) for _ in range(8)]
+
+
+def _setup(backend: str, db_path: str, keys: list[str], value_size: int, timeout: float) -> None:
+    """Create the database and give every key an initial value."""
+    db = _open_backend(backend, db_path, timeout)
+    values = _make_values(value_size, seed=0)
+    for key, value in zip(keys, itertools.cycle(values)):
+        db.save_variable(key, value)
+    db.close()
+
+
+def _worker(
+    role: str,
+    worker_id: int,
+    backend: str,
+    db_path: str,
+    keys: list[str],
+    distribution: str,
+    value_size: int,
+    timeout: float,
+    duration: float,
+    barrier,
+    results,
+) -> None:
+    """Run reads or writes until the deadline and report latencies and errors.
+
+    The database stays open until the parent passes the barrier a second
+    time, after it has measured the files; closing the last connection
+    checkpoints and removes the WAL.
+    """
+    db = _open_backend(backend, db_path, timeout)
+    rng = random.Random(worker_id)
+    values = _make_values(value_size, seed=worker_id)
+    # Zipf: the n-th key is chosen with probability proportional to 1 / n^1.1
+    exponent = 1.1 if distribution == "zipf" else 0.0
+    cumulative = list(itertools.accumulate(1 / rank ** exponent for rank in range(1, len(keys) + 1)))
+
+    def choose() -> str:
+        return keys[bisect.bisect_left(cumulative, rng.random() * cumulative[-1])]
+
+    latencies = []
+    lock_errors = 0
+    other_errors = 0
+    barrier.wait()
+    deadline = time.perf_counter() + duration
+    while True:
+        start = time.perf_counter()
+        if start >= deadline:
+            break
+        try:
+            if role == "writer":
+                db.save_variable(choose(), rng.choice(values))
+            else:
+                db.get_variable(choose())
+        except sqlite3.OperationalError as e:
+            if "locked" in str(e) or "busy" in str(e):
+                lock_errors += 1
+            else:
+                other_errors += 1
+            continue
+        except TimeoutError:
+            # LogVariableDB could not take its file lock in time
+            lock_errors += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+    results.put((role, latencies, lock_errors, other_errors))
+    barrier.wait()
+    db.close()
+
+
+def _file_sizes(db_path: Path) -> dict[str, int]:
+    """Return the total sizes of the database files (including shards) and their WALs in bytes."""
+    db_files = [db_path, *db_path.parent.glob(f"{db_path.stem}.*{db_path.suffix}")]
+    wal_files = [path.with_name(path.name + "-wal") for path in db_files]
+    return {
+        "db_bytes": sum(path.stat().st_size for path in db_files if path.exists()),
+        "wal_bytes": sum(path.stat().st_size for path in wal_files if path.exists()),
+    }
+
+
+def _summarize(role: str, processes: int, samples: list, duration: float) -> dict:
+    """Combine per-process samples of one role into throughput and latency figures."""
+    latencies = sorted(itertools.chain.from_iterable(sample[1] for sample in samples))
+    ops = len(latencies)
+    summary = {
+        "role": role,
+        "processes": processes,
+        "ops": ops,
+        "ops_per_sec": ops / duration,
+        "p50_ms": None,
+        "p99_ms": None,
+        "lock_errors": sum(sample[2] for sample in samples),
+        "other_errors": sum(sample[3] for sample in samples),
+    }
+    if ops >= 2:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        summary["p50_ms"] = cuts[49] * 1000
+        summary["p99_ms"] = cuts[98] * 1000
+    return summary
+
+
+def run_case(backend: str, workload: str, args, tmp_dir: Path) -> dict:
+    """Run one backend/workload combination and return its measurements."""
+    spec = WORKLOADS[workload]
+    distribution = args.distribution or spec["distribution"]
+    value_size = args.value_size or spec["value_size"]
+    read_keys, write_keys = _workload_keys(workload, args.agents, args.writers)
+    db_path = tmp_dir / f"{backend}_{workload}.db"
+
+    ctx = multiprocessing.get_context("spawn")
+    setup = ctx.Process(target=_setup, args=(backend, str(db_path), read_keys, value_size, args.timeout))
+    setup.start()
+    setup.join()
+    if setup.exitcode != 0:
+        raise RuntimeError(f"Setup failed for backend {backend}")
+    sizes_before = _file_sizes(db_path)
+
+    barrier = ctx.Barrier(args.readers + args.writers + 1)
+    results = ctx.Queue()
+    workers = []
+    for worker_id in range(args.readers + args.writers):
+        role = "reader" if worker_id < args.readers else "writer"
+        keys = read_keys if role == "reader" else write_keys[worker_id - args.readers]
+        workers.append(ctx.Process(target=_worker, args=(
+            role, worker_id + 1, backend, str(db_path), keys, distribution, value_size,
+            args.timeout, args.duration, barrier, results,
+        )))
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    samples = [results.get() for _ in workers]
+    sizes_after = _file_sizes(db_path)
+    barrier.wait()
+    for worker in workers:
+        worker.join()
+
+    return {
+        "backend": backend,
+        "workload": workload,
+        "distribution": distribution,
+        "value_size": value_size,
+        "roles": [
+            _summarize(role, count, [s for s in samples if s[0] == role], args.duration)
+            for role, count in (("reader", args.readers), ("writer", args.writers))
+            if count
+        ],
+        "before": sizes_before,
+        "after": sizes_after,
+    }
+
+
+def _format_ms(value: float | None) -> str:
+    """Format a latency in milliseconds, or a dash if there were too few samples."""
+    return "-" if value is None else f"{value:.3f}"
+
+
+def main():
+    """Main entry point for the load benchmark."""
+    parser = argparse.ArgumentParser(
+        description="Multi-process reader/writer load benchmark for the variable databases",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s                                   # All backends and workloads, 4 readers / 2 writers
+  %(prog)s --readers 8 --writers 8 -b variable_db -w dice
+  %(prog)s --value-size 100000 -w ensemble   # Large values
+  %(prog)s -b variable_db -b log -w haiku   # SQLite against the append-only log
+  %(prog)s --json results.json               # Machine-readable output
+        """
+    )
+    parser.add_argument("--readers", "-r", type=int, default=4, help="Reader processes (default: 4)")
+    parser.add_argument("--writers", "-W", type=int, default=2, help="Writer processes (default: 2)")
+    parser.add_argument("--duration", "-t", type=float, default=5.0,
+                        help="Measured seconds per case (default: 5.0)")
+    parser.add_argument("--backend", "-b", choices=sorted(BACKENDS), action="append",
+                        help="Backend to run (default: all)")
+    parser.add_argument("--workload", "-w", choices=sorted(WORKLOADS), action="append",
+                        help="Workload to run (default: all)")
+    parser.add_argument("--agents", "-a", type=int, default=5,
+                        help="Agents in the haiku workload (default: 5)")
+    parser.add_argument("--value-size", type=int,
+                        help="Characters per written value (default: per workload)")
+    parser.add_argument("--distribution", choices=["uniform", "zipf"],
+                        help="Key distribution (default: per workload)")
+    parser.add_argument("--timeout", type=float, default=30.0,
+                        help="Busy timeout in seconds passed to each backend (default: 30.0)")
+    parser.add_argument("--json", metavar="PATH",
+                        help="Also write results as JSON to PATH ('-' for stdout)")
+    args = parser.parse_args()
+
+    backends = args.backend or list(BACKENDS)
+    workloads = args.workload or list(WORKLOADS)
+    report = {
+        "config": {
+            "readers": args.readers,
+            "writers": args.writers,
+            "duration": args.duration,
+            "agents": args.agents,
+            "timeout": args.timeout,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "results": [],
+    }
+
+    out = sys.stderr if args.json == "-" else sys.stdout
+    print(f"{'Backend':<12} | {'Workload':<9} | {'Role':<6} | {'Procs':>5} | {'ops/s':>9} | "
+          f"{'p50 ms':>8} | {'p99 ms':>8} | {'Lock err':>8} | DB / WAL growth (KiB)", file=out)
+    print("-" * 108, file=out)
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in backends:
+            for workload in workloads:
+                result = run_case(backend, workload, args, Path(tmp))
+                report["results"].append(result)
+                growth = (f"{(result['after']['db_bytes'] - result['before']['db_bytes']) / 1024:+.0f} / "
+                          f"{(result['after']['wal_bytes'] - result['before']['wal_bytes']) / 1024:+.0f}")
+                for role in result["roles"]:
+                    print(f"{backend:<12} | {workload:<9} | {role['role']:<6} | {role['processes']:>5} | "
+                          f"{role['ops_per_sec']:>9.0f} | {_format_ms(role['p50_ms']):>8} | "
+                          f"{_format_ms(role['p99_ms']):>8} | {role['lock_errors']:>8} | {growth}", file=out)
+
+    if args.json == "-":
+        print(json.dumps(report, indent=2))
+    elif args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Per-operation overhead microbenchmark for VariableDB and AuditLogger.
+
+Runs 10k and 100k operations (configurable) of each write and read path,
+once one call per operation and once through the batch methods, and
+reports microseconds per operation. The single-call numbers show the fixed
+cost of a transaction plus the Python around it; the batch numbers show
+what is left per operation once that is shared (executemany on one
+prepared statement).
+
+Cases
+    save_variable / save_variables    VariableDB writes
+    get_variable / get_variables      VariableDB reads
+    log_event / log_events            AuditLogger inserts
+
+With --max-us the run fails if any batch case exceeds the bound, so the
+per-operation overhead can be checked in CI.
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from variable_db import VariableDB
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "audit"))
+from audit_logger import AuditLogger, EventType  # noqa: E402
+
+
+def _batches(ops: int, batch_size: int):
+    """Yield (start, stop) ranges covering ops in steps of batch_size."""
+    for start in range(0, ops, batch_size):
+        yield start, min(start + batch_size, ops)
+
+
+def run_cases(db_path: Path, ops: int, batch_size: int, keys: int, value_size: int) -> list[dict]:
+    """Run every case with ``ops`` operations and return their timings."""
+    value = "x" * value_size
+    names = [f"agent_{i % keys}_haiku" for i in range(ops)]
+    events = [
+        {"event_type": EventType.SYSTEM_ACTION, "variable_name": name, "new_value": value, "source": "benchmark"}
+        for name in names
+    ]
+
+    db = VariableDB(db_path)
+    audit = AuditLogger(db_path)
+
+    def save_single():
+        for name in names:
+            db.save_variable(name, value)
+
+    def save_batch():
+        for start, stop in _batches(ops, batch_size):
+            db.save_variables({name: value for name in names[start:stop]})
+
+    def get_single():
+        for name in names:
+            db.get_variable(name)
+
+    def get_batch():
+        for start, stop in _batches(ops, batch_size):
+            db.get_variables(names[start:stop])
+
+    def log_single():
+        for event in events:
+            audit.log_event(**event)
+
+    def log_batch():
+        for start, stop in _batches(ops, batch_size):
+            audit.log_events(events[start:stop])
+
+    cases = [
+        ("save_variable", "single", save_single),
+        ("save_variables", "batch", save_batch),
+        ("get_variable", "single", get_single),
+        ("get_variables", "batch", get_batch),
+        ("log_event", "single", log_single),
+        ("log_events", "batch", log_batch),
+    ]
+    results = []
+    try:
+        for name, kind, function in cases:
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+            results.append({
+                "case": name,
+                "kind": kind,
+                "ops": ops,
+                "seconds": elapsed,
+                "us_per_op": elapsed / ops * 1e6,
+                "ops_per_sec": ops / elapsed,
+            })
+    finally:
+        db.close()
+        audit.close()
+    return results
+
+
+def main():
+    """Main entry point for the microbenchmark."""
+    parser = argparse.ArgumentParser(
+        description="Measure per-operation overhead of single and batched variable/audit operations",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s                          # 10k and 100k operations per case
+  %(prog)s --ops 10000 --batch 100  # Smaller batches
+  %(prog)s --max-us 20 --json -     # Fail if a batch case takes over 20 us/op
+        """
+    )
+    parser.add_argument("--ops", "-n", type=int, action="append",
+                        help="Operations per case; repeat for several sizes (default: 10000 and 100000)")
+    parser.add_argument("--batch", "-b", type=int, default=1000,
+                        help="Operations per batch call (default: 1000)")
+    parser.add_argument("--keys", "-k", type=int, default=1000,
+                        help="Distinct variable names written and read (default: 1000)")
+    parser.add_argument("--value-size", type=int, default=80,
+                        help="Characters per value (default: 80)")
+    parser.add_argument("--max-us", type=float,
+                        help="Exit with status 1 if a batch case exceeds this many microseconds per operation")
+    parser.add_argument("--json", metavar="PATH",
+                        help="Also write results as JSON to PATH ('-' for stdout)")
+    args = parser.parse_args()
+
+    out = sys.stderr if args.json == "-" else sys.stdout
+    report = {"sqlite": sqlite3.sqlite_version, "batch": args.batch, "results": []}
+    print(f"{'Case':<15} | {'Kind':<6} | {'Ops':>7} | {'Seconds':>8} | {'us/op':>8} | {'ops/s':>9}", file=out)
+    print("-" * 68, file=out)
+    with tempfile.TemporaryDirectory() as tmp:
+        for ops in args.ops or [10_000, 100_000]:
+            results = run_cases(Path(tmp) / f"ops_{ops}.db", ops, args.batch, args.keys, args.value_size)
+            report["results"].extend(results)
+            for result in results:
+                print(f"{result['case']:<15} | {result['kind']:<6} | {result['ops']:>7} | {result['seconds']:>8.2f} | "
+                      f"{result['us_per_op']:>8.2f} | {result['ops_per_sec']:>9.0f}", file=out)
+
+    if args.json == "-":
+        print(json.dumps(report, indent=2))
+    elif args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.max_us is not None:
+        slow = [r for r in report["results"] if r["kind"] == "batch" and r["us_per_op"] > args.max_us]
+        for result in slow:
+            print(f"{result['case']} ({result['ops']} ops): {result['us_per_op']:.2f} us/op exceeds {args.max_us}",
+                  file=sys.stderr)
+        if slow:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Throughput benchmark for the SQLite variable management system.
+
+Replays the blackboard access patterns of the multi-haiku/ and hybrid/
+examples against VariableDB and reports operations per second, comparing
+the original one-connection-per-operation behaviour with persistent
+per-thread connections.
+"""
+
+import argparse
+import concurrent.futures
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from variable_db import VariableDB
+
+
+class PerCallConnectionDB(VariableDB):
+    """Baseline that opens a fresh connection for every operation."""
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection instead of reusing the thread's connection."""
+        return sqlite3.connect(self.db_path, timeout=self.timeout)
+
+
+def _run_agent(db: VariableDB, agent_id: int) -> int:
+    """Simulate one haiku agent: read its theme, write its haiku, report back."""
+    theme = db.get_variable(f"agent_{agent_id}_theme")
+    db.save_variable(f"agent_{agent_id}_haiku", f"Haiku about {theme}\nline two\nline three")
+    db.get_variable(f"agent_{agent_id}_haiku")
+    return 3
+
+
+def multi_haiku_workload(db: VariableDB, agent_count: int) -> int:
+    """Replay one run of multi-haiku/haiku-agent.md with sequential agents.
+
+    Returns
+    -------
+    int
+        Number of variable operations performed
+    """
+    ops = 0
+    db.clear_all()
+    db.save_variable("agent_count", str(agent_count))
+    ops += 2
+
+    # Theme distribution
+    for agent_id in range(1, agent_count + 1):
+        db.save_variable(f"agent_{agent_id}_theme", f"Theme {agent_id}")
+        ops += 1
+    db.save_variable("themes", ", ".join(f"Theme {i}" for i in range(1, agent_count + 1)))
+    ops += 1
+
+    # Agents
+    for agent_id in range(1, agent_count + 1):
+        ops += _run_agent(db, agent_id)
+
+    # Evaluation
+    db.get_variable("themes")
+    for agent_id in range(1, agent_count + 1):
+        db.get_variable(f"agent_{agent_id}_haiku")
+    db.save_variable("best_selection", "Haiku 1")
+    ops += agent_count + 2
+    return ops
+
+
+def hybrid_workload(db: VariableDB, agent_count: int) -> int:
+    """Replay one run of hybrid/haiku_orchestrator.py with agents in parallel threads.
+
+    Returns
+    -------
+    int
+        Number of variable operations performed
+    """
+    ops = 0
+    db.clear_all()
+    db.save_variable("agent_count", str(agent_count))
+    ops += 2
+
+    # generate_themes.md
+    db.get_variable("agent_count")
+    for agent_id in range(1, agent_count + 1):
+        db.save_variable(f"agent_{agent_id}_theme", f"Theme {agent_id}")
+    db.save_variable("themes", ", ".join(f"Theme {i}" for i in range(1, agent_count + 1)))
+    ops += agent_count + 2
+
+    # Parallel agents (agent_template.md)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=agent_count) as executor:
+        ops += sum(executor.map(lambda agent_id: _run_agent(db, agent_id), range(1, agent_count + 1)))
+
+    # evaluate_haiku.md
+    db.get_variable("themes")
+    db.get_variable("agent_count")
+    for agent_id in range(1, agent_count + 1):
+        db.get_variable(f"agent_{agent_id}_haiku")
+    db.save_variable("best_selection", "Haiku 1")
+    ops += agent_count + 3
+    return ops
+
+
+WORKLOADS = {
+    "multi-haiku": multi_haiku_workload,
+    "hybrid": hybrid_workload,
+}
+
+
+def measure(db_class: type[VariableDB], workload, db_path: Path, rounds: int, agent_count: int) -> float:
+    """Run a workload repeatedly and return operations per second."""
+    with db_class(db_path) as db:
+        workload(db, agent_count)  # Warm-up round
+        ops = 0
+        start = time.perf_counter()
+        for _ in range(rounds):
+            ops += workload(db, agent_count)
+        elapsed = time.perf_counter() - start
+    return ops / elapsed
+
+
+def main():
+    """Main entry point for the benchmark."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark VariableDB on multi-agent blackboard workloads",
+    )
+    parser.add_argument(
+        "--rounds", "-r",
+        type=int,
+        default=50,
+        help="Number of macro runs per workload (default: 50)"
+    )
+    parser.add_argument(
+        "--agents", "-a",
+        type=int,
+        default=5,
+        help="Number of haiku agents per run (default: 5)"
+    )
+    parser.add_argument(
+        "--workload", "-w",
+        choices=sorted(WORKLOADS),
+        action="append",
+        help="Workload to run (default: all)"
+    )
+    args = parser.parse_args()
+
+    workloads = args.workload or sorted(WORKLOADS)
+    print(f"{'Workload':<12} | {'per-call conn (ops/s)':>22} | {'persistent conn (ops/s)':>24} | Speedup")
+    print("-" * 76)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in workloads:
+            workload = WORKLOADS[name]
+            before = measure(PerCallConnectionDB, workload, Path(tmp_dir) / f"{name}_before.db",
+                             args.rounds, args.agents)
+            after = measure(VariableDB, workload, Path(tmp_dir) / f"{name}_after.db",
+                            args.rounds, args.agents)
+            print(f"{name:<12} | {before:>22.0f} | {after:>24.0f} | {after / before:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Startup and latency benchmark for the resident variable server.
+
+Compares the cost of one variable read as issued from CLAUDE.md:
+
+- direct: ``python -c "from variable_db import get_variable; ..."``
+- client (fallback): ``python variable_client.py get NAME`` with no server
+- client (server): ``python variable_client.py get NAME`` with variable_server.py running
+
+and, for long-lived processes, the in-process latency of VariableDB calls
+versus socket round trips to the server.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from variable_db import VariableDB
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+
+def _time_command(command: list[str], cwd: Path, env: dict, runs: int) -> list[float]:
+    """Run a command repeatedly and return wall-clock times in milliseconds."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, env=env, check=True, stdout=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _time_calls(function, runs: int) -> list[float]:
+    """Call a function repeatedly and return per-call times in milliseconds."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _report(label: str, timings: list[float]) -> None:
+    """Print median and mean latency for one measurement."""
+    print(f"{label:<34} | {statistics.median(timings):>10.3f} | {statistics.fmean(timings):>10.3f}")
+
+
+def _wait_for_socket(socket_path: Path, timeout: float = 10.0) -> None:
+    """Block until the server has created its socket."""
+    deadline = time.monotonic() + timeout
+    while not socket_path.exists():
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Server did not create {socket_path}")
+        time.sleep(0.01)
+
+
+def main():
+    """Main entry point for the benchmark."""
+    parser = argparse.ArgumentParser(
+        description="Compare per-access latency with and without the variable server",
+    )
+    parser.add_argument(
+        "--runs", "-r",
+        type=int,
+        default=20,
+        help="Process launches per path (default: 20)"
+    )
+    parser.add_argument(
+        "--calls", "-n",
+        type=int,
+        default=2000,
+        help="In-process calls per path (default: 2000)"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        db_path = tmp_dir / "variables.db"
+        socket_path = tmp_dir / "variables.db.sock"
+        env = dict(os.environ, PYTHONPATH=str(SCRIPT_DIR), VARIABLE_DB_SOCKET=str(socket_path))
+
+        db = VariableDB(db_path)
+        db.save_variable("bench_value", "spring haiku")
+
+        direct_command = [
+            sys.executable, "-c",
+            "from variable_db import get_variable; print(get_variable('bench_value'))",
+        ]
+        client_command = [sys.executable, str(SCRIPT_DIR / "variable_client.py"), "get", "bench_value"]
+
+        print(f"{'Per-process access':<34} | {'median ms':>10} | {'mean ms':>10}")
+        print("-" * 60)
+        _report("direct (variable_db import)", _time_command(direct_command, tmp_dir, env, args.runs))
+        _report("client, server down (fallback)", _time_command(client_command, tmp_dir, env, args.runs))
+
+        server = subprocess.Popen(
+            [sys.executable, str(SCRIPT_DIR / "variable_server.py"), "--db", str(db_path),
+             "--socket", str(socket_path)],
+            cwd=tmp_dir, env=env, stdout=subprocess.DEVNULL,
+        )
+        try:
+            _wait_for_socket(socket_path)
+            _report("client, server up", _time_command(client_command, tmp_dir, env, args.runs))
+
+            import variable_client
+            variable_client.SOCKET_PATH = str(socket_path)
+
+            print(f"\n{'In-process call':<34} | {'median ms':>10} | {'mean ms':>10}")
+            print("-" * 60)
+            _report("VariableDB.get_variable", _time_calls(lambda: db.get_variable("bench_value"), args.calls))
+            _report("variable_client.get_variable", _time_calls(
+                lambda: variable_client.get_variable("bench_value"), args.calls))
+        finally:
+            server.terminate()
+            server.wait()
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
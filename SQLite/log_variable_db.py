@@ -0,0 +1,533 @@
+"""Append-only, memory-mapped log store for write-heavy agent swarms.
+
+Every VariableDB write updates a B-tree and appends WAL frames. LogVariableDB
+instead appends one record per change to a memory-mapped log file and keeps
+a hash index (name -> position of the latest value) in memory:
+
+- a write copies the record into the mapping and advances the committed end
+  offset in the file header, so several records become visible at once;
+- a read looks the name up in the index and decodes the value from the
+  mapping, without any system call for the data;
+- on open, the index is rebuilt by replaying the log. Every record carries a
+  CRC32, and replay stops at the first torn or corrupt record, so a crash
+  loses at most the writes that had not been committed yet;
+- once superseded records make up most of the file, the live records are
+  copied into a fresh file that atomically replaces the log (compaction).
+
+Processes coordinate with ``flock`` on ``<log>.lock``: writers hold it
+exclusively, readers shared, and every process replays the records other
+processes appended since its last call. Without ``fcntl`` (Windows) only
+threads of one process are coordinated.
+
+Example::
+
+    db = LogVariableDB("variables.log")
+    db.save_variable("agent_1_theme", "spring")
+    db.get_variable("agent_1_theme")
+"""
+
+import contextlib
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+from variable_db import NOTIFY_POLL_INTERVAL, TOMBSTONE_RETENTION, VariableDB, VariableNamespace
+
+try:
+    import fcntl
+except ImportError:  # Windows: threads of one process only
+    fcntl = None
+
+
+# Magic, committed end offset, and a flag set once compaction replaced the file
+_HEADER = struct.Struct("<8sQB")
+_HEADER_SIZE = 64
+_MAGIC = b"VARLOG01"
+
+# CRC32, seq, kind, created_at, updated_at, name length, value length
+_RECORD = struct.Struct("<IQBddII")
+
+_KIND_SAVE = 0
+_KIND_DELETE = 1
+
+# The log file grows in steps of at least this many bytes
+LOG_GROW_BYTES = 1024 * 1024
+
+# Compact once superseded records take up this share of the log ...
+COMPACT_RATIO = 0.5
+# ... and at least this many bytes
+COMPACT_MIN_BYTES = 4 * 1024 * 1024
+
+# Seconds between attempts to take a contended file lock
+_LOCK_POLL_INTERVAL = 0.001
+
+
+def _format_time(timestamp: float) -> str:
+    """Format a Unix time like SQLite's CURRENT_TIMESTAMP (UTC)."""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(timestamp))
+
+
+def _encode_record(seq: int, kind: int, created_at: float, updated_at: float, name: str, value: str = "") -> bytes:
+    """Serialize one log record with its checksum."""
+    name_bytes = name.encode("utf-8")
+    value_bytes = value.encode("utf-8")
+    body = _RECORD.pack(0, seq, kind, created_at, updated_at, len(name_bytes), len(value_bytes))[4:]
+    body += name_bytes + value_bytes
+    return struct.pack("<I", zlib.crc32(body)) + body
+
+
+class LogVariableDB:
+    """Variables in an append-only memory-mapped log with an in-memory index."""
+
+    def __init__(
+        self,
+        db_path: str | Path = "variables.log",
+        timeout: float = 30.0,
+        sync: bool = False,
+        compact_ratio: float = COMPACT_RATIO,
+        compact_min_bytes: int = COMPACT_MIN_BYTES,
+        tombstone_retention: float | None = TOMBSTONE_RETENTION,
+    ):
+        """Open or create the log and rebuild the index.
+
+        Parameters
+        ----------
+        db_path : str or Path, optional
+            Path to the log file, by default "variables.log"
+        timeout : float, optional
+            Seconds to wait for the file lock before raising TimeoutError,
+            by default 30.0
+        sync : bool, optional
+            Flush the mapping to disk after every write, by default False
+            (writes survive a process crash but not a power failure)
+        compact_ratio : float, optional
+            Share of superseded bytes that triggers compaction, by default 0.5
+        compact_min_bytes : int, optional
+            Superseded bytes required before compacting, by default 4 MiB
+        tombstone_retention : float, optional
+            Age in seconds after which compaction drops deletion records, by
+            default TOMBSTONE_RETENTION (one day); None keeps them all
+        """
+        self.db_path = Path(db_path)
+        self.timeout = timeout
+        self.sync = sync
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        self.tombstone_retention = tombstone_retention
+        self.compactions = 0
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._exclusive = False
+        self._file = None
+        self._map = None
+        self._lock_file = None
+        self._open()
+
+    def __enter__(self) -> "LogVariableDB":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Unmap and close the log."""
+        with self._lock:
+            self._close_log()
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    def _open(self) -> None:
+        """Open the lock file and the log, then replay the log into the index."""
+        self._pid = os.getpid()
+        self._lock_file = open(self.db_path.with_name(self.db_path.name + ".lock"), "a+b")
+        with self._locked(exclusive=True):
+            pass
+
+    def _open_log(self) -> None:
+        """Map the current log file, creating it if needed, and replay it (exclusive lock held)."""
+        self._close_log()
+        self._file = open(self.db_path, "a+b")
+        if os.fstat(self._file.fileno()).st_size < _HEADER_SIZE:
+            self._file.truncate(0)
+            self._file.write(_HEADER.pack(_MAGIC, _HEADER_SIZE, 0).ljust(_HEADER_SIZE, b"\0"))
+            self._file.truncate(LOG_GROW_BYTES)
+            self._file.flush()
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, _, _ = _HEADER.unpack_from(self._map)
+        if magic != _MAGIC:
+            raise ValueError(f"{self.db_path} is not a variable log")
+        # name -> (value offset, value length, record size, seq, created_at, updated_at)
+        self._index: dict[str, tuple[int, int, int, int, float, float]] = {}
+        # name -> (seq, Unix time) of the deletion
+        self._tombstones: dict[str, tuple[int, float]] = {}
+        self._seq = 0
+        self._garbage = 0
+        self._end = _HEADER_SIZE
+        self._refresh()
+
+    def _close_log(self) -> None:
+        """Release the mapping and file handle of the log."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive: bool):
+        """Hold the thread lock and the file lock, and catch up with other writers.
+
+        Nested calls reuse the outer lock, so an operation that needs to write
+        must take the exclusive lock at its outermost level.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked child: the parent's file lock and mapping are shared, so reopen
+                self._close_log()
+                self._lock_file.close()
+                self._lock_depth = 0
+                self._open()
+            if self._lock_depth == 0:
+                self._acquire_file_lock(exclusive)
+                self._exclusive = exclusive
+            self._lock_depth += 1
+            try:
+                if self._lock_depth == 1:
+                    self._refresh()
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _acquire_file_lock(self, exclusive: bool) -> None:
+        """Take the flock on the lock file, waiting at most ``timeout`` seconds."""
+        if fcntl is None:
+            return
+        mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fcntl.flock(self._lock_file, mode | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Timed out waiting for the lock on {self.db_path}") from None
+                time.sleep(_LOCK_POLL_INTERVAL)
+
+    def _refresh(self) -> None:
+        """Reopen a compacted log, or replay records committed since the last call."""
+        if self._map is None or self._map[_HEADER.size - 1]:
+            self._open_log()
+            return
+        _, end, _ = _HEADER.unpack_from(self._map)
+        if end > self._end:
+            if end > len(self._map):
+                self._map.close()
+                self._map = mmap.mmap(self._file.fileno(), 0)
+            self._replay(end)
+
+    def _replay(self, end: int) -> None:
+        """Apply the records between the indexed end and ``end`` to the index.
+
+        A record that is cut off or fails its checksum ends the log: it and
+        everything after it were never completely written.
+        """
+        view = self._map
+        offset = self._end
+        while offset + _RECORD.size <= end:
+            crc, seq, kind, created_at, updated_at, name_length, value_length = _RECORD.unpack_from(view, offset)
+            size = _RECORD.size + name_length + value_length
+            if offset + size > end or zlib.crc32(view[offset + 4:offset + size]) != crc:
+                break
+            name_start = offset + _RECORD.size
+            name = view[name_start:name_start + name_length].decode("utf-8")
+            previous = self._index.pop(name, None)
+            if previous is not None:
+                self._garbage += previous[2]
+            if kind == _KIND_SAVE:
+                self._index[name] = (name_start + name_length, value_length, size, seq, created_at, updated_at)
+                self._tombstones.pop(name, None)
+            else:
+                self._tombstones[name] = (seq, updated_at)
+            self._seq = max(self._seq, seq)
+            offset += size
+        if offset < end and self._exclusive:
+            # Recovery: forget the damaged tail so new records follow the last good one
+            _HEADER.pack_into(self._map, 0, _MAGIC, offset, 0)
+        self._end = offset
+
+    def _append(self, records: list[bytes]) -> None:
+        """Append records and commit them together (exclusive lock held)."""
+        data = b"".join(records)
+        end = self._end + len(data)
+        if end > len(self._map):
+            self._map.close()
+            self._file.truncate(max(end, 2 * (end - _HEADER_SIZE), LOG_GROW_BYTES) + _HEADER_SIZE)
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        self._map[self._end:end] = data
+        # Readers only look up to the committed end, so the records appear at once
+        _HEADER.pack_into(self._map, 0, _MAGIC, end, 0)
+        self._replay(end)
+        if self.sync:
+            self._map.flush()
+        if self._garbage >= self.compact_min_bytes and self._garbage >= self.compact_ratio * (self._end - _HEADER_SIZE):
+            self._compact()
+
+    def _save_records(self, variables) -> list[bytes]:
+        """Build save records for (name, value) pairs under consecutive sequence numbers."""
+        now = time.time()
+        records = []
+        for seq, (name, value) in enumerate(variables, self._seq + 1):
+            if not isinstance(value, str):
+                raise TypeError(f"Variable value must be str, not {type(value).__name__}")
+            entry = self._index.get(name)
+            records.append(_encode_record(seq, _KIND_SAVE, entry[4] if entry else now, now, name, value))
+        return records
+
+    def _delete_names(self, names) -> int:
+        """Delete existing variables in one commit and return how many there were (exclusive lock held)."""
+        names = [name for name in dict.fromkeys(names) if name in self._index]
+        now = time.time()
+        if names:
+            self._append([
+                _encode_record(seq, _KIND_DELETE, now, now, name)
+                for seq, name in enumerate(names, self._seq + 1)
+            ])
+        return len(names)
+
+    def _value(self, entry: tuple) -> str:
+        """Decode an index entry's value from the mapping."""
+        return self._map[entry[0]:entry[0] + entry[1]].decode("utf-8")
+
+    def compact(self) -> int:
+        """Rewrite the log with only the latest records and return the bytes released.
+
+        Deletions younger than tombstone_retention are kept so that
+        changes_since() still reports them, and so is the newest one, which
+        may hold the highest sequence number. The new log is written next to
+        the old one, flushed to disk and then renamed over it; other
+        processes notice the replaced-flag in the old header and reopen.
+
+        Returns
+        -------
+        int
+            Log bytes before minus log bytes after compaction
+        """
+        with self._locked(exclusive=True):
+            return self._compact()
+
+    def _compact(self) -> int:
+        """Compaction with the exclusive lock held."""
+        before = self._end
+        tombstones = self._tombstones
+        if self.tombstone_retention is not None and tombstones:
+            cutoff = time.time() - self.tombstone_retention
+            newest = max(tombstones, key=lambda name: tombstones[name][0])
+            tombstones = {
+                name: tombstone for name, tombstone in tombstones.items()
+                if tombstone[1] >= cutoff or name == newest
+            }
+        # (seq, record) pairs; sequence numbers are unique
+        records = [
+            (entry[3], _encode_record(entry[3], _KIND_SAVE, entry[4], entry[5], name, self._value(entry)))
+            for name, entry in self._index.items()
+        ]
+        records += [
+            (seq, _encode_record(seq, _KIND_DELETE, deleted_at, deleted_at, name))
+            for name, (seq, deleted_at) in tombstones.items()
+        ]
+        records.sort()
+        data = b"".join(record for _, record in records)
+        end = _HEADER_SIZE + len(data)
+        temp_path = self.db_path.with_name(self.db_path.name + ".compact")
+        with open(temp_path, "wb") as new_file:
+            new_file.write(_HEADER.pack(_MAGIC, end, 0).ljust(_HEADER_SIZE, b"\0"))
+            new_file.write(data)
+            new_file.truncate(max(2 * end, LOG_GROW_BYTES))
+            new_file.flush()
+            os.fsync(new_file.fileno())
+        os.replace(temp_path, self.db_path)
+        # Tell processes still mapping the old file to reopen
+        self._map[_HEADER.size - 1] = 1
+        self._open_log()
+        self.compactions += 1
+        return before - self._end
+
+    def storage_stats(self) -> dict[str, int | float]:
+        """Return log size, committed bytes, superseded bytes and variable count."""
+        with self._locked(exclusive=False):
+            used = self._end - _HEADER_SIZE
+            return {
+                "file_bytes": len(self._map),
+                "log_bytes": used,
+                "garbage_bytes": self._garbage,
+                "garbage_ratio": self._garbage / used if used else 0.0,
+                "variables": len(self._index),
+                "compactions": self.compactions,
+            }
+
+    def save_variable(self, name: str, value: str) -> None:
+        """Save or update a variable.
+
+        Parameters
+        ----------
+        name : str
+            Variable name (without the {{}} brackets)
+        value : str
+            Variable value to store
+        """
+        with self._locked(exclusive=True):
+            self._append(self._save_records([(name, value)]))
+
+    def get_variable(self, name: str, at: int | str | datetime | None = None) -> str:
+        """Retrieve a variable value, or empty string if not found.
+
+        Parameters
+        ----------
+        name : str
+            Variable name (without the {{}} brackets)
+        at : int, str or datetime, optional
+            Accepted for compatibility with VariableDB; the log keeps no
+            history, so any value other than None raises ValueError
+
+        Returns
+        -------
+        str
+            Variable value, or empty string if not found
+
+        Raises
+        ------
+        ValueError
+            If ``at`` is given
+        """
+        if at is not None:
+            raise ValueError("LogVariableDB keeps no history; get_variable(at=...) needs the sqlite backend")
+        with self._locked(exclusive=False):
+            entry = self._index.get(name)
+            return self._value(entry) if entry else ""
+
+    def get_variable_info(self, name: str) -> dict[str, str] | None:
+        """Return name, value, created_at and updated_at of a variable, or None."""
+        with self._locked(exclusive=False):
+            entry = self._index.get(name)
+            if entry is None:
+                return None
+            return {
+                "name": name,
+                "value": self._value(entry),
+                "created_at": _format_time(entry[4]),
+                "updated_at": _format_time(entry[5]),
+            }
+
+    def list_variables(self, prefix: str = "", include_values: bool = True) -> dict[str, str] | list[str]:
+        """List all variables, or those whose names start with a prefix.
+
+        Parameters
+        ----------
+        prefix : str, optional
+            Only list names starting with this prefix, by default all variables
+        include_values : bool, optional
+            If False, return only the sorted names, by default True
+
+        Returns
+        -------
+        Dict[str, str] or List[str]
+            Variable names and values sorted by name, or just the names
+        """
+        with self._locked(exclusive=False):
+            names = sorted(name for name in self._index if name.startswith(prefix))
+            if include_values:
+                return {name: self._value(self._index[name]) for name in names}
+            return names
+
+    def delete_variable(self, name: str) -> bool:
+        """Delete a variable and return whether it existed."""
+        with self._locked(exclusive=True):
+            return self._delete_names([name]) > 0
+
+    def save_variables(self, variables: dict[str, str]) -> None:
+        """Save or update several variables; they are committed together."""
+        with self._locked(exclusive=True):
+            if variables:
+                self._append(self._save_records(variables.items()))
+
+    def get_variables(self, names: list[str]) -> dict[str, str]:
+        """Retrieve several variables; missing ones map to empty string."""
+        with self._locked(exclusive=False):
+            return {name: self.get_variable(name) for name in names}
+
+    def delete_variables(self, names: list[str]) -> int:
+        """Delete several variables together and return how many existed."""
+        with self._locked(exclusive=True):
+            return self._delete_names(names)
+
+    def delete_prefix(self, prefix: str) -> int:
+        """Delete all variables whose names start with a prefix."""
+        with self._locked(exclusive=True):
+            return self._delete_names([name for name in self._index if name.startswith(prefix)])
+
+    def clear_all(self) -> int:
+        """Delete all variables and return how many were deleted."""
+        return self.delete_prefix("")
+
+    def namespace(self, name: str, separator: str = "_") -> VariableNamespace:
+        """Return a view of the variables named ``name + separator + ...``."""
+        return VariableNamespace(self, name + separator)
+
+    def _read_modify_write(self, name: str, modify) -> tuple[str, str | None]:
+        """Apply ``modify`` to the current value under the exclusive lock (see VariableDB)."""
+        with self._locked(exclusive=True):
+            current = self.get_variable(name)
+            new_value = modify(current)
+            if new_value is not None:
+                self._append(self._save_records([(name, new_value)]))
+            return current, new_value
+
+    # Built on _read_modify_write and get_variables, exactly as in VariableDB
+    compare_and_set = VariableDB.compare_and_set
+    increment = VariableDB.increment
+    update_variable = VariableDB.update_variable
+    render = VariableDB.render
+
+    def changes_since(self, seq: int = 0) -> list[dict]:
+        """Return variables created, updated or deleted after a change sequence number."""
+        with self._locked(exclusive=False):
+            changes = [
+                {"seq": entry[3], "name": name, "value": self._value(entry), "deleted": False}
+                for name, entry in self._index.items()
+                if entry[3] > seq
+            ]
+            changes += [
+                {"seq": deleted_seq, "name": name, "value": None, "deleted": True}
+                for name, (deleted_seq, _) in self._tombstones.items()
+                if deleted_seq > seq
+            ]
+        return sorted(changes, key=lambda change: change["seq"])
+
+    def get_change_seq(self) -> int:
+        """Return the latest change sequence number (0 if nothing has changed yet)."""
+        with self._locked(exclusive=False):
+            return self._seq
+
+    def wait_for_changes(self, seq: int = 0, timeout: float | None = None) -> list[dict]:
+        """Block until variables change after a sequence number, then return the changes ([] on timeout).
+
+        Records are written through the memory map, which inotify does not
+        report, so the change sequence is polled every NOTIFY_POLL_INTERVAL
+        seconds; each poll only replays records appended since the last.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.get_change_seq() <= seq:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return []
+            time.sleep(NOTIFY_POLL_INTERVAL if remaining is None else min(NOTIFY_POLL_INTERVAL, remaining))
+        return self.changes_since(seq)
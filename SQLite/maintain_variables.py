@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Scheduled WAL checkpoint and vacuum maintenance for a variable database.
+
+In WAL mode every commit is appended to the ``-wal`` file, and SQLite can
+only start reusing that file once no reader needs its older contents. A
+watcher or agent that keeps reading can therefore let the WAL grow, and
+every read then has to search a longer WAL index. Running this tool next to
+long-lived deployments keeps the WAL and the database file compact:
+
+- a PASSIVE checkpoint every round (never blocks agents),
+- a TRUNCATE checkpoint once the WAL passes a size threshold,
+- an incremental vacuum once enough pages are free,
+- deletion of expired variables (see save_variable's ttl) and of
+  tombstones older than a day.
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from variable_db import VACUUM_FREE_RATIO, WAL_TRUNCATE_BYTES, VariableDB
+
+
+def format_report(report: dict) -> str:
+    """Summarize one maintain() result on a single line.
+
+    Parameters
+    ----------
+    report : dict
+        Result of VariableDB.maintain()
+
+    Returns
+    -------
+    str
+        WAL size change, checkpoint progress, page counts and vacuum result
+    """
+    before, after, checkpoint = report["before"], report["after"], report["checkpoint"]
+    mib = 1024 * 1024
+    parts = [f"WAL {before['wal_bytes'] / mib:.1f} -> {after['wal_bytes'] / mib:.1f} MiB"]
+    if checkpoint["wal_frames"] >= 0:
+        status = "truncated" if report["truncated"] else ("busy" if checkpoint["busy"] else "ok")
+        parts.append(f"checkpointed {checkpoint['checkpointed_frames']}/{checkpoint['wal_frames']} frames ({status})")
+    parts.append(f"{after['page_count']} pages, {after['free_ratio']:.1%} free ({after['auto_vacuum']} auto-vacuum)")
+    if report["vacuumed_pages"]:
+        parts.append(f"vacuumed {report['vacuumed_pages']} pages")
+    if report["purged"]:
+        parts.append(f"purged {report['purged']} expired variables")
+    if report["pruned_tombstones"]:
+        parts.append(f"pruned {report['pruned_tombstones']} tombstones")
+    return " | ".join(parts)
+
+
+def main():
+    """Main entry point for the maintenance tool."""
+    parser = argparse.ArgumentParser(
+        description="Checkpoint the WAL and vacuum a SQLite variable database",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s                          # One maintenance round
+  %(prog)s --interval 60            # Every minute until Ctrl+C
+  %(prog)s --stats --json           # Only report sizes, as JSON
+  %(prog)s --full-vacuum            # Rebuild and enable incremental auto-vacuum (agents idle)
+        """
+    )
+    parser.add_argument("--db", "-d", default="variables.db",
+                        help="SQLite database file path (default: variables.db)")
+    parser.add_argument("--interval", "-i", type=float, default=0.0,
+                        help="Repeat every N seconds (default: run once)")
+    parser.add_argument("--truncate-wal-mb", type=float, default=WAL_TRUNCATE_BYTES / (1024 * 1024),
+                        help="Truncate the WAL once it reaches this size in MiB (default: %(default)s)")
+    parser.add_argument("--vacuum-ratio", type=float, default=VACUUM_FREE_RATIO,
+                        help="Vacuum once this share of pages is free (default: %(default)s)")
+    parser.add_argument("--busy-timeout", type=float, default=1.0,
+                        help="Seconds a TRUNCATE checkpoint may wait for readers (default: 1.0)")
+    parser.add_argument("--stats", "-s", action="store_true",
+                        help="Only report file sizes and page counts")
+    parser.add_argument("--full-vacuum", action="store_true",
+                        help="Rebuild the database with VACUUM and enable incremental auto-vacuum")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    if not Path(args.db).exists():
+        print(f"Error: Database file '{args.db}' not found.")
+        sys.exit(1)
+
+    db = VariableDB(args.db)
+    try:
+        if args.stats:
+            stats = db.storage_stats()
+            print(json.dumps(stats, indent=2) if args.json else
+                  "\n".join(f"{key}: {value}" for key, value in stats.items()))
+            return
+        if args.full_vacuum:
+            pages = db.vacuum(full=True)
+            print(json.dumps({"vacuumed_pages": pages}) if args.json else f"Rebuilt database, released {pages} pages")
+            return
+
+        while True:
+            report = db.maintain(int(args.truncate_wal_mb * 1024 * 1024), args.vacuum_ratio, args.busy_timeout)
+            if args.json:
+                print(json.dumps(report), flush=True)
+            else:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] {format_report(report)}", flush=True)
+            if args.interval <= 0:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
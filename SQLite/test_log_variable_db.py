@@ -0,0 +1,92 @@
+"""Tests for log_variable_db.py.
+
+Run with ``python -m pytest SQLite``.
+"""
+
+from log_variable_db import LogVariableDB
+
+
+def test_reopen_replays_the_log(tmp_path):
+    path = tmp_path / "variables.log"
+    with LogVariableDB(path) as db:
+        db.save_variables({"theme": "spring", "mood": "calm"})
+        db.save_variable("theme", "autumn")
+        db.delete_variable("mood")
+        seq = db.get_change_seq()
+
+    with LogVariableDB(path) as db:
+        assert db.list_variables() == {"theme": "autumn"}
+        assert db.get_change_seq() == seq
+        assert [(c["name"], c["deleted"]) for c in db.changes_since(0)] == [("theme", False), ("mood", True)]
+        db.save_variable("next", "1")
+        assert db.get_change_seq() == seq + 1
+
+
+def test_torn_record_is_dropped_on_recovery(tmp_path):
+    path = tmp_path / "variables.log"
+    with LogVariableDB(path) as db:
+        db.save_variable("good", "kept")
+        db.save_variable("torn", "half-written")
+
+    # Damage the last record after its commit, as a crash mid-write would
+    data = bytearray(path.read_bytes())
+    offset = data.rfind(b"half-written")
+    data[offset] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    with LogVariableDB(path) as db:
+        assert db.list_variables() == {"good": "kept"}
+        # New records follow the last good one
+        db.save_variable("after", "crash")
+    with LogVariableDB(path) as db:
+        assert db.list_variables() == {"after": "crash", "good": "kept"}
+
+
+def test_compaction_keeps_latest_values(tmp_path):
+    path = tmp_path / "variables.log"
+    with LogVariableDB(path, compact_min_bytes=1024) as db:
+        for i in range(200):
+            db.save_variable("counter", str(i) * 20)
+        db.save_variable("other", "x")
+        db.delete_variable("other")
+        assert db.compactions > 0
+        # Without compaction the log would hold all 200 records of about 90 bytes
+        assert db.storage_stats()["log_bytes"] < 100 * 90
+        seq = db.get_change_seq()
+
+    with LogVariableDB(path) as db:
+        assert db.list_variables() == {"counter": "199" * 20}
+        assert db.get_change_seq() == seq
+        assert [c["name"] for c in db.changes_since(0) if c["deleted"]] == ["other"]
+
+
+def test_compaction_drops_old_tombstones_but_keeps_the_newest(tmp_path):
+    db = LogVariableDB(tmp_path / "variables.log", tombstone_retention=0)
+    db.save_variables({"a": "1", "b": "2", "c": "3", "kept": "x"})
+    db.delete_variables(["a", "b"])
+    db.delete_variable("c")
+    seq = db.get_change_seq()
+
+    db.compact()
+    assert [c["name"] for c in db.changes_since(0) if c["deleted"]] == ["c"]
+    assert db.get_change_seq() == seq
+    db.save_variable("kept", "y")
+    assert db.get_change_seq() == seq + 1
+    db.close()
+
+
+def test_other_instance_reopens_after_compaction(tmp_path):
+    path = tmp_path / "variables.log"
+    first = LogVariableDB(path)
+    second = LogVariableDB(path)
+    first.save_variables({"theme": "spring", "mood": "calm"})
+    first.save_variable("theme", "autumn")
+    assert second.get_variable("theme") == "autumn"
+
+    first.compact()
+    # second still maps the replaced file, whose header flag tells it to reopen
+    assert second.list_variables() == {"mood": "calm", "theme": "autumn"}
+    second.save_variable("mood", "bright")
+    assert first.get_variable("mood") == "bright"
+    first.close()
+    second.close()
@@ -0,0 +1,487 @@
+"""Tests for variable_db.py.
+
+Run with ``python -m pytest SQLite`` after installing ``requirements-test.txt``.
+The MongoDB backend is exercised with mongomock and skipped when mongomock is
+not installed.
+"""
+
+import array
+import asyncio
+import random
+import sqlite3
+import string
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import variable_db
+
+
+def _use_mongomock(monkeypatch):
+    """Make open_variable_db("mongodb") connect to an in-process mongomock server."""
+    mongomock = pytest.importorskip("mongomock")
+    monkeypatch.syspath_prepend(str(Path(__file__).resolve().parent.parent / "mongo"))
+    mongo_variables = pytest.importorskip("mongo_variables")
+    monkeypatch.setattr(mongo_variables, "MongoClient", mongomock.MongoClient)
+
+
+@pytest.fixture(params=["sqlite", "sharded", "memory", "log", "mongodb"])
+def default_db(request, monkeypatch, tmp_path):
+    """Point the module-level functions at a fresh database of every backend open_variable_db() returns."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv(variable_db.SHARDS_ENV_VAR, raising=False)
+    if request.param == "sharded":
+        monkeypatch.setenv(variable_db.BACKEND_ENV_VAR, "sqlite")
+        monkeypatch.setenv(variable_db.SHARDS_ENV_VAR, "3")
+    else:
+        monkeypatch.setenv(variable_db.BACKEND_ENV_VAR, request.param)
+    if request.param == "mongodb":
+        _use_mongomock(monkeypatch)
+    monkeypatch.setattr(variable_db, "_default_db", None)
+    db = variable_db._get_default_db()
+    db.clear_all()
+    yield request.param
+    db.close()
+
+
+def test_module_level_api(default_db):
+    assert isinstance(variable_db._get_default_db(), variable_db.VariableBackend)
+
+    variable_db.save_variable("agent_1_theme", "spring")
+    assert variable_db.get_variable("agent_1_theme") == "spring"
+    assert variable_db.get_variable("missing") == ""
+
+    variable_db.save_variables({"agent_1_haiku": "cherry", "agent_2_haiku": "snow"})
+    assert variable_db.get_variables(["agent_1_haiku", "missing"]) == {"agent_1_haiku": "cherry", "missing": ""}
+    assert variable_db.list_variables("agent_1_") == {"agent_1_haiku": "cherry", "agent_1_theme": "spring"}
+    assert variable_db.render("{{agent_1_theme}}: {{agent_{{N}}_haiku}}", N=2) == "spring: snow"
+
+    assert variable_db.delete_variable("agent_2_haiku") is True
+    assert variable_db.delete_variable("agent_2_haiku") is False
+    assert variable_db.delete_variables(["agent_1_haiku", "missing"]) == 1
+    assert variable_db.list_variables(include_values=False) == ["agent_1_theme"]
+
+
+def test_module_level_atomic_updates(default_db):
+    if default_db == "mongodb":
+        pytest.skip("MongoVariables has no read-modify-write operations")
+    assert variable_db.increment("counter") == 1
+    assert variable_db.increment("counter", 2) == 3
+    assert variable_db.compare_and_set("counter", "3", "done") is True
+    assert variable_db.compare_and_set("counter", "3", "again") is False
+    assert variable_db.update_variable("counter", str.upper) == "DONE"
+
+
+def test_module_level_change_feed(default_db):
+    start = variable_db.get_change_seq()
+    assert variable_db.changes_since(start) == []
+    assert variable_db.wait_for_changes(start, timeout=0.05) == []
+
+    variable_db.save_variable("user_status", "active")
+    changes = variable_db.wait_for_changes(start, timeout=1.0)
+    assert [(c["name"], c["value"], c["deleted"]) for c in changes] == [("user_status", "active", False)]
+
+    # A change's seq is a cursor to resume from, whatever the backend
+    cursor = changes[-1]["seq"]
+    variable_db.delete_variable("user_status")
+    changes = variable_db.changes_since(cursor)
+    assert [(c["name"], c["deleted"]) for c in changes] == [("user_status", True)]
+    assert variable_db.changes_since(changes[-1]["seq"]) == []
+
+    full_state = variable_db.changes_since(0)
+    assert {c["name"] for c in full_state} <= {"user_status"}
+
+
+def test_changes_since_zero_includes_rows_without_seq(tmp_path):
+    db = variable_db.VariableDB(tmp_path / "legacy.db")
+    db.save_variable("new", "1")
+    # Written by an older module that does not know the seq column
+    with db._connect() as conn:
+        conn.execute("INSERT INTO variables (name, value) VALUES ('legacy', 'x')")
+
+    assert [c["name"] for c in db.changes_since(0)] == ["legacy", "new"]
+    assert [c["name"] for c in db.changes_since(db.get_change_seq())] == []
+    db.close()
+
+
+def test_module_level_sqlite_only_operations(default_db, tmp_path):
+    if default_db in ("sqlite", "sharded"):
+        variable_db.save_variables({"a": "1", "b": "2"}, ttl=0.01)
+        time.sleep(0.05)
+        assert variable_db.purge_expired() == 2
+        variable_db.save_array("scores", [1, 2])
+        assert variable_db.get_array("scores").tolist() == [1, 2]
+        return
+
+    with pytest.raises(NotImplementedError, match="ttl is not supported"):
+        variable_db.save_variables({"a": "1"}, ttl=10)
+    with pytest.raises(NotImplementedError, match="ttl is not supported"):
+        variable_db.save_variable("a", "1", ttl=10)
+    for call in (
+        variable_db.purge_expired,
+        lambda: variable_db.snapshot(tmp_path / "snap.db"),
+        lambda: variable_db.restore(tmp_path / "snap.db"),
+        lambda: variable_db.create_checkpoint("c"),
+        lambda: variable_db.save_array("scores", [1, 2]),
+        variable_db.maintain,
+        variable_db.flush,
+    ):
+        with pytest.raises(NotImplementedError, match="not supported by the .* backend"):
+            call()
+    assert variable_db.get_variables(["a"]) == {"a": ""}
+
+
+def test_get_variable_at_requires_history(default_db):
+    if default_db not in ("sqlite", "sharded"):
+        variable_db.save_variable("a", "1")
+        with pytest.raises(ValueError, match="no history"):
+            variable_db.get_variable("a", at=1)
+        return
+    variable_db.enable_history()
+    variable_db.save_variable("a", "1")
+    first = variable_db.changes_since(0)[-1]
+    variable_db.save_variable("a", "2")
+    # Past values are addressed by the sequence number of the variable's own database file
+    assert variable_db.get_variable("a", at=first.get("shard_seq", first["seq"])) == "1"
+    assert variable_db.get_variable("a") == "2"
+
+
+def _tombstones(db):
+    return [name for (name,) in db._connect().execute("SELECT name FROM variable_tombstones ORDER BY seq")]
+
+
+def _age_tombstones(db, seconds):
+    with db._connect() as conn:
+        conn.execute("UPDATE variable_tombstones SET deleted_at = datetime('now', ?)", (f"-{seconds} seconds",))
+
+
+def test_purge_expired_prunes_old_tombstones(tmp_path):
+    db = variable_db.VariableDB(tmp_path / "ttl.db")
+    db.save_variables({f"key_{i}": str(i) for i in range(5)}, ttl=0.01)
+    db.save_variable("kept", "x")
+    time.sleep(0.05)
+
+    assert db.purge_expired() == 5
+    # Recent deletions stay visible to changes_since()
+    assert len(_tombstones(db)) == 5
+
+    _age_tombstones(db, 2 * variable_db.TOMBSTONE_RETENTION)
+    last_seq = db.get_change_seq()
+    assert db.purge_expired() == 0
+    # The newest tombstone holds the highest sequence number and is kept
+    assert _tombstones(db) == ["key_4"]
+    db.save_variable("kept", "y")
+    assert db.get_change_seq() == last_seq + 1
+    db.close()
+
+
+def test_maintain_prunes_tombstones_but_keeps_history(tmp_path):
+    db = variable_db.VariableDB(tmp_path / "maintain.db")
+    db.save_variables({"plain_1": "a", "plain_2": "b", "tracked": "c"})
+    db.delete_variables(["plain_1", "plain_2"])
+    db.enable_history()
+    db.delete_variable("tracked")
+    db.save_variable("other", "d")
+
+    _age_tombstones(db, 60)
+    assert db.maintain()["pruned_tombstones"] == 0
+
+    _age_tombstones(db, 2 * variable_db.TOMBSTONE_RETENTION)
+    report = db.maintain()
+    assert report["pruned_tombstones"] == 2
+    assert _tombstones(db) == ["tracked"]
+    assert db.get_variable("tracked", at=db.get_change_seq()) == ""
+    db.close()
+
+
+def test_async_watch_wakes_on_commit(tmp_path):
+    from async_variable_db import AsyncVariableDB
+
+    async def scenario():
+        async with AsyncVariableDB(tmp_path / "async.db") as db:
+            await db.save_variable("before", "1")
+            changes = db.watch()
+            first = asyncio.ensure_future(changes.__anext__())
+            await asyncio.sleep(0.05)
+            assert not first.done()
+            # Written by another connection, as another process would
+            variable_db.VariableDB(tmp_path / "async.db").save_variable("user_status", "active")
+            change = await asyncio.wait_for(first, timeout=0.2)
+            await changes.aclose()
+            assert await db.wait_for_changes(change["seq"], timeout=0.05) == []
+            return change
+
+    change = asyncio.run(scenario())
+    assert (change["name"], change["value"]) == ("user_status", "active")
+
+
+def test_read_cache_invalidated_by_other_connection(tmp_path):
+    db = variable_db.VariableDB(tmp_path / "cache.db", cache=True)
+    other = variable_db.VariableDB(tmp_path / "cache.db")
+    db.save_variable("theme", "spring")
+
+    assert db.get_variable("theme") == "spring"
+    assert db.get_variable("theme") == "spring"
+    stats = db.cache_stats()
+    assert (stats["misses"], stats["hits"], stats["invalidations"]) == (1, 1, 0)
+
+    # A commit by another connection bumps this connection's PRAGMA data_version
+    other.save_variable("theme", "autumn")
+    assert db.get_variable("theme") == "autumn"
+    assert db.cache_stats()["invalidations"] == 1
+    other.close()
+    db.close()
+
+
+def test_read_cache_respects_ttl(tmp_path):
+    db = variable_db.VariableDB(tmp_path / "cache.db", cache=True)
+    db.save_variable("token", "abc")
+    assert db.get_variable("token") == "abc"
+    db.save_variable("token", "abc", ttl=0.05)
+    assert db.get_variable("token") == "abc"
+    assert db.get_variables(["token"]) == {"token": "abc"}
+    # Expiry is not a write, so expiring values are never served from the cache
+    stats = db.cache_stats()
+    assert (stats["hits"], stats["entries"]) == (0, 0)
+
+    time.sleep(0.1)
+    assert db.get_variable("token") == ""
+    assert db.get_variables(["token"]) == {"token": ""}
+    db.close()
+
+
+def _storage(db, name):
+    conn = db._connect()
+    storage = conn.execute("SELECT storage FROM variables WHERE name = ?", (name,)).fetchone()[0]
+    blobs = conn.execute("SELECT count(*) FROM variable_blobs WHERE name = ?", (name,)).fetchone()[0]
+    return storage, blobs
+
+
+def test_large_values_are_compressed_into_blobs(tmp_path):
+    db = variable_db.VariableDB(tmp_path / "blobs.db", large_value_threshold=100)
+    article = "".join(f"line {i}: the quick brown fox\n" for i in range(1000))
+    db.save_variable("article", article)
+    assert _storage(db, "article") == ("zlib", 1)
+    assert db.get_variable("article") == article
+    assert db.get_variables(["article"]) == {"article": article}
+    assert db.changes_since(0)[0]["value"] == article
+
+    # Short random text does not compress and is stored as is
+    rng = random.Random(0)
+    noise = "".join(rng.choice(string.ascii_letters + string.digits + string.punctuation) for _ in range(120))
+    db.save_variable("noise", noise)
+    assert _storage(db, "noise") == ("raw", 1)
+    assert db.get_variable("noise") == noise
+
+    # Small again: the blob row goes away
+    db.save_variable("article", "short")
+    assert _storage(db, "article") == (None, 0)
+    assert db.get_variable("article") == "short"
+    db.delete_variable("noise")
+    assert db._connect().execute("SELECT count(*) FROM variable_blobs").fetchone()[0] == 0
+    db.close()
+
+
+@pytest.mark.parametrize("size", [50, 200_000], ids=["inline", "blob"])
+def test_get_variable_range(tmp_path, size):
+    db = variable_db.VariableDB(tmp_path / "range.db", large_value_threshold=100)
+    value = "".join(f"{i:06d}é" for i in range(size // 7 + 1))[:size]
+    db.save_variable("text", value)
+
+    for offset, length in [(0, 10), (3, 40), (size - 5, 100), (size // 2, None), (size + 10, 5)]:
+        assert db.get_variable_range("text", offset, length) == value[offset:None if length is None else offset + length]
+    assert db.get_variable_range("missing", 0, 10) == ""
+    db.close()
+
+
+def test_lock_stats_record_waits_for_the_write_lock(tmp_path):
+    db = variable_db.VariableDB(tmp_path / "locks.db")
+    db.save_variable("warm", "up")
+    assert db.lock_stats() == {}
+
+    blocker = sqlite3.connect(tmp_path / "locks.db")
+    blocker.execute("BEGIN IMMEDIATE")
+    writer = threading.Thread(target=db.save_variable, args=("status", "active"))
+    writer.start()
+    time.sleep(0.1)
+    blocker.rollback()
+    blocker.close()
+    writer.join()
+
+    # Pending counters are written with the next write
+    db.save_variable("status", "done")
+    stats = db.lock_stats()
+    assert list(stats) == ["save_variable"]
+    assert stats["save_variable"]["waits"] == 1
+    assert 0.05 < stats["save_variable"]["wait_time"] == stats["save_variable"]["max_wait"]
+    assert (stats["save_variable"]["retries"], stats["save_variable"]["failures"]) == (0, 0)
+    db.close()
+
+
+def test_lock_stats_record_failures(tmp_path):
+    db = variable_db.VariableDB(tmp_path / "locks.db", timeout=0.05)
+    db.save_variable("warm", "up")
+    blocker = sqlite3.connect(tmp_path / "locks.db")
+    blocker.execute("BEGIN IMMEDIATE")
+    with pytest.raises(sqlite3.OperationalError, match="locked"):
+        db.save_variable("status", "active")
+    blocker.rollback()
+    blocker.close()
+
+    # close() saves the counters of a process that makes no further writes
+    db.close()
+    stats = variable_db.VariableDB(tmp_path / "locks.db").lock_stats()
+    assert stats["save_variable"]["failures"] == 1
+
+
+def test_async_writes_accept_ttl(tmp_path):
+    from async_variable_db import AsyncVariableDB
+
+    async def scenario():
+        async with AsyncVariableDB(tmp_path / "async.db") as db:
+            # Submitted together, so they share one batched transaction
+            results = await asyncio.gather(
+                db.save_variable("token", "abc", ttl=0.05),
+                db.save_variables({"a": "1", "b": "2"}, ttl=0.05),
+                db.save_variable("kept", "x"),
+                db.save_variable("bad", "x", ttl=-1),
+                return_exceptions=True,
+            )
+            assert results[:3] == [None, None, None]
+            assert isinstance(results[3], ValueError)
+            assert await db.get_variables(["token", "a", "kept"]) == {"token": "abc", "a": "1", "kept": "x"}
+            await asyncio.sleep(0.1)
+            return await db.list_variables()
+
+    assert asyncio.run(scenario()) == {"kept": "x"}
+
+
+def test_snapshot_and_restore(tmp_path):
+    db = variable_db.VariableDB(tmp_path / "live.db", large_value_threshold=100)
+    db.save_variables({"theme": "spring", "article": "spring " * 100, "removed": "x"})
+    db.save_array("scores", [1, 2, 3])
+    db.snapshot(tmp_path / "snap.db")
+    expected = db.list_variables()
+
+    db.save_variables({"theme": "autumn", "added": "y"})
+    db.delete_variable("removed")
+    cursor = db.get_change_seq()
+
+    assert db.restore(tmp_path / "snap.db") == 4
+    assert db.list_variables() == expected
+    assert db.get_array("scores").tolist() == [1, 2, 3]
+    # The restore is recorded in the change feed like any other write
+    changes = {c["name"]: c["deleted"] for c in db.changes_since(cursor)}
+    assert changes == {"theme": False, "removed": False, "added": True}
+
+    with pytest.raises(FileNotFoundError):
+        db.restore(tmp_path / "missing.db")
+    db.close()
+
+
+def test_restore_from_database_without_blob_table(tmp_path):
+    # A database written before large values moved to variable_blobs
+    with sqlite3.connect(tmp_path / "old.db") as old:
+        old.execute("CREATE TABLE variables (name TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                    "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+        old.execute("INSERT INTO variables (name, value) VALUES ('theme', 'spring'), ('mood', 'calm')")
+    old.close()
+
+    db = variable_db.VariableDB(tmp_path / "live.db")
+    db.save_variables({"theme": "autumn", "extra": "x"})
+    assert db.restore(tmp_path / "old.db") == 2
+    assert db.list_variables() == {"mood": "calm", "theme": "spring"}
+    db.close()
+
+
+def test_checkpoints(tmp_path):
+    db = variable_db.VariableDB(tmp_path / "live.db", large_value_threshold=100)
+    db.save_variables({"turn": "1", "board": "x" * 500})
+    assert db.create_checkpoint("turn_1") == 2
+    db.save_variables({"turn": "2", "board": "o" * 500, "winner": "o"})
+
+    assert set(db.list_checkpoints()) == {"turn_1"}
+    assert db.restore_checkpoint("turn_1") == 2
+    assert db.list_variables() == {"board": "x" * 500, "turn": "1"}
+    with pytest.raises(KeyError):
+        db.restore_checkpoint("turn_2")
+    assert db.delete_checkpoint("turn_1") is True
+    assert db.list_checkpoints() == {}
+    db.close()
+
+
+def test_arrays(tmp_path):
+    db = variable_db.VariableDB(tmp_path / "arrays.db")
+    db.save_array("ints", [1, 2, 3])
+    db.save_array("floats", [0.5, 1.5], typecode="f")
+    matrix = memoryview(array.array("d", range(6))).cast("B").cast("d", (2, 3))
+    db.save_array("matrix", matrix)
+
+    ints = db.get_array("ints")
+    assert (ints.format, ints.tolist()) == ("q", [1, 2, 3])
+    assert db.get_array("floats").tolist() == [0.5, 1.5]
+    assert db.get_array("matrix").tolist() == [[0.0, 1.0, 2.0], [3.0, 4.0, 5.0]]
+    # Text APIs see numbers
+    assert db.get_variable("ints") == "1,2,3"
+    assert db.get_variable("matrix") == "[[0.0, 1.0, 2.0], [3.0, 4.0, 5.0]]"
+
+    # Comma-separated text written by a macro is parsed as doubles
+    db.save_variable("text", "1, 2.5,3")
+    assert db.get_array("text").tolist() == [1.0, 2.5, 3.0]
+    assert db.get_array("missing") is None
+
+    with pytest.raises(ValueError, match="Unsupported array element format"):
+        db.save_array("bad", memoryview(b"ab").cast("c"))
+    db.close()
+
+
+def test_arrays_as_numpy(tmp_path):
+    numpy = pytest.importorskip("numpy")
+    db = variable_db.VariableDB(tmp_path / "arrays.db")
+    db.save_array("matrix", numpy.arange(6, dtype=numpy.int32).reshape(2, 3))
+    result = db.get_array("matrix", as_numpy=True)
+    assert (result.dtype, result.shape) == (numpy.int32, (2, 3))
+    assert result.tolist() == [[0, 1, 2], [3, 4, 5]]
+    db.close()
+
+
+def test_ram_mode_flush(tmp_path):
+    path = tmp_path / "ram.db"
+    variable_db.VariableDB(path).save_variable("theme", "spring")
+
+    db = variable_db.VariableDB(path, mode="ram")
+    assert db.get_variable("theme") == "spring"
+    db.save_variable("theme", "autumn")
+    # Other instances in this process share the in-memory copy; the file is untouched
+    assert variable_db.VariableDB(path, mode="ram").get_variable("theme") == "autumn"
+    assert variable_db.VariableDB(path).get_variable("theme") == "spring"
+
+    assert db.flush() is True
+    assert db.flush() is False
+    assert variable_db.VariableDB(path).get_variable("theme") == "autumn"
+    db.close()
+
+
+def test_ram_mode_flush_refuses_to_overwrite_other_writers(tmp_path):
+    path = tmp_path / "ram.db"
+    db = variable_db.VariableDB(path, mode="ram")
+    db.save_variable("mine", "1")
+    assert db.flush() is True
+
+    variable_db.VariableDB(path).save_variable("theirs", "2")
+    db.save_variable("mine", "3")
+    with pytest.raises(variable_db.FlushConflictError, match="changed by another connection"):
+        db.flush()
+    assert variable_db.VariableDB(path).get_variables(["mine", "theirs"]) == {"mine": "1", "theirs": "2"}
+
+    assert db.flush(force=True) is True
+    assert variable_db.VariableDB(path).get_variables(["mine", "theirs"]) == {"mine": "3", "theirs": ""}
+    db.close()
+
+
+def test_ram_mode_is_not_the_memory_backend(monkeypatch, tmp_path):
+    monkeypatch.setenv(variable_db.MODE_ENV_VAR, "memory")
+    with pytest.raises(ValueError, match="Unknown storage mode: memory"):
+        variable_db.VariableDB(tmp_path / "x.db")
@@ -0,0 +1,99 @@
+"""Tests for variable_server.py and variable_client.py.
+
+Run with ``python -m pytest SQLite``.
+"""
+
+import socket
+import stat
+import threading
+import time
+
+import pytest
+
+import variable_client
+import variable_db
+from variable_server import VariableRequestHandler, VariableServer
+
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    """Point variable_client at a database and socket in a fresh directory."""
+    db_path = tmp_path / "variables.db"
+    # Unix socket paths are limited to about 100 bytes
+    socket_path = tmp_path / "v.sock"
+    monkeypatch.setattr(variable_client, "DB_PATH", str(db_path))
+    monkeypatch.setattr(variable_client, "SOCKET_PATH", str(socket_path))
+    return db_path, socket_path
+
+
+@pytest.fixture
+def server(paths):
+    """Run a VariableServer in a background thread."""
+    db_path, socket_path = paths
+    server = VariableServer(socket_path, variable_db.VariableDB(db_path, cache=True), workers=2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_client_round_trip_through_server(server, paths):
+    db_path, socket_path = paths
+    assert stat.S_IMODE(socket_path.stat().st_mode) == 0o600
+
+    variable_client.save_variable("agent_1_theme", "spring")
+    assert variable_client._call_server("get_variable", ["agent_1_theme"]) == "spring"
+    assert variable_client.list_variables() == {"agent_1_theme": "spring"}
+    assert variable_client.delete_variable("agent_1_theme") is True
+    assert variable_db.VariableDB(db_path).get_variable("agent_1_theme") == ""
+
+
+def test_idle_client_does_not_stall_others(server, paths):
+    _, socket_path = paths
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as idle:
+        idle.connect(str(socket_path))
+        idle.sendall(b'{"op": "get_variable"')  # Never finishes its request line
+        started = time.monotonic()
+        variable_client.save_variable("status", "ok")
+        assert variable_client.get_variable("status") == "ok"
+        # Well below the handler's idle timeout
+        assert time.monotonic() - started < VariableRequestHandler.timeout / 2
+
+
+def test_server_rejects_path_operations(server):
+    with pytest.raises(RuntimeError, match="Unknown operation: snapshot"):
+        variable_client._call_server("snapshot", ["/tmp/stolen.db"])
+    with pytest.raises(RuntimeError, match="Unknown operation: restore"):
+        variable_client._call_server("restore", ["/tmp/stolen.db"])
+
+
+def test_server_refuses_live_socket(server, paths):
+    _, socket_path = paths
+    with pytest.raises(OSError, match="already listening"):
+        VariableServer(socket_path, variable_db.VariableDB(paths[0]))
+    # The running server keeps its socket
+    assert variable_client.get_variable("missing") == ""
+
+
+def test_server_replaces_stale_socket(paths):
+    db_path, socket_path = paths
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(socket_path))
+    stale.close()  # Socket file left behind without a listener
+
+    server = VariableServer(socket_path, variable_db.VariableDB(db_path))
+    try:
+        assert socket_path.exists()
+    finally:
+        server.server_close()
+    assert not socket_path.exists()
+
+
+def test_client_falls_back_without_server(paths):
+    db_path, socket_path = paths
+    assert not socket_path.exists()
+    variable_client.save_variable("action", "bet", 300)
+    assert variable_client.get_variable("action") == "bet"
+    assert variable_db.VariableDB(db_path).get_variable("action") == "bet"
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Lightweight client for the resident variable server.
+
+Only standard modules that the interpreter loads anyway are imported, so a
+call costs little more than interpreter startup plus one socket round trip.
+When variable_server.py is not running, the request falls back to direct
+SQLite access through variable_db.py.
+
+Usage from CLAUDE.md:
+    uv run python variable_client.py set variable_name 'VALUE'
+    uv run python variable_client.py set action 'bet' 300    # expires after 300 seconds
+    uv run python variable_client.py get variable_name
+"""
+
+import json
+import os
+import socket
+import sys
+
+
+DB_PATH = os.environ.get("VARIABLE_DB_PATH", "variables.db")
+SOCKET_PATH = os.environ.get("VARIABLE_DB_SOCKET") or f"{DB_PATH}.sock"
+
+
+def _call_server(op: str, args: list):
+    """Send one request to the variable server and return its result."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(SOCKET_PATH)
+        sock.sendall(json.dumps({"op": op, "args": args}).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as stream:
+            response = json.loads(stream.readline())
+    if not response["ok"]:
+        raise RuntimeError(response["error"])
+    return response["result"]
+
+
+def _call_direct(op: str, args: list):
+    """Execute the request against SQLite in this process."""
+    from variable_db import VariableDB
+
+    with VariableDB(DB_PATH) as db:
+        return getattr(db, op)(*args)
+
+
+def call(op: str, *args):
+    """Invoke a VariableDB operation, preferring the resident server.
+
+    Parameters
+    ----------
+    op : str
+        VariableDB method name, e.g. "get_variable"
+    *args
+        Positional arguments for the method
+
+    Returns
+    -------
+    Any
+        Result of the operation
+    """
+    try:
+        return _call_server(op, list(args))
+    except (FileNotFoundError, ConnectionRefusedError):
+        # Server is not running (or left a stale socket behind)
+        return _call_direct(op, list(args))
+
+
+def save_variable(name: str, value: str, ttl: float | None = None) -> None:
+    """Save a variable (optionally expiring after ttl seconds) through the server, or directly if it is down."""
+    if ttl is None:
+        call("save_variable", name, value)
+    else:
+        call("save_variable", name, value, ttl)
+
+
+def get_variable(name: str) -> str:
+    """Get a variable through the server, or directly if it is down."""
+    return call("get_variable", name)
+
+
+def list_variables() -> dict[str, str]:
+    """List all variables through the server, or directly if it is down."""
+    return call("list_variables")
+
+
+def delete_variable(name: str) -> bool:
+    """Delete a variable through the server, or directly if it is down."""
+    return call("delete_variable", name)
+
+
+def main():
+    """Command-line entry point: get, set, list, delete, clear, purge."""
+    usage = "Usage: variable_client.py get NAME | set NAME VALUE [TTL] | list | delete NAME | clear | purge"
+    args = sys.argv[1:]
+    command = args[0] if args else ""
+
+    if command == "get" and len(args) == 2:
+        print(get_variable(args[1]))
+    elif command == "set" and len(args) in (3, 4):
+        save_variable(args[1], args[2], float(args[3]) if len(args) == 4 else None)
+        print(f'Saved "{args[2]}" to {{{{{args[1]}}}}}')
+    elif command == "list" and len(args) == 1:
+        print(json.dumps(list_variables(), indent=2, ensure_ascii=False))
+    elif command == "delete" and len(args) == 2:
+        print("Deleted" if delete_variable(args[1]) else "Not found")
+    elif command == "clear" and len(args) == 1:
+        print(f"Cleared {call('clear_all')} variables")
+    elif command == "purge" and len(args) == 1:
+        print(f"Purged {call('purge_expired')} expired variables")
+    else:
+        print(usage, file=sys.stderr)
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""Resident variable server for the SQLite variable management system.
+
+Running ``uv run python -c "from variable_db import ..."`` for every variable
+access pays for interpreter startup, module import and database
+initialization each time. This daemon keeps one VariableDB open and serves
+requests over a local Unix domain socket, so that variable_client.py only
+has to send a single line of JSON.
+
+Protocol: one JSON object per line, ``{"op": "get_variable", "args": ["name"]}``,
+answered with ``{"ok": true, "result": ...}`` or ``{"ok": false, "error": "..."}``.
+
+Operations that take filesystem paths (snapshot and restore) are not served;
+anyone able to connect could otherwise read or overwrite arbitrary files with
+the server's permissions. Use named checkpoints instead.
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from variable_db import VariableDB
+
+
+# Operations that clients are allowed to invoke on the wrapped VariableDB
+ALLOWED_OPERATIONS = {
+    "save_variable",
+    "get_variable",
+    "list_variables",
+    "delete_variable",
+    "clear_all",
+    "get_variable_info",
+    "get_variable_range",
+    "save_variables",
+    "get_variables",
+    "delete_variables",
+    "delete_prefix",
+    "compare_and_set",
+    "increment",
+    "changes_since",
+    "get_change_seq",
+    "cache_stats",
+    "create_checkpoint",
+    "restore_checkpoint",
+    "list_checkpoints",
+    "delete_checkpoint",
+    "enable_history",
+    "disable_history",
+    "purge_expired",
+    "get_history",
+    "flush",
+}
+
+# Worker threads serving client connections concurrently
+DEFAULT_WORKERS = 8
+
+
+def default_socket_path(db_path: str | Path) -> Path:
+    """Return the socket path used for a database unless overridden.
+
+    Parameters
+    ----------
+    db_path : str or Path
+        Path to the SQLite database file
+
+    Returns
+    -------
+    Path
+        ``<db_path>.sock``, or the VARIABLE_DB_SOCKET environment variable if set
+    """
+    return Path(os.environ.get("VARIABLE_DB_SOCKET") or f"{db_path}.sock")
+
+
+class VariableRequestHandler(socketserver.StreamRequestHandler):
+    """Serve newline-delimited JSON requests on one client connection."""
+
+    # Drop idle clients so they do not hold on to a worker thread
+    timeout = 5.0
+
+    def handle(self) -> None:
+        """Answer requests until the client closes the connection or goes idle."""
+        try:
+            for line in self.rfile:
+                self.wfile.write(self._dispatch(line) + b"\n")
+                self.wfile.flush()
+        except (TimeoutError, ConnectionError):
+            pass
+
+    def _dispatch(self, line: bytes) -> bytes:
+        """Execute one request line and return the encoded response."""
+        try:
+            request = json.loads(line)
+            op = request["op"]
+            if op not in ALLOWED_OPERATIONS:
+                raise ValueError(f"Unknown operation: {op}")
+            result = getattr(self.server.db, op)(*request.get("args", []))
+            response = {"ok": True, "result": result}
+        except Exception as e:
+            response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        return json.dumps(response, ensure_ascii=False).encode("utf-8")
+
+
+class VariableServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix domain socket server wrapping a single VariableDB instance.
+
+    Client connections are served concurrently by a fixed pool of worker
+    threads, so an idle or slow client only occupies its own worker. VariableDB
+    keeps one connection (and read cache) per thread, and the workers live as
+    long as the server, so every worker reuses its own warm SQLite connection.
+    """
+
+    def __init__(self, socket_path: str | Path, db: VariableDB, workers: int = DEFAULT_WORKERS):
+        """Bind the server socket.
+
+        Parameters
+        ----------
+        socket_path : str or Path
+            Filesystem path of the Unix domain socket
+        db : VariableDB
+            Database instance shared by all client connections
+        workers : int, optional
+            Number of worker threads serving connections (default: DEFAULT_WORKERS)
+
+        Raises
+        ------
+        OSError
+            If another server is already listening on socket_path
+        """
+        self.socket_path = Path(socket_path)
+        self.db = db
+        self._remove_stale_socket()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="variable-server")
+        # Create the socket file owner-only from the start instead of
+        # chmod-ing it after bind, when clients could already connect
+        previous_umask = os.umask(0o177)
+        try:
+            super().__init__(str(self.socket_path), VariableRequestHandler)
+        finally:
+            os.umask(previous_umask)
+
+    def _remove_stale_socket(self) -> None:
+        """Unlink socket_path only if no server is accepting connections on it."""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(str(self.socket_path))
+            except FileNotFoundError:
+                return
+            except ConnectionRefusedError:
+                # Left behind by a crashed server
+                self.socket_path.unlink()
+                return
+        raise OSError(f"A variable server is already listening on {self.socket_path}")
+
+    def process_request(self, request, client_address) -> None:
+        """Hand the connection to a pooled worker thread."""
+        self._executor.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self) -> None:
+        """Close the socket, remove its file and release database connections."""
+        super().server_close()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+        self.db.close()
+
+
+def main():
+    """Main entry point for the variable server."""
+    parser = argparse.ArgumentParser(
+        description="Serve the SQLite variable database over a Unix domain socket",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s                                 # Serve variables.db on variables.db.sock
+  %(prog)s --db other.db                   # Serve another database
+  %(prog)s --socket /tmp/vars.sock         # Use a custom socket path
+  %(prog)s --workers 16                    # Serve up to 16 clients concurrently
+        """
+    )
+
+    parser.add_argument(
+        "--db", "-d",
+        default="variables.db",
+        help="SQLite database file path (default: variables.db)"
+    )
+
+    parser.add_argument(
+        "--socket", "-s",
+        help="Unix socket path (default: <db>.sock or $VARIABLE_DB_SOCKET)"
+    )
+
+    parser.add_argument(
+        "--workers", "-w",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Worker threads serving clients concurrently (default: {DEFAULT_WORKERS})"
+    )
+
+    args = parser.parse_args()
+
+    socket_path = Path(args.socket) if args.socket else default_socket_path(args.db)
+    # The resident process serves repeated reads from its data_version-validated cache
+    server = VariableServer(socket_path, VariableDB(args.db, cache=True), workers=args.workers)
+
+    # Shut down cleanly on SIGTERM as well as Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    print(f"Serving {args.db} on {socket_path} (Press Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+        print("Variable server stopped.")
+
+
+if __name__ == "__main__":
+    main()
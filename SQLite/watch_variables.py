@@ -7,6 +7,7 @@ monitoring variable changes in real-time.
 
 import argparse
 import json
+import os
 import sqlite3
 import sys
 import time
@@ -14,7 +15,7 @@ from datetime import datetime
 from pathlib import Path
 from typing import Dict, Optional, Set
 
-from variable_db import VariableDB
+from variable_db import ShardedVariableDB, VariableDB, open_variable_db
 
 
 class Colors:
@@ -32,21 +33,54 @@ class Colors:
 class VariableWatcher:
     """Monitor SQLite variable database for changes."""
     
-    def __init__(self, db_path: str = "variables.db", use_colors: bool = True):
+    def __init__(
+        self,
+        db_path: str = "variables.db",
+        use_colors: bool = True,
+        maintain_interval: float = 0.0,
+        shards: int = 0,
+        route: str = "hash",
+        backend: str = "sqlite",
+        notify: bool = True,
+    ):
         """Initialize the variable watcher.
         
         Parameters
         ----------
         db_path : str
-            Path to the SQLite database file
+            Path to the SQLite database file (base path of the shard files if sharded)
         use_colors : bool
             Whether to use colored output
+        maintain_interval : float
+            Seconds between WAL checkpoint/vacuum rounds while watching (0 = never)
+        shards : int
+            Number of shard files written by ShardedVariableDB (0 = not sharded)
+        route : str
+            Shard routing used by the writers ("hash" or "namespace")
+        backend : str
+            Storage backend to watch ("sqlite" or "mongodb"); only SQLite
+            supports sharding, maintenance and lock statistics
+        notify : bool
+            Wake up as soon as the SQLite files are written (inotify, or
+            polling where unavailable) instead of sleeping a full interval
         """
         self.db_path = Path(db_path)
-        self.db = VariableDB(db_path)
+        self.backend = backend
+        if backend != "sqlite":
+            self.db = open_variable_db(backend)
+            self.shards = [self.db]
+        elif shards:
+            self.db = ShardedVariableDB(db_path, shards=shards, route=route)
+            self.shards = self.db.shards
+        else:
+            self.db = VariableDB(db_path)
+            self.shards = [self.db]
         self.use_colors = use_colors and sys.stdout.isatty()
         self.last_variables: Dict[str, str] = {}
         self.watch_specific: Optional[str] = None
+        self.maintain_interval = maintain_interval
+        self._next_maintenance = time.monotonic() + maintain_interval
+        self.notifier = self.db.change_notifier() if notify and backend == "sqlite" else None
         
     def _colorize(self, text: str, color: str) -> str:
         """Apply color to text if colors are enabled."""
@@ -59,6 +93,45 @@ class VariableWatcher:
         timestamp = datetime.now().strftime("%H:%M:%S")
         return self._colorize(f"[{timestamp}]", Colors.CYAN)
     
+    def _maintain_if_due(self) -> None:
+        """Run database maintenance when the maintenance interval has passed."""
+        if not self.maintain_interval or self.backend != "sqlite" or time.monotonic() < self._next_maintenance:
+            return
+        self._next_maintenance = time.monotonic() + self.maintain_interval
+        for shard in self.shards:
+            report = shard.maintain()
+            if report["truncated"] or report["vacuumed_pages"] or report["purged"]:
+                mib = 1024 * 1024
+                status = self._colorize("MAINTENANCE", Colors.BLUE)
+                print(f"{self._get_timestamp()} {status}: {shard.db_path.name} WAL "
+                      f"{report['before']['wal_bytes'] / mib:.1f} -> {report['after']['wal_bytes'] / mib:.1f} MiB, "
+                      f"vacuumed {report['vacuumed_pages']} pages, purged {report['purged']} expired variables")
+    
+    def _wait(self, interval: float) -> None:
+        """Wait until the database files are written, or at most interval seconds."""
+        if self.notifier is not None:
+            self.notifier.wait(interval)
+        else:
+            time.sleep(interval)
+    
+    def _print_interval(self, interval: float) -> None:
+        """Print how often the watcher checks for changes."""
+        if self.notifier is not None:
+            print(f"Waking on database writes ({self.notifier.method}), "
+                  f"checking at least every {interval}s (Press Ctrl+C to stop)\n")
+        else:
+            print(f"Update interval: {interval}s (Press Ctrl+C to stop)\n")
+    
+    def _poll_changes(self, last_seqs: list) -> list:
+        """Return the changes of every shard after last_seqs, advancing last_seqs in place."""
+        changes = []
+        for index, shard in enumerate(self.shards):
+            shard_changes = shard.changes_since(last_seqs[index])
+            if shard_changes:
+                last_seqs[index] = shard_changes[-1]["seq"]
+                changes.extend(shard_changes)
+        return changes
+    
     def _print_header(self, title: str) -> None:
         """Print a colored header."""
         header = f"\n{self._colorize('=' * 50, Colors.BLUE)}"
@@ -129,7 +202,7 @@ class VariableWatcher:
     def watch_specific_variable(self, var_name: str, interval: float = 1.0) -> None:
         """Watch a specific variable for changes."""
         self._print_header(f"Watching Variable: {{{{ {var_name} }}}}")
-        print(f"Update interval: {interval}s (Press Ctrl+C to stop)\n")
+        self._print_interval(interval)
         
         last_value = None
         last_info = None
@@ -166,7 +239,8 @@ class VariableWatcher:
                     last_value = current_value
                     last_info = current_info
                 
-                time.sleep(interval)
+                self._wait(interval)
+                self._maintain_if_due()
                 
         except KeyboardInterrupt:
             print(f"\n\n{self._colorize('Monitoring stopped.', Colors.BLUE)}")
@@ -174,10 +248,12 @@ class VariableWatcher:
     def watch_continuous(self, interval: float = 1.0, format_type: str = "table") -> None:
         """Watch all variables continuously for changes."""
         self._print_header("Continuous Variable Monitoring")
-        print(f"Update interval: {interval}s (Press Ctrl+C to stop)\n")
+        self._print_interval(interval)
         
-        # Initialize with current state
-        self.last_variables = self.db.list_variables()
+        # Initialize with current state and remember where each shard's change feed stands
+        last_seqs = [0] * len(self.shards)
+        changes = self._poll_changes(last_seqs)
+        self.last_variables = {c["name"]: c["value"] for c in changes if not c["deleted"]}
         if self.last_variables:
             print(f"{self._get_timestamp()} Initial state ({len(self.last_variables)} variables):")
             if format_type == "table":
@@ -189,12 +265,23 @@ class VariableWatcher:
         
         try:
             while True:
-                time.sleep(interval)
-                current_variables = self.db.list_variables()
+                self._wait(interval)
+                self._maintain_if_due()
+                # Read only the rows changed since the last wakeup
+                changes = self._poll_changes(last_seqs)
+                if not changes:
+                    continue
+                
+                current_variables = self.last_variables.copy()
+                for change in changes:
+                    if change["deleted"]:
+                        current_variables.pop(change["name"], None)
+                    else:
+                        current_variables[change["name"]] = change["value"]
                 
                 if current_variables != self.last_variables:
                     self._show_changes(self.last_variables, current_variables)
-                    self.last_variables = current_variables.copy()
+                    self.last_variables = current_variables
                     
         except KeyboardInterrupt:
             print(f"\n\n{self._colorize('Monitoring stopped.', Colors.BLUE)}")
@@ -228,7 +315,10 @@ class VariableWatcher:
         
         variables = self.db.list_variables()
         
-        print(f"Database file: {self.db_path}")
+        if self.backend == "sqlite":
+            print(f"Database file: {self.db_path}")
+        else:
+            print(f"Backend: {self.backend}")
         print(f"Total variables: {len(variables)}")
         
         if variables:
@@ -257,6 +347,41 @@ class VariableWatcher:
             recent_vars.sort(key=lambda x: x[1], reverse=True)
             for name, updated in recent_vars[:5]:
                 print(f"  {{{{ {name} }}}} - {updated}")
+        
+        writes = sum(shard.get_change_seq() for shard in self.shards)
+        if self.backend != "sqlite":
+            print(f"\nVariable writes in total: {writes}")
+            return
+        
+        # Write-lock contention recorded by all agents using this database
+        lock_stats = self.db.lock_stats()
+        print(f"\nWrite lock contention ({writes} variable writes in total):")
+        if not lock_stats:
+            print("  No lock waits, retries or failures recorded")
+        else:
+            print(f"  {'Operation':<20} | {'Waits':>6} | {'Avg wait':>9} | {'Max wait':>9} | {'Retries':>7} | {'Failures':>8}")
+            for operation, stats in lock_stats.items():
+                average = stats["wait_time"] / stats["waits"] if stats["waits"] else 0.0
+                failures = str(stats["failures"])
+                if stats["failures"]:
+                    failures = self._colorize(failures, Colors.RED)
+                print(f"  {operation:<20} | {stats['waits']:>6} | {average * 1000:>7.1f}ms | "
+                      f"{stats['max_wait'] * 1000:>7.1f}ms | {stats['retries']:>7} | {failures:>8}")
+        
+        # File sizes and free space per database file (see --maintain)
+        print(f"\nStorage:")
+        for shard in self.shards:
+            storage = shard.storage_stats()
+            indent = "  "
+            if len(self.shards) > 1:
+                variable_count = len(shard.list_variables(include_values=False))
+                print(f"  {shard.db_path.name} ({variable_count} variables):")
+                indent = "    "
+            print(f"{indent}Database file: {storage['db_bytes'] / 1024:.1f} KiB "
+                  f"({storage['page_count']} pages of {storage['page_size']} bytes)")
+            print(f"{indent}WAL file: {storage['wal_bytes'] / 1024:.1f} KiB")
+            print(f"{indent}Free pages: {storage['free_pages']} ({storage['free_ratio']:.1%}, "
+                  f"{storage['auto_vacuum']} auto-vacuum)")
 
 
 def main():
@@ -267,10 +392,14 @@ def main():
         epilog="""
 Examples:
   %(prog)s --once                          # Show all variables once
-  %(prog)s --continuous --interval 0.5     # Watch continuously (0.5s interval)
+  %(prog)s --continuous --interval 0.5     # Watch continuously (check at least every 0.5s)
+  %(prog)s --continuous --no-notify        # Sleep the full interval between checks
   %(prog)s --watch user_name --continuous  # Watch specific variable
   %(prog)s --format json --once            # Output in JSON format
   %(prog)s --stats                         # Show database statistics
+  %(prog)s --continuous --maintain 60      # Also checkpoint/vacuum every minute
+  %(prog)s --continuous --shards 4         # Watch variables.0.db ... variables.3.db
+  %(prog)s --continuous --backend mongodb  # Watch the MongoDB backend (mongo_variables.py)
         """
     )
     
@@ -302,7 +431,13 @@ Examples:
         "--interval", "-i",
         type=float,
         default=1.0,
-        help="Update interval in seconds (default: 1.0)"
+        help="Update interval in seconds; with notifications, the longest wait between checks (default: 1.0)"
+    )
+    
+    parser.add_argument(
+        "--no-notify",
+        action="store_true",
+        help="Poll every interval instead of waking on database writes (inotify)"
     )
     
     parser.add_argument(
@@ -324,16 +459,51 @@ Examples:
         help="Show database statistics"
     )
     
+    parser.add_argument(
+        "--maintain", "-m",
+        type=float,
+        default=0.0,
+        metavar="SECONDS",
+        help="While watching, checkpoint the WAL and vacuum every N seconds (default: off)"
+    )
+    
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Watch N shard files written by ShardedVariableDB (default: not sharded)"
+    )
+    
+    parser.add_argument(
+        "--route",
+        choices=["hash", "namespace"],
+        default="hash",
+        help="Shard routing used by the writers (default: hash)"
+    )
+    
+    parser.add_argument(
+        "--backend", "-b",
+        choices=["sqlite", "mongodb"],
+        default="mongodb" if os.environ.get("VARIABLE_DB_BACKEND") == "mongodb" else "sqlite",
+        help="Storage backend to watch (default: sqlite, or VARIABLE_DB_BACKEND if set to mongodb)"
+    )
+    
     args = parser.parse_args()
     
-    # Check if database exists
-    if not Path(args.db).exists():
-        print(f"Error: Database file '{args.db}' not found.")
+    # Check if database exists (the first shard if sharded)
+    db_file = Path(args.db)
+    if args.shards:
+        db_file = db_file.with_name(f"{db_file.stem}.0{db_file.suffix}")
+    if args.backend == "sqlite" and not db_file.exists():
+        print(f"Error: Database file '{db_file}' not found.")
         print("Create some variables first or specify the correct database path.")
         sys.exit(1)
     
     # Initialize watcher
-    watcher = VariableWatcher(args.db, use_colors=not args.no_color)
+    watcher = VariableWatcher(args.db, use_colors=not args.no_color, maintain_interval=args.maintain,
+                              shards=args.shards, route=args.route, backend=args.backend,
+                              notify=not args.no_notify)
     
     try:
         if args.stats:
@@ -6,14 +6,25 @@ for transparency and accountability in AI-driven systems.
 """
 
 import json
-import sqlite3
 import time
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
 from typing import Dict, List, Optional, Union
 
-from variable_db import VariableDB
+from variable_db import SCHEMA_SLOT_AUDIT, VariableDB
+
+
+# Schema version of the audit_logs table, recorded in PRAGMA user_version
+AUDIT_SCHEMA_VERSION = 1
+
+# Insert one audit event; shared by log_event and the executemany bulk paths
+_INSERT_EVENT_SQL = """
+    INSERT INTO audit_logs (
+        event_type, variable_name, old_value, new_value,
+        reasoning, source, session_id, metadata
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
 
 
 class EventType(Enum):
@@ -31,12 +42,32 @@ class EventType(Enum):
     SYSTEM_ACTION = "system_action"
 
 
+def _event_row(
+    event_type: Union["EventType", str],
+    variable_name: Optional[str] = None,
+    old_value: Optional[str] = None,
+    new_value: Optional[str] = None,
+    reasoning: Optional[str] = None,
+    source: str = "system",
+    session_id: Optional[str] = None,
+    metadata: Optional[Dict] = None
+) -> tuple:
+    """Return the _INSERT_EVENT_SQL parameters of one event (see AuditLogger.log_event)."""
+    return (
+        event_type.value if isinstance(event_type, EventType) else event_type,
+        variable_name, old_value, new_value, reasoning, source, session_id,
+        json.dumps(metadata) if metadata else None,
+    )
+
+
 class AuditLogger(VariableDB):
     """Extended variable database with comprehensive audit logging capabilities.
     
     This class extends VariableDB to provide audit trail functionality,
     recording all operations, decisions, and reasoning processes for
-    natural language macro programming systems.
+    natural language macro programming systems. Every variable write
+    (saves, deletes, atomic updates, arrays, purges and restores) is logged
+    in the same transaction as the write itself.
     """
 
     def __init__(self, db_path: str | Path = "variables.db", timeout: float = 30.0):
@@ -54,44 +85,50 @@ class AuditLogger(VariableDB):
 
     def _init_audit_tables(self) -> None:
         """Initialize audit logging tables in the database."""
-        with sqlite3.connect(self.db_path, timeout=self.timeout) as conn:
-            # Enable foreign key constraints
-            conn.execute("PRAGMA foreign_keys=ON")
-            
-            # Create audit_logs table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS audit_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    event_type TEXT NOT NULL,
-                    variable_name TEXT,
-                    old_value TEXT,
-                    new_value TEXT,
-                    reasoning TEXT,
-                    source TEXT DEFAULT 'system',
-                    session_id TEXT,
-                    metadata TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            # Create index for efficient querying
-            conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_audit_timestamp 
-                ON audit_logs(timestamp)
-            """)
-            
-            conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_audit_variable 
-                ON audit_logs(variable_name)
-            """)
-            
-            conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_audit_event_type 
-                ON audit_logs(event_type)
-            """)
+        self._ensure_schema(SCHEMA_SLOT_AUDIT, AUDIT_SCHEMA_VERSION, self._create_audit_tables)
 
-            conn.commit()
+    def _create_audit_tables(self, conn, current_version: int) -> None:
+        """Create the audit_logs table and its indexes.
+
+        Parameters
+        ----------
+        conn : sqlite3.Connection
+            Connection with an open write transaction
+        current_version : int
+            Audit schema version recorded in the database (0 if never initialized)
+        """
+        # Create audit_logs table
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS audit_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                event_type TEXT NOT NULL,
+                variable_name TEXT,
+                old_value TEXT,
+                new_value TEXT,
+                reasoning TEXT,
+                source TEXT DEFAULT 'system',
+                session_id TEXT,
+                metadata TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # Create index for efficient querying
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_audit_timestamp 
+            ON audit_logs(timestamp)
+        """)
+        
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_audit_variable 
+            ON audit_logs(variable_name)
+        """)
+        
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_audit_event_type 
+            ON audit_logs(event_type)
+        """)
 
     def log_event(
         self,
@@ -135,86 +172,125 @@ class AuditLogger(VariableDB):
         sqlite3.OperationalError
             If database operation fails
         """
+        row = _event_row(event_type, variable_name, old_value, new_value, reasoning, source, session_id, metadata)
+
         def _log_operation():
-            with sqlite3.connect(self.db_path, timeout=self.timeout) as conn:
-                event_type_str = event_type.value if isinstance(event_type, EventType) else event_type
-                metadata_json = json.dumps(metadata) if metadata else None
-                
-                cursor = conn.execute("""
-                    INSERT INTO audit_logs (
-                        event_type, variable_name, old_value, new_value,
-                        reasoning, source, session_id, metadata
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    event_type_str, variable_name, old_value, new_value,
-                    reasoning, source, session_id, metadata_json
-                ))
-                conn.commit()
-                return cursor.lastrowid
-
-        return self._execute_with_retry(_log_operation)
-
-    def save_variable(self, name: str, value: str) -> None:
-        """Save or update a variable with audit logging.
-
-        This method overrides the parent class to add audit logging
-        for all variable operations.
+            conn = self._connect()
+            with conn:
+                self._begin_write(conn)
+                cursor = conn.execute(_INSERT_EVENT_SQL, row)
+            return cursor.lastrowid
+
+        return self._execute_with_retry(_log_operation, operation_name="log_event")
+
+    def log_events(self, events: List[Dict]) -> int:
+        """Log several audit events in one transaction.
 
         Parameters
         ----------
-        name : str
-            Variable name (without the {{}} brackets)
-        value : str
-            Variable value to store
+        events : list of dict
+            Keyword arguments of log_event() for each event, e.g.
+            ``{"event_type": EventType.SYSTEM_ACTION, "reasoning": "..."}``
+
+        Returns
+        -------
+        int
+            Number of events logged
         """
-        # Get old value for audit trail
-        old_value = self.get_variable(name)
-        
-        # Determine event type
-        event_type = EventType.VARIABLE_UPDATE if old_value else EventType.VARIABLE_CREATE
-        
-        # Save the variable using parent method
-        super().save_variable(name, value)
-        
-        # Log the operation
-        self.log_event(
-            event_type=event_type,
-            variable_name=name,
-            old_value=old_value if old_value else None,
-            new_value=value,
-            source="macro"
-        )
+        rows = [_event_row(**event) for event in events]
+        if not rows:
+            return 0
+
+        def _log_many_operation():
+            conn = self._connect()
+            with conn:
+                self._begin_write(conn)
+                conn.executemany(_INSERT_EVENT_SQL, rows)
+            return len(rows)
 
-    def delete_variable(self, name: str) -> bool:
-        """Delete a variable with audit logging.
+        return self._execute_with_retry(_log_many_operation, operation_name="log_events")
+
+    def _audit_rows(self, old_values: Dict[str, str], new_values: Dict[str, Optional[str]]) -> List[tuple]:
+        """Return _INSERT_EVENT_SQL parameters for variable changes.
 
         Parameters
         ----------
-        name : str
-            Variable name to delete
+        old_values : dict
+            Values before the change of the variables that existed
+        new_values : dict
+            Values after the change; None for deleted variables
 
         Returns
         -------
-        bool
-            True if variable was deleted, False if it didn't exist
+        list of tuple
+            One create, update or delete event per variable
         """
-        # Get old value for audit trail
-        old_value = self.get_variable(name)
-        
-        # Delete using parent method
-        deleted = super().delete_variable(name)
-        
-        # Log the operation if deletion occurred
-        if deleted:
-            self.log_event(
-                event_type=EventType.VARIABLE_DELETE,
+        operation = getattr(self._local, "operation_name", None)
+        # Expired variables are purged by the system, everything else on behalf of a macro
+        source = "system" if operation == "purge_expired" else "macro"
+        metadata = {"operation": operation} if operation else None
+        rows = []
+        for name, new_value in new_values.items():
+            old_value = old_values.get(name) or None
+            if new_value is None:
+                event_type = EventType.VARIABLE_DELETE
+            else:
+                event_type = EventType.VARIABLE_UPDATE if old_value else EventType.VARIABLE_CREATE
+            rows.append(_event_row(
+                event_type=event_type,
                 variable_name=name,
                 old_value=old_value,
-                source="macro"
-            )
-        
+                new_value=new_value,
+                source=source,
+                metadata=metadata
+            ))
+        return rows
+
+    # Every write path of VariableDB goes through the primitives below, inside
+    # its write transaction. Overriding them logs each change in the same
+    # transaction, with old values read under the write lock, so no change
+    # goes unaudited and no event is logged for a write that rolled back.
+
+    def _write_values(self, conn, variables, expires_at: Optional[float] = None) -> None:
+        """Upsert variables and log their create/update events (see VariableDB._write_values)."""
+        variables = list(variables)
+        old_values = self._read_values(conn, list(dict.fromkeys(name for name, _ in variables)))
+        super()._write_values(conn, variables, expires_at)
+        conn.executemany(_INSERT_EVENT_SQL, self._audit_rows(old_values, dict(variables)))
+
+    def _write_array(self, conn, name: str, storage: str, data) -> None:
+        """Upsert an array variable and log its event (see VariableDB._write_array)."""
+        old_values = self._read_values(conn, [name])
+        super()._write_array(conn, name, storage, data)
+        new_values = self._select_values(conn, "WHERE name = ?", (name,))
+        conn.executemany(_INSERT_EVENT_SQL, self._audit_rows(old_values, new_values))
+
+    def _delete_rows(self, conn, where: str = "WHERE true", params=()) -> int:
+        """Delete variables and log their delete events (see VariableDB._delete_rows).
+
+        Covers delete_variable, delete_variables, delete_prefix, clear_all,
+        purge_expired and the variables removed by a restore.
+        """
+        # Includes expired variables, so purges are logged with their last value
+        old_values = self._select_values(conn, where, params)
+        deleted = super()._delete_rows(conn, where, params)
+        conn.executemany(_INSERT_EVENT_SQL, self._audit_rows(old_values, dict.fromkeys(old_values)))
         return deleted
 
+    def _replace_variables(self, conn, source: str, params=()) -> int:
+        """Restore variables and log every change (see VariableDB._replace_variables).
+
+        Covers restore and restore_checkpoint. Deleted variables are logged
+        by _delete_rows; created and changed ones are found by comparing the
+        state before and after.
+        """
+        old_values = self._select_values(conn)
+        count = super()._replace_variables(conn, source, params)
+        new_values = self._select_values(conn)
+        changed = {name: value for name, value in new_values.items() if old_values.get(name) != value}
+        conn.executemany(_INSERT_EVENT_SQL, self._audit_rows(old_values, changed))
+        return count
+
     def log_decision(
         self,
         decision: str,
@@ -324,53 +400,53 @@ class AuditLogger(VariableDB):
             List of audit log entries matching the criteria
         """
         def _get_logs_operation():
-            with sqlite3.connect(self.db_path, timeout=self.timeout) as conn:
-                # Build query with filters
-                query = "SELECT * FROM audit_logs WHERE 1=1"
-                params = []
-                
-                if event_type:
-                    event_type_str = event_type.value if isinstance(event_type, EventType) else event_type
-                    query += " AND event_type = ?"
-                    params.append(event_type_str)
-                
-                if variable_name:
-                    query += " AND variable_name = ?"
-                    params.append(variable_name)
-                
-                if start_time:
-                    query += " AND timestamp >= ?"
-                    params.append(start_time.isoformat())
-                
-                if end_time:
-                    query += " AND timestamp <= ?"
-                    params.append(end_time.isoformat())
-                
-                if session_id:
-                    query += " AND session_id = ?"
-                    params.append(session_id)
-                
-                query += " ORDER BY timestamp DESC"
-                
-                if limit:
-                    query += " LIMIT ?"
-                    params.append(limit)
-                
-                cursor = conn.execute(query, params)
-                columns = [description[0] for description in cursor.description]
-                
-                logs = []
-                for row in cursor.fetchall():
-                    log_dict = dict(zip(columns, row))
-                    # Parse metadata JSON if present
-                    if log_dict.get('metadata'):
-                        try:
-                            log_dict['metadata'] = json.loads(log_dict['metadata'])
-                        except json.JSONDecodeError:
-                            log_dict['metadata'] = None
-                    logs.append(log_dict)
-                
-                return logs
+            conn = self._connect()
+            # Build query with filters
+            query = "SELECT * FROM audit_logs WHERE 1=1"
+            params = []
+            
+            if event_type:
+                event_type_str = event_type.value if isinstance(event_type, EventType) else event_type
+                query += " AND event_type = ?"
+                params.append(event_type_str)
+            
+            if variable_name:
+                query += " AND variable_name = ?"
+                params.append(variable_name)
+            
+            if start_time:
+                query += " AND timestamp >= ?"
+                params.append(start_time.isoformat())
+            
+            if end_time:
+                query += " AND timestamp <= ?"
+                params.append(end_time.isoformat())
+            
+            if session_id:
+                query += " AND session_id = ?"
+                params.append(session_id)
+            
+            query += " ORDER BY timestamp DESC"
+            
+            if limit:
+                query += " LIMIT ?"
+                params.append(limit)
+            
+            cursor = conn.execute(query, params)
+            columns = [description[0] for description in cursor.description]
+            
+            logs = []
+            for row in cursor.fetchall():
+                log_dict = dict(zip(columns, row))
+                # Parse metadata JSON if present
+                if log_dict.get('metadata'):
+                    try:
+                        log_dict['metadata'] = json.loads(log_dict['metadata'])
+                    except json.JSONDecodeError:
+                        log_dict['metadata'] = None
+                logs.append(log_dict)
+            
+            return logs
 
         return self._execute_with_retry(_get_logs_operation)
 
@@ -388,7 +464,9 @@ class AuditLogger(VariableDB):
             Number of logs that were deleted
         """
         def _clear_operation():
-            with sqlite3.connect(self.db_path, timeout=self.timeout) as conn:
+            conn = self._connect()
+            with conn:
+                self._begin_write(conn)
                 if older_than_days:
                     cutoff_time = datetime.now().timestamp() - (older_than_days * 24 * 3600)
                     cutoff_datetime = datetime.fromtimestamp(cutoff_time).isoformat()
@@ -398,25 +476,31 @@ class AuditLogger(VariableDB):
                     )
                 else:
                     cursor = conn.execute("DELETE FROM audit_logs")
-                
-                conn.commit()
-                return cursor.rowcount
+            return cursor.rowcount
 
-        return self._execute_with_retry(_clear_operation)
+        return self._execute_with_retry(_clear_operation, operation_name="clear_audit_logs")
 
 
 # Convenience functions for direct use with audit logging
-_default_audit_db = AuditLogger()
+_default_audit_db: Optional[AuditLogger] = None
+
+
+def _get_default_audit_db() -> AuditLogger:
+    """Return the default audit logging instance, creating it on first use."""
+    global _default_audit_db
+    if _default_audit_db is None:
+        _default_audit_db = AuditLogger()
+    return _default_audit_db
 
 
-def save_variable(name: str, value: str) -> None:
-    """Save a variable using the default audit logging database instance."""
-    _default_audit_db.save_variable(name, value)
+def save_variable(name: str, value: str, ttl: Optional[float] = None) -> None:
+    """Save a variable (optionally expiring after ttl seconds) using the default audit logging database instance."""
+    _get_default_audit_db().save_variable(name, value, ttl)
 
 
 def get_variable(name: str) -> str:
     """Get a variable using the default audit logging database instance."""
-    return _default_audit_db.get_variable(name)
+    return _get_default_audit_db().get_variable(name)
 
 
 def log_decision(
@@ -427,7 +511,7 @@ def log_decision(
     session_id: Optional[str] = None
 ) -> int:
     """Log a decision using the default audit logging database instance."""
-    return _default_audit_db.log_decision(
+    return _get_default_audit_db().log_decision(
         decision, reasoning, affected_variables, confidence, session_id
     )
 
@@ -439,4 +523,4 @@ def log_reasoning(
     session_id: Optional[str] = None
 ) -> int:
     """Log reasoning using the default audit logging database instance."""
-    return _default_audit_db.log_reasoning(context, reasoning, result, session_id)
\ No newline at end of file
+    return _get_default_audit_db().log_reasoning(context, reasoning, result, session_id)
\ No newline at end of file
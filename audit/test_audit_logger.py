@@ -0,0 +1,88 @@
+"""Tests for audit_logger.py.
+
+Run with ``python -m pytest audit``.
+"""
+
+import time
+
+import pytest
+
+from audit_logger import AuditLogger, EventType
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = AuditLogger(tmp_path / "audit.db")
+    yield db
+    db.close()
+
+
+def _events(db):
+    """Return (event_type, variable_name, old_value, new_value) of all events, oldest first."""
+    logs = db.get_audit_logs()
+    return [(e["event_type"], e["variable_name"], e["old_value"], e["new_value"]) for e in reversed(logs)]
+
+
+def test_saves_and_deletes_are_audited(db):
+    db.save_variable("theme", "spring")
+    db.save_variables({"theme": "autumn", "mood": "calm"})
+    assert db.increment("count") == 1
+    assert db.delete_prefix("mo") == 1
+    assert db.clear_all() == 2
+
+    assert _events(db) == [
+        ("variable_create", "theme", None, "spring"),
+        ("variable_update", "theme", "spring", "autumn"),
+        ("variable_create", "mood", None, "calm"),
+        ("variable_create", "count", None, "1"),
+        ("variable_delete", "mood", "calm", None),
+        ("variable_delete", "count", "1", None),
+        ("variable_delete", "theme", "autumn", None),
+    ]
+
+
+def test_save_array_is_audited(db):
+    db.save_array("scores", [1, 2, 3])
+    assert _events(db) == [("variable_create", "scores", None, "1,2,3")]
+
+
+def test_purge_expired_is_audited_as_system(db):
+    db.save_variable("token", "abc", ttl=0.01)
+    time.sleep(0.05)
+    assert db.purge_expired() == 1
+
+    purge = db.get_audit_logs(event_type=EventType.VARIABLE_DELETE)
+    assert [(e["variable_name"], e["old_value"], e["source"]) for e in purge] == [("token", "abc", "system")]
+
+
+@pytest.mark.parametrize("kind", ["snapshot", "checkpoint"])
+def test_restores_are_audited(db, tmp_path, kind):
+    db.save_variables({"kept": "1", "changed": "old", "removed": "x"})
+    if kind == "snapshot":
+        db.snapshot(tmp_path / "snap.db")
+    else:
+        db.create_checkpoint("before")
+    db.save_variables({"changed": "new", "added": "y"})
+    db.delete_variable("removed")
+    db.clear_audit_logs()
+
+    if kind == "snapshot":
+        assert db.restore(tmp_path / "snap.db") == 3
+    else:
+        assert db.restore_checkpoint("before") == 3
+
+    assert sorted(_events(db)) == [
+        ("variable_create", "removed", None, "x"),
+        ("variable_delete", "added", "y", None),
+        ("variable_update", "changed", "new", "old"),
+    ]
+    operation = "restore" if kind == "snapshot" else "restore_checkpoint"
+    assert {e["metadata"]["operation"] for e in db.get_audit_logs()} == {operation}
+
+
+def test_failed_write_logs_nothing(db):
+    db.save_variable("count", "abc")
+    db.clear_audit_logs()
+    with pytest.raises(ValueError):
+        db.increment("count")
+    assert _events(db) == []
@@ -4,7 +4,7 @@
 import random
 import subprocess
 import sys
-from variable_db import VariableDB, save_variable, get_variable
+from variable_db import VariableDB, save_variable, get_variable, get_variables, save_variables, increment
 
 
 def run_macro(macro_file):
@@ -20,10 +20,11 @@ def roll_dice():
 
 def validate_agent_action():
     """Validate agent's action and return parsed values."""
-    action = get_variable("action")
-    bet_amount_str = get_variable("bet_amount")
-    target_number_str = get_variable("target_number")
-    current_assets = int(get_variable("assets"))
+    values = get_variables(["action", "bet_amount", "target_number", "assets"])
+    action = values["action"]
+    bet_amount_str = values["bet_amount"]
+    target_number_str = values["target_number"]
+    current_assets = int(values["assets"])
     
     # Validate action
     if action not in ["even_bet", "specific_number_bet", "pass"]:
@@ -105,8 +106,7 @@ def play_round(round_num):
     dice_result = roll_dice()
     is_final = (round_num == 10)
     payout = calculate_payout(action, bet_amount, target_number, dice_result, is_final)
-    new_assets = current_assets + payout
-    save_variable("assets", str(new_assets))
+    new_assets = increment("assets", payout)
     
     # Determine result
     if payout > 0:
@@ -133,8 +133,10 @@ def main():
     # Initialize
     db = VariableDB()
     db.clear_all()
-    save_variable("assets", "20")
-    save_variable("game_status", "GAME START: 20 chips, Goal: 30+ chips")
+    save_variables({
+        "assets": "20",
+        "game_status": "GAME START: 20 chips, Goal: 30+ chips",
+    })
     
     # Play 10 rounds
     for round_num in range(1, 11):
@@ -5,10 +5,733 @@ used in CLAUDE.md natural language macro syntax. Variables are stored
 in a SQLite database for better performance and reliability.
 """
 
+import array
+import atexit
+import codecs
+import contextlib
+import ctypes
+import difflib
+import functools
+import itertools
+import json
+import os
 import sqlite3
+import sys
+import threading
 import time
+import weakref
 import random
+import re
+import select
+import struct
+import zlib
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Protocol, runtime_checkable
+from urllib.parse import quote
+
+
+# Schema version of the variables table, recorded in PRAGMA user_version
+SCHEMA_VERSION = 8
+
+# user_version byte used by each component that owns tables in the database
+# (slot 2 belongs to the typed variables table of schema/variable_db.py)
+SCHEMA_SLOT_VARIABLES = 0
+SCHEMA_SLOT_AUDIT = 1
+
+# Next value of the change sequence shared by variables and their tombstones.
+# Both maxima come from the seq indexes, so this costs two index lookups.
+_NEXT_SEQ_SQL = """(
+    SELECT max(coalesce((SELECT max(seq) FROM variables), 0),
+               coalesce((SELECT max(seq) FROM variable_tombstones), 0)) + 1
+)"""
+
+# Insert a variable or update it in place, preserving created_at
+_UPSERT_SQL = f"""
+    INSERT INTO variables (name, value, storage, expires_at, seq, created_at, updated_at)
+    VALUES (?, ?, ?, ?, {_NEXT_SEQ_SQL}, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+    ON CONFLICT(name) DO UPDATE SET value = excluded.value,
+                                    storage = excluded.storage,
+                                    expires_at = excluded.expires_at,
+                                    seq = excluded.seq,
+                                    updated_at = excluded.updated_at
+"""
+
+# Current Unix time in SQL, comparable with variables.expires_at
+_NOW_SQL = "((julianday('now') - 2440587.5) * 86400.0)"
+
+# Reads see only variables that have not expired; expired rows stay until purged
+_NOT_EXPIRED = f"(v.expires_at IS NULL OR v.expires_at > {_NOW_SQL})"
+
+_UPSERT_BLOB_SQL = """
+    INSERT INTO variable_blobs (name, data) VALUES (?, ?)
+    ON CONFLICT(name) DO UPDATE SET data = excluded.data
+"""
+
+# Source for value lookups: large values live in variable_blobs (storage is not NULL)
+_VALUE_SOURCE = "variables AS v LEFT JOIN variable_blobs AS b ON b.name = v.name"
+
+# Hot-path reads, built once instead of formatted on every call
+_GET_VALUE_SQL = f"SELECT v.value, v.storage, b.data FROM {_VALUE_SOURCE} WHERE v.name = ? AND {_NOT_EXPIRED}"
+_GET_VALUE_EXPIRY_SQL = (
+    f"SELECT v.value, v.storage, b.data, v.expires_at FROM {_VALUE_SOURCE} WHERE v.name = ? AND {_NOT_EXPIRED}"
+)
+_HISTORY_VERSIONS_SQL = "SELECT value FROM variable_settings WHERE key = 'history_versions'"
+
+# Prepared statements kept per connection (sqlite3's default is 128). The IN (...)
+# queries of the batch methods add one statement per distinct batch size.
+STATEMENT_CACHE_SIZE = 512
+
+# Expired variables deleted per purge_expired() transaction
+PURGE_BATCH_SIZE = 500
+
+# Seconds a deletion stays visible to changes_since() before its tombstone is pruned
+TOMBSTONE_RETENTION = 24 * 60 * 60
+
+# Tombstones that can be pruned: old enough, not the one holding the highest
+# sequence number (it keeps the change counter from going back), and not part
+# of a variable's history (get_variable(at=...) needs the deletion)
+_PRUNE_TOMBSTONES_SQL = """
+    DELETE FROM variable_tombstones WHERE name IN (
+        SELECT t.name FROM variable_tombstones AS t
+        WHERE t.deleted_at < datetime('now', ?)
+          AND t.seq < (SELECT max(seq) FROM variable_tombstones)
+          AND NOT EXISTS (SELECT 1 FROM variable_history AS h WHERE h.name = t.name)
+        LIMIT ?
+    )
+"""
+
+# Values with at least this many characters are moved to variable_blobs (compressed)
+LARGE_VALUE_THRESHOLD = 64 * 1024
+
+# Bytes read per blobopen() call by get_variable_range
+_BLOB_READ_SIZE = 64 * 1024
+
+# Element formats accepted by save_array (native struct codes supported by memoryview.cast)
+_ARRAY_FORMATS = set("bBhHiIlLqQfd?")
+
+# Pages copied per Connection.backup() step; the source is unlocked between steps
+_BACKUP_PAGES = 256
+
+# Past revisions kept per variable by enable_history() unless told otherwise
+HISTORY_VERSIONS = 100
+
+# Keep only the newest N past revisions of one variable
+_TRIM_HISTORY_SQL = """
+    DELETE FROM variable_history WHERE name = ? AND seq <= (
+        SELECT seq FROM variable_history WHERE name = ? ORDER BY seq DESC LIMIT 1 OFFSET ?
+    )
+"""
+
+# Size the -wal file is cut back to whenever a checkpoint lets SQLite restart it
+_JOURNAL_SIZE_LIMIT = 16 * 1024 * 1024
+
+# maintain(): TRUNCATE checkpoint once the WAL reaches this size (bytes)
+WAL_TRUNCATE_BYTES = 4 * 1024 * 1024
+
+# maintain(): incremental vacuum once this share of database pages is free
+VACUUM_FREE_RATIO = 0.1
+
+_CHECKPOINT_MODES = ("PASSIVE", "FULL", "RESTART", "TRUNCATE")
+
+# Values of PRAGMA auto_vacuum
+_AUTO_VACUUM_MODES = ("none", "full", "incremental")
+
+# Upper bound on "?" placeholders per IN (...) query, below SQLite's historical limit of 999
+_MAX_BATCH_PARAMS = 500
+
+# Compiled templates kept by render(), keyed by template text
+TEMPLATE_CACHE_SIZE = 256
+
+# Placeholder delimiters of the macro syntax
+_TEMPLATE_TOKENS = re.compile(r"(\{\{|\}\})")
+
+# BEGIN IMMEDIATE taking at least this long (seconds) counts as waiting for the write lock
+_LOCK_WAIT_THRESHOLD = 0.001
+
+# Fold this process's contention counters into the shared lock_stats table
+_FLUSH_LOCK_STATS_SQL = """
+    INSERT INTO lock_stats (operation, waits, wait_time, max_wait, retries, failures, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(operation) DO UPDATE SET waits = waits + excluded.waits,
+                                         wait_time = wait_time + excluded.wait_time,
+                                         max_wait = max(max_wait, excluded.max_wait),
+                                         retries = retries + excluded.retries,
+                                         failures = failures + excluded.failures,
+                                         updated_at = excluded.updated_at
+"""
+
+# Storage modes: the database file, or a per-process in-memory ("ram") copy of it.
+# Not to be confused with the "memory" backend (InMemoryVariableDB) in BACKENDS.
+STORAGE_MODES = ("disk", "ram")
+
+# Environment variables used when VariableDB(mode=..., flush_interval=...) are omitted
+MODE_ENV_VAR = "VARIABLE_DB_MODE"
+FLUSH_INTERVAL_ENV_VAR = "VARIABLE_DB_FLUSH_INTERVAL"
+
+_memory_databases_lock = threading.Lock()
+
+# Position in a change feed: a sequence number, or one per shard for ShardedVariableDB.
+# Callers treat it as opaque: pass back get_change_seq() or a change's "seq"; 0 means the start
+ChangeCursor = int | tuple[int, ...]
+
+# Backends that open_variable_db() can create
+BACKENDS = ("sqlite", "memory", "log", "mongodb")
+
+# Environment variable that selects the backend of open_variable_db() and the module-level functions
+BACKEND_ENV_VAR = "VARIABLE_DB_BACKEND"
+
+# Shard files used by ShardedVariableDB unless told otherwise
+SHARD_COUNT = 4
+
+# Environment variable that makes the module-level functions use ShardedVariableDB
+SHARDS_ENV_VAR = "VARIABLE_DB_SHARDS"
+
+# Ways ChangeNotifier can detect changes: inotify (Linux), or stat() polling
+NOTIFY_METHODS = ("inotify", "poll")
+
+# Environment variable that forces a notification method, e.g. "poll" on network file systems
+NOTIFY_ENV_VAR = "VARIABLE_DB_NOTIFY"
+
+# Seconds between checks when changes have to be polled for
+NOTIFY_POLL_INTERVAL = 0.01
+
+# inotify events that mean a watched file was written, created or replaced
+_IN_MODIFY = 0x002
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_Q_OVERFLOW = 0x4000
+_INOTIFY_MASK = _IN_MODIFY | _IN_MOVED_TO | _IN_CREATE
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+# Connections inherited across fork(); kept alive so they are never closed by the child
+_inherited_connections: list[sqlite3.Connection] = []
+
+# Open instances whose unsaved contention counters are written at interpreter exit
+_open_databases: "weakref.WeakSet[VariableDB]" = weakref.WeakSet()
+
+
+def _decode_array(storage: str, data: bytes) -> memoryview:
+    """Return a typed view of an array blob stored by save_array.
+
+    Parameters
+    ----------
+    storage : str
+        ``array:<format>:<shape>``, e.g. ``array:d:12`` or ``array:f:3,4``
+    data : bytes
+        Packed elements in C order and native byte order
+
+    Returns
+    -------
+    memoryview
+        View of ``data`` with the stored element format and shape (no copy)
+    """
+    _, element_format, shape = storage.split(":")
+    dimensions = [int(n) for n in shape.split(",")] if shape else []
+    if 0 in dimensions:
+        # memoryview cannot represent empty multi-dimensional shapes
+        return memoryview(data).cast(element_format)
+    return memoryview(data).cast(element_format, dimensions)
+
+
+def _decode_value(value: str, storage: str | None, data: bytes | None) -> str:
+    """Return the stored text of a variable row joined with variable_blobs.
+
+    Parameters
+    ----------
+    value : str
+        Inline value (empty string for large values)
+    storage : str or None
+        None for inline values, "zlib" or "raw" for large text values in
+        variable_blobs, ``array:...`` for arrays stored by save_array
+    data : bytes or None
+        Blob contents for large values
+
+    Returns
+    -------
+    str
+        The variable value; arrays are rendered as comma-separated numbers
+        (nested JSON lists for more than one dimension)
+    """
+    if storage is None:
+        return value
+    if storage.startswith("array:"):
+        view = _decode_array(storage, data)
+        if view.ndim == 1:
+            return ",".join(map(str, view.tolist()))
+        return json.dumps(view.tolist())
+    if storage == "zlib":
+        data = zlib.decompress(data)
+    return data.decode("utf-8")
+
+
+def _encode_delta(base: str, text: str) -> bytes:
+    """Encode ``text`` as line operations against ``base``.
+
+    Parameters
+    ----------
+    base : str
+        Text the delta is applied to (the next newer revision)
+    text : str
+        Text the delta reproduces (the older revision)
+
+    Returns
+    -------
+    bytes
+        zlib-compressed JSON list whose items are either ``[start, end]``,
+        copying lines ``start:end`` of ``base``, or a string inserted as is
+    """
+    base_lines = base.splitlines(keepends=True)
+    lines = text.splitlines(keepends=True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_lines, lines)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(lines[j1:j2]))
+    return zlib.compress(json.dumps(ops, ensure_ascii=False).encode("utf-8"))
+
+
+def _apply_delta(base: str, delta: bytes) -> str:
+    """Reconstruct the text encoded by _encode_delta() from its base text."""
+    base_lines = base.splitlines(keepends=True)
+    return "".join(
+        "".join(base_lines[op[0]:op[1]]) if isinstance(op, list) else op
+        for op in json.loads(zlib.decompress(delta))
+    )
+
+
+def _iter_revisions(conn: sqlite3.Connection, name: str):
+    """Yield the revisions of a variable, newest first.
+
+    The current value (or deletion) comes first, followed by the past
+    revisions kept in variable_history. Each past revision is stored either
+    in full or as a delta against the next newer one, so they are decoded
+    while walking backwards.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        Connection with an open read transaction
+    name : str
+        Variable name
+
+    Yields
+    ------
+    tuple[int, str, str | None]
+        Change sequence number, timestamp and value (None once deleted)
+    """
+    row = conn.execute(
+        f"SELECT v.value, v.storage, b.data, v.seq, v.updated_at FROM {_VALUE_SOURCE} WHERE v.name = ?", (name,)
+    ).fetchone()
+    text = None
+    if row is not None:
+        text = _decode_value(*row[:3])
+        yield row[3], row[4], text
+    else:
+        row = conn.execute("SELECT seq, deleted_at FROM variable_tombstones WHERE name = ?", (name,)).fetchone()
+        if row is not None:
+            yield row[0], row[1], None
+
+    cursor = conn.execute(
+        "SELECT seq, kind, data, updated_at FROM variable_history WHERE name = ? ORDER BY seq DESC", (name,)
+    )
+    for seq, kind, data, updated_at in cursor:
+        if kind == "delta":
+            text = _apply_delta(text, data)
+        elif kind == "text":
+            text = zlib.decompress(data).decode("utf-8")
+        elif kind == "deleted":
+            text = None
+        else:
+            text = _decode_value("", kind, data)
+        yield seq, updated_at, text
+
+
+def _format_timestamp(at: str | datetime) -> str:
+    """Return a point in time in the format of SQLite's CURRENT_TIMESTAMP (UTC).
+
+    Naive datetimes are taken to be in UTC already; strings are passed through.
+    """
+    if isinstance(at, str):
+        return at
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc)
+    return at.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def expiry_time(ttl: float | None) -> float | None:
+    """Convert a time-to-live in seconds into the Unix time stored in expires_at (None = never)."""
+    if ttl is None:
+        return None
+    if ttl <= 0:
+        raise ValueError(f"ttl must be positive, got {ttl}")
+    return time.time() + ttl
+
+
+def _prefix_range(prefix: str, column: str = "name") -> tuple[str, tuple]:
+    """Build a WHERE clause selecting names that start with a prefix.
+
+    The clause is a range on the primary key (``name >= ? AND name < ?``),
+    so SQLite answers it with an index range scan instead of a table scan.
+
+    Parameters
+    ----------
+    prefix : str
+        Name prefix; empty string selects everything
+    column : str, optional
+        Column expression to compare, by default "name"
+
+    Returns
+    -------
+    tuple[str, tuple]
+        WHERE clause and its parameters
+    """
+    # Smallest string greater than every string with this prefix
+    upper = prefix.rstrip(chr(sys.maxunicode))
+    if upper:
+        next_char = ord(upper[-1]) + 1
+        if 0xD800 <= next_char <= 0xDFFF:
+            next_char = 0xE000  # Surrogates cannot be stored as UTF-8
+        upper = upper[:-1] + chr(next_char)
+        return f"WHERE {column} >= ? AND {column} < ?", (prefix, upper)
+    return f"WHERE {column} >= ?", (prefix,)
+
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _compile_template(text: str) -> tuple:
+    """Parse a template into literal strings and (possibly nested) placeholders.
+
+    A placeholder is a tuple of the nodes between ``{{`` and ``}}``, so
+    ``"a {{agent_{{AGENT_ID}}_theme}}"`` becomes
+    ``("a ", ("agent_", ("AGENT_ID",), "_theme"))``. Unbalanced braces are
+    kept as literal text.
+    """
+    stack = [[]]
+    for token in _TEMPLATE_TOKENS.split(text):
+        if token == "{{":
+            stack.append([])
+        elif token == "}}" and len(stack) > 1:
+            placeholder = tuple(stack.pop())
+            stack[-1].append(placeholder)
+        elif token:
+            stack[-1].append(token)
+    while len(stack) > 1:
+        parts = stack.pop()
+        stack[-1].extend(["{{", *parts])
+    # Merge neighbouring literals left over from unbalanced braces
+    nodes = []
+    for node in stack[0]:
+        if isinstance(node, str) and nodes and isinstance(nodes[-1], str):
+            nodes[-1] += node
+        else:
+            nodes.append(node)
+    return tuple(nodes)
+
+
+def _render_nodes(nodes: tuple, values: dict, pending: set, missing: str | None) -> str | None:
+    """Render template nodes, or return None and collect the names still to be fetched.
+
+    ``values`` maps names to their values, or to None for variables that
+    are not set; those render as ``missing``, or keep their placeholder
+    (with nested parts resolved) if ``missing`` is None.
+    """
+    parts = []
+    complete = True
+    for node in nodes:
+        if isinstance(node, str):
+            parts.append(node)
+            continue
+        name = _render_nodes(node, values, pending, missing)
+        if name is None:
+            complete = False
+            continue
+        name = name.strip()
+        if name not in values:
+            pending.add(name)
+            complete = False
+        elif values[name] is not None:
+            parts.append(values[name])
+        else:
+            parts.append("{{" + name + "}}" if missing is None else missing)
+    return "".join(parts) if complete else None
+
+
+def _render_template(get_variables, text: str, params: dict, missing: str | None = None) -> str:
+    """Resolve the placeholders of a template with one get_variables call per nesting level.
+
+    Parameters take precedence over variables. Names whose value depends on
+    another placeholder (``{{agent_{{N}}_theme}}`` with N a variable) are
+    fetched once the inner value is known; everything else in the template
+    is fetched together.
+    """
+    values = {name: str(value) for name, value in params.items()}
+    while True:
+        pending = set()
+        rendered = _render_nodes(_compile_template(text), values, pending, missing)
+        if rendered is not None:
+            return rendered
+        fetched = get_variables(sorted(pending))
+        # get_variables returns "" for variables that are not set
+        values.update((name, fetched.get(name) or None) for name in pending)
+
+
+class FlushConflictError(Exception):
+    """Raised by VariableDB.flush() when the file changed since it was loaded into RAM."""
+    pass
+
+
+class _MemoryDatabase:
+    """This process's in-memory copy of one database file (storage mode "ram")."""
+
+    def __init__(self, anchor: sqlite3.Connection, file_conn: sqlite3.Connection):
+        # Keeps the in-memory database alive while no instance is connected
+        self.anchor = anchor
+        # Connection to the file used for loading and flushing. Its PRAGMA
+        # data_version changes only when another connection commits to the
+        # file, so comparing it detects writers that a flush would overwrite.
+        self.file_conn = file_conn
+        self.file_version = file_conn.execute("PRAGMA data_version").fetchone()[0]
+        # Serializes access to the in-memory database
+        self.lock = threading.RLock()
+
+
+# In-memory databases of this process by URI
+_memory_databases: dict[str, _MemoryDatabase] = {}
+
+
+class _ReadCache:
+    """Per-thread read cache tied to one connection's PRAGMA data_version.
+
+    ``PRAGMA data_version`` changes whenever another connection (in this or
+    another process) commits to the database, so an unchanged value proves
+    the cached entries are still current.
+    """
+
+    def __init__(self):
+        self.data_version: int | None = None
+        self.values: dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+
+class _LockStats:
+    """Contention counters for one operation, not yet written to lock_stats."""
+
+    def __init__(self):
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.retries = 0
+        self.failures = 0
+
+
+class ChangeNotifier:
+    """Wakes a waiting thread when one of a set of files is written.
+
+    On Linux the directories holding the files are watched with inotify, so
+    a waiter sleeps in the kernel and wakes within a millisecond of a write,
+    including writes to files created later such as ``variables.db-wal``.
+    Elsewhere, when inotify is unavailable, or with VARIABLE_DB_NOTIFY=poll,
+    the files' size and modification time are compared every poll_interval
+    seconds. Without paths, wait() simply returns every poll_interval.
+
+    Notifications can be spurious (a checkpoint also writes the database),
+    so a wakeup means "check for changes", not "something changed". Writes
+    made through memory-mapped I/O are not reported by inotify.
+    """
+
+    def __init__(self, paths, poll_interval: float = NOTIFY_POLL_INTERVAL, method: str | None = None):
+        """Start watching files.
+
+        Parameters
+        ----------
+        paths : iterable of str or Path
+            Files to watch; they need not exist yet, but their directories must
+        poll_interval : float, optional
+            Seconds between checks when polling, by default NOTIFY_POLL_INTERVAL
+        method : str, optional
+            "inotify" or "poll"; by default the VARIABLE_DB_NOTIFY environment
+            variable, otherwise "inotify". inotify falls back to polling where
+            it is unavailable; ``self.method`` tells which one is used
+
+        Raises
+        ------
+        ValueError
+            If the method is unknown
+        """
+        if method is None:
+            method = os.environ.get(NOTIFY_ENV_VAR) or "inotify"
+        if method not in NOTIFY_METHODS:
+            raise ValueError(f"Unknown notification method: {method} (expected one of {', '.join(NOTIFY_METHODS)})")
+        self.paths = [Path(os.path.abspath(path)) for path in paths]
+        self.poll_interval = poll_interval
+        self._names = {os.fsencode(path.name) for path in self.paths}
+        self._fd: int | None = None
+        self._poller: select.poll | None = None
+        self._pid = os.getpid()
+        if method == "inotify" and self.paths:
+            self._open_inotify()
+        self.method = "inotify" if self._fd is not None else "poll"
+        self._signature = self._stat_signature()
+
+    def __enter__(self) -> "ChangeNotifier":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _open_inotify(self) -> None:
+        """Watch the directories of self.paths with inotify, leaving _fd None if that is not possible."""
+        if not sys.platform.startswith("linux"):
+            return
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return
+        if fd < 0:
+            return
+        for directory in {path.parent for path in self.paths}:
+            if libc.inotify_add_watch(fd, os.fsencode(directory), _INOTIFY_MASK) < 0:
+                os.close(fd)
+                return
+        self._fd = fd
+        self._poller = select.poll()
+        self._poller.register(fd, select.POLLIN)
+
+    def _stat_signature(self) -> list:
+        """Return (inode, size, mtime) of every watched file, None for missing files."""
+        signature = []
+        for path in self.paths:
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                signature.append(None)
+            else:
+                signature.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        return signature
+
+    def _read_events(self) -> bool:
+        """Drain pending inotify events and return whether one concerned a watched file."""
+        changed = False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+                offset += _INOTIFY_EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                # An overflowed queue may have dropped events for the watched files
+                if mask & _IN_Q_OVERFLOW or name in self._names:
+                    changed = True
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Block until a watched file is written or the timeout expires.
+
+        Writes made since the previous wait() (or since the notifier was
+        created) are reported immediately, so nothing is missed between
+        reading the database and waiting again.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum seconds to wait, by default forever
+
+        Returns
+        -------
+        bool
+            True if a watched file may have changed, False on timeout
+        """
+        if self._pid != os.getpid():
+            # The inotify queue is shared with the parent; open our own
+            self._pid = os.getpid()
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+                self._open_inotify()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if self._fd is not None:
+                if self._poller.poll(None if remaining is None else remaining * 1000) and self._read_events():
+                    return True
+            else:
+                time.sleep(self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+                signature = self._stat_signature()
+                if not self.paths or signature != self._signature:
+                    self._signature = signature
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def close(self) -> None:
+        """Stop watching; wait() then falls back to polling."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self._poller = None
+            self.method = "poll"
+
+
+def _wait_for_changes(changes_since, notifier: ChangeNotifier, seq, timeout: float | None) -> list[dict]:
+    """Return changes_since(seq) once it is non-empty, waiting on notifier in between ([] on timeout)."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        changes = changes_since(seq)
+        if changes:
+            return changes
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            return []
+        notifier.wait(remaining)
+
+
+@runtime_checkable
+class VariableBackend(Protocol):
+    """Operations every variable storage backend provides.
+
+    Macros, watchers and tools that only use these methods work unchanged
+    with every backend returned by open_variable_db(): VariableDB (SQLite),
+    ShardedVariableDB, InMemoryVariableDB and MongoVariables (mongo/).
+    Values are strings and a missing variable reads as "". Past values
+    (get_variable's ``at``) need history, which only the SQLite backends
+    keep; the others raise ValueError when ``at`` is given. The change feed
+    takes and returns an opaque ChangeCursor that advances with every write
+    and deletion (ShardedVariableDB's holds one sequence number per shard).
+    """
+
+    def save_variable(self, name: str, value: str) -> None: ...
+
+    def get_variable(self, name: str, at: int | str | datetime | None = None) -> str: ...
+
+    def delete_variable(self, name: str) -> bool: ...
+
+    def list_variables(self, prefix: str = "", include_values: bool = True) -> dict[str, str] | list[str]: ...
+
+    def get_variable_info(self, name: str) -> dict | None: ...
+
+    def save_variables(self, variables: dict[str, str]) -> None: ...
+
+    def get_variables(self, names: list[str]) -> dict[str, str]: ...
+
+    def delete_variables(self, names: list[str]) -> int: ...
+
+    def clear_all(self) -> int: ...
+
+    def changes_since(self, seq: ChangeCursor = 0) -> list[dict]: ...
+
+    def get_change_seq(self) -> ChangeCursor: ...
+
+    def wait_for_changes(self, seq: ChangeCursor = 0, timeout: float | None = None) -> list[dict]: ...
+
+    def close(self) -> None: ...
 
 
 class VariableDB:
@@ -18,243 +741,3092 @@ class VariableDB:
     with SQLite database operations for the natural language macro system.
     """
 
-    def __init__(self, db_path: str | Path = "variables.db", timeout: float = 30.0):
+    def __init__(
+        self,
+        db_path: str | Path = "variables.db",
+        timeout: float = 30.0,
+        cache: bool = False,
+        large_value_threshold: int = LARGE_VALUE_THRESHOLD,
+        mode: str | None = None,
+        flush_interval: float | None = None,
+        purge_interval: float | None = None,
+    ):
         """Initialize the variable database.
 
         Parameters
         ----------
         db_path : str or Path, optional
-            Path to the SQLite database file, by default "variables.db"
+            Path to the SQLite database file, by default "variables.db"
+        timeout : float, optional
+            Busy timeout in seconds: how long a write may wait for the write
+            lock before failing, by default 30.0
+        cache : bool, optional
+            Enable the read-through cache for get_variable/get_variables,
+            by default False
+        large_value_threshold : int, optional
+            Values with at least this many characters are compressed and stored
+            in a side table, by default LARGE_VALUE_THRESHOLD (64 KiB)
+        mode : str, optional
+            "disk" to use the database file directly, or "ram" to work on an
+            in-memory copy of it that is shared by all threads and instances
+            of this process (see flush()); by default the VARIABLE_DB_MODE
+            environment variable, otherwise "disk"
+        flush_interval : float, optional
+            RAM mode only: write the in-memory database back to db_path
+            every N seconds and on close/exit (0 = only on close/exit). By
+            default the VARIABLE_DB_FLUSH_INTERVAL environment variable;
+            if neither is set, the file is never written
+        purge_interval : float, optional
+            Delete expired variables (see purge_expired()) every N seconds in
+            a background thread, by default never; expired variables are
+            hidden from reads either way
+        """
+        if mode is None:
+            mode = os.environ.get(MODE_ENV_VAR) or "disk"
+        if mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode: {mode} (expected one of {', '.join(STORAGE_MODES)})")
+        if flush_interval is None and os.environ.get(FLUSH_INTERVAL_ENV_VAR):
+            flush_interval = float(os.environ[FLUSH_INTERVAL_ENV_VAR])
+
+        self.db_path = Path(db_path)
+        self.mode = mode
+        self.flush_interval = flush_interval
+        self.purge_interval = purge_interval
+        self.timeout = timeout
+        self.cache_enabled = cache
+        self.large_value_threshold = large_value_threshold
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._caches: list[_ReadCache] = []
+        self._notifiers: list[ChangeNotifier] = []
+        self._connections_lock = threading.Lock()
+        self._pending_lock_stats: dict[str, _LockStats] = {}
+        self._lock_stats_lock = threading.Lock()
+        self._pid = os.getpid()
+        self._memory_uri: str | None = None
+        self._memory_db: _MemoryDatabase | None = None
+        self._memory_lock: threading.RLock | None = None
+        self._flushed_seq: int | None = None
+        if mode == "ram":
+            self._open_memory_database()
+        self._init_database()
+        _open_databases.add(self)
+        if mode == "ram" and flush_interval:
+            threading.Thread(target=self._flush_periodically, name="VariableDB flush", daemon=True).start()
+        if purge_interval:
+            threading.Thread(target=self._purge_periodically, name="VariableDB purge", daemon=True).start()
+
+    def __enter__(self) -> "VariableDB":
+        """Support ``with VariableDB(...) as db:`` usage."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        """Close all connections when leaving the ``with`` block."""
+        self.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return the persistent connection for the calling thread.
+
+        Connections are opened lazily, one per thread, and reused for every
+        subsequent operation so that the page cache and per-connection PRAGMAs
+        stay warm. After ``fork()`` the child discards the parent's connections
+        and opens its own.
+
+        Returns
+        -------
+        sqlite3.Connection
+            Connection owned by the current thread and process
+        """
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # timeout installs SQLite's busy handler (PRAGMA busy_timeout), which
+            # waits for the write lock instead of failing immediately
+            if self._memory_uri is not None:
+                conn = sqlite3.connect(self._memory_uri, uri=True, timeout=self.timeout, check_same_thread=False,
+                                       cached_statements=STATEMENT_CACHE_SIZE)
+            else:
+                conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False,
+                                       cached_statements=STATEMENT_CACHE_SIZE)
+            # These PRAGMAs are per-connection, so apply them on every new connection
+            conn.execute("PRAGMA synchronous=NORMAL")  # Balance safety/performance
+            conn.execute("PRAGMA cache_size=10000")    # Increase cache for performance
+            conn.execute("PRAGMA temp_store=memory")   # Use memory for temp storage
+            conn.execute(f"PRAGMA journal_size_limit={_JOURNAL_SIZE_LIMIT}")  # Keep the WAL file bounded
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _reset_after_fork(self) -> None:
+        """Forget connections inherited from the parent process.
+
+        SQLite connections must not be used across ``fork()``. The inherited
+        objects are kept referenced rather than closed, because closing them
+        from the child could interfere with the parent's file locks.
+        """
+        _inherited_connections.extend(self._connections)
+        for notifier in self._notifiers:
+            notifier.close()
+        self._local = threading.local()
+        self._connections = []
+        self._caches = []
+        self._notifiers = []
+        self._connections_lock = threading.Lock()
+        # The parent still owns (and will save) the counters it had pending
+        self._pending_lock_stats = {}
+        self._lock_stats_lock = threading.Lock()
+        self._pid = os.getpid()
+        if self._memory_uri is not None:
+            # The parent's in-memory database is not shared; start from the file
+            self._open_memory_database()
+            self._init_database()
+
+    def _open_memory_database(self) -> None:
+        """Create or join this process's in-memory copy of the database file.
+
+        The first instance for a file loads its contents, if it exists, with
+        the backup API, and keeps a connection to the file for flush(). An
+        anchor connection keeps the in-memory database alive until the
+        process exits, so closing instances loses nothing. Shared-cache
+        connections report table locks immediately instead of waiting in the
+        busy handler, so every operation holds a lock per database; in
+        memory these operations take microseconds.
+        """
+        name = quote(f"{self.db_path.resolve()}-{os.getpid()}")
+        self._memory_uri = f"file:{name}?mode=memory&cache=shared"
+        with _memory_databases_lock:
+            if self._memory_uri not in _memory_databases:
+                anchor = sqlite3.connect(self._memory_uri, uri=True, check_same_thread=False)
+                file_conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+                # data_version is recorded before loading: a commit in between
+                # makes flush() refuse rather than overwrite it
+                memory_db = _MemoryDatabase(anchor, file_conn)
+                file_conn.backup(anchor)
+                _memory_databases[self._memory_uri] = memory_db
+            self._memory_db = _memory_databases[self._memory_uri]
+            self._memory_lock = self._memory_db.lock
+
+    def flush(self, force: bool = False) -> bool:
+        """Write the in-memory database to db_path with the SQLite backup API.
+
+        Only meaningful in RAM mode. Nothing is written if no variable
+        changed since the last flush by this instance.
+
+        The backup replaces the whole file. If another process committed to
+        the file since this process loaded or last flushed it (detected with
+        ``PRAGMA data_version`` on a connection kept open since the load),
+        those writes would be lost, so the flush is refused instead. A write
+        that lands between this check and the backup itself is not detected;
+        RAM mode assumes no other process writes to the file.
+
+        Parameters
+        ----------
+        force : bool, optional
+            Overwrite the file even if another process changed it, by default False
+
+        Returns
+        -------
+        bool
+            True if the file was written
+
+        Raises
+        ------
+        FlushConflictError
+            If the file was changed by another connection and force is False
+        """
+        if self._memory_uri is None:
+            return False
+        memory_db = self._memory_db
+
+        def _flush_operation():
+            conn = self._connect()
+            seq = conn.execute(f"SELECT {_NEXT_SEQ_SQL}").fetchone()[0]
+            if seq == self._flushed_seq and not force:
+                return False
+            file_version = memory_db.file_conn.execute("PRAGMA data_version").fetchone()[0]
+            if file_version != memory_db.file_version and not force:
+                raise FlushConflictError(
+                    f"{self.db_path} was changed by another connection since it was loaded; "
+                    "flushing would overwrite those changes (use flush(force=True) to overwrite)"
+                )
+            # Writes through file_conn leave its own data_version unchanged
+            conn.backup(memory_db.file_conn)
+            memory_db.file_version = file_version
+            self._flushed_seq = seq
+            return True
+
+        return self._execute_with_retry(_flush_operation)
+
+    def _flush_periodically(self) -> None:
+        """Flush thread for RAM mode: write the database back every flush_interval seconds."""
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except (sqlite3.Error, FlushConflictError) as e:
+                print(f"VariableDB: flushing to {self.db_path} failed: {e}", file=sys.stderr)
+
+    def _purge_periodically(self) -> None:
+        """Purge thread: delete expired variables every purge_interval seconds."""
+        while True:
+            time.sleep(self.purge_interval)
+            try:
+                self.purge_expired()
+            except sqlite3.Error as e:
+                print(f"VariableDB: purging expired variables from {self.db_path} failed: {e}", file=sys.stderr)
+
+    def close(self) -> None:
+        """Close every connection opened by this instance.
+
+        The instance remains usable; the next operation opens a new connection.
+        In RAM mode with a flush interval the database is flushed first; if
+        that raises FlushConflictError, nothing is closed.
+        """
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+            return
+
+        self._save_lock_stats()
+        if self._memory_uri is not None and self.flush_interval is not None:
+            self.flush()
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            notifiers, self._notifiers = self._notifiers, []
+            # data_version numbering is per connection, so caches go with them
+            self._caches = []
+        for conn in connections:
+            conn.close()
+        for notifier in notifiers:
+            notifier.close()
+        self._local = threading.local()
+
+    def _get_cache(self) -> _ReadCache | None:
+        """Return the calling thread's read cache after validating it.
+
+        Returns
+        -------
+        _ReadCache or None
+            Cache whose entries are current, or None if caching is disabled
+        """
+        if not self.cache_enabled:
+            return None
+
+        conn = self._connect()
+        cache = getattr(self._local, "cache", None)
+        if cache is None:
+            cache = _ReadCache()
+            self._local.cache = cache
+            with self._connections_lock:
+                self._caches.append(cache)
+
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != cache.data_version:
+            # Another connection committed since the last check
+            if cache.values:
+                cache.invalidations += 1
+                cache.values.clear()
+            cache.data_version = data_version
+        return cache
+
+    def _invalidate_cache(self) -> None:
+        """Drop the calling thread's cached values after a local write.
+
+        Commits on this thread's own connection do not change its
+        data_version, so local writes must clear the cache explicitly.
+        Caches of other threads are invalidated through data_version.
+        """
+        cache = getattr(self._local, "cache", None)
+        if cache is not None and cache.values:
+            cache.invalidations += 1
+            cache.values.clear()
+
+    def cache_stats(self) -> dict[str, int | float | bool]:
+        """Return read cache counters summed over all threads since the last close().
+
+        Returns
+        -------
+        dict
+            enabled, hits, misses, invalidations, entries and hit_rate
+        """
+        with self._connections_lock:
+            caches = list(self._caches)
+        hits = sum(cache.hits for cache in caches)
+        misses = sum(cache.misses for cache in caches)
+        return {
+            "enabled": self.cache_enabled,
+            "hits": hits,
+            "misses": misses,
+            "invalidations": sum(cache.invalidations for cache in caches),
+            "entries": sum(len(cache.values) for cache in caches),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+    def _init_database(self) -> None:
+        """Initialize the database schema and optimize for multi-process access."""
+        self._ensure_schema(SCHEMA_SLOT_VARIABLES, SCHEMA_VERSION, self._create_schema)
+
+    def _create_schema(self, conn: sqlite3.Connection, current_version: int) -> None:
+        """Create the variables table and migrate older schema versions.
+
+        Parameters
+        ----------
+        conn : sqlite3.Connection
+            Connection with an open write transaction
+        current_version : int
+            Schema version recorded in the database (0 if never initialized)
+
+        Raises
+        ------
+        sqlite3.DatabaseError
+            If the file holds the typed variables table of schema/variable_db.py
+        """
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(variables)")]
+        if "type_name" in columns:
+            raise sqlite3.DatabaseError(
+                f"{self.db_path} holds the typed variables table of schema/variable_db.py; open it with that module"
+            )
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS variables (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                storage TEXT,
+                seq INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expires_at REAL
+            )
+        """)
+
+        if current_version < 2:
+            # Earlier versions kept updated_at current with a self-updating trigger;
+            # writes now set both timestamps in a single UPSERT instead
+            conn.execute("DROP TRIGGER IF EXISTS update_timestamp")
+
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(variables)")]
+        if "seq" not in columns:
+            # Give existing rows distinct sequence numbers
+            conn.execute("ALTER TABLE variables ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+            conn.execute("UPDATE variables SET seq = rowid")
+        if "storage" not in columns:
+            conn.execute("ALTER TABLE variables ADD COLUMN storage TEXT")
+        if "expires_at" not in columns:
+            # Unix time after which the variable is gone (NULL: never expires)
+            conn.execute("ALTER TABLE variables ADD COLUMN expires_at REAL")
+        # Partial index: variables without a TTL cost nothing
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_variables_expires ON variables(expires_at) WHERE expires_at IS NOT NULL"
+        )
+
+        # Deleted variables, kept so that changes_since() can report deletions
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS variable_tombstones (
+                name TEXT PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_variables_seq ON variables(seq)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tombstones_seq ON variable_tombstones(seq)")
+
+        # Large values, compressed when that saves space; variables.storage says how
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS variable_blobs (
+                name TEXT PRIMARY KEY,
+                data BLOB NOT NULL
+            )
+        """)
+
+        # Write-lock contention counters, summed over all processes
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS lock_stats (
+                operation TEXT PRIMARY KEY,
+                waits INTEGER NOT NULL DEFAULT 0,
+                wait_time REAL NOT NULL DEFAULT 0,
+                max_wait REAL NOT NULL DEFAULT 0,
+                retries INTEGER NOT NULL DEFAULT 0,
+                failures INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # Remove the blob once its variable is deleted or becomes small again
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS variable_blobs_on_update
+            AFTER UPDATE OF storage ON variables
+            WHEN OLD.storage IS NOT NULL AND NEW.storage IS NULL
+            BEGIN
+                DELETE FROM variable_blobs WHERE name = OLD.name;
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS variable_blobs_on_delete
+            AFTER DELETE ON variables
+            WHEN OLD.storage IS NOT NULL
+            BEGIN
+                DELETE FROM variable_blobs WHERE name = OLD.name;
+            END
+        """)
+
+        # Named copies of the variable state (create_checkpoint/restore_checkpoint)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS variable_checkpoints (
+                name TEXT PRIMARY KEY,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS variable_checkpoint_values (
+                checkpoint TEXT NOT NULL,
+                name TEXT NOT NULL,
+                value TEXT NOT NULL,
+                storage TEXT,
+                data BLOB,
+                PRIMARY KEY (checkpoint, name)
+            ) WITHOUT ROWID
+        """)
+
+        # Database-wide settings shared by every process, e.g. history retention
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS variable_settings (
+                key TEXT PRIMARY KEY,
+                value
+            )
+        """)
+        # Past revisions while history is enabled. kind says how data is stored:
+        # "delta" against the next newer revision, "text" (zlib), "deleted" (no
+        # value) or the array storage of save_array()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS variable_history (
+                name TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                data BLOB,
+                updated_at TIMESTAMP,
+                PRIMARY KEY (name, seq)
+            ) WITHOUT ROWID
+        """)
+
+    def _ensure_schema(self, slot: int, version: int, create_schema) -> None:
+        """Run ``create_schema`` only if the recorded schema version is out of date.
+
+        ``PRAGMA user_version`` holds one 8-bit schema version per slot, so
+        VariableDB and its extensions (e.g. AuditLogger) can version their
+        tables independently in the same file. When every version is current,
+        initialization costs a single PRAGMA read and no write transaction.
+
+        Parameters
+        ----------
+        slot : int
+            Byte position of this component's version within user_version
+        version : int
+            Schema version the component expects (1-255)
+        create_schema : callable
+            ``create_schema(conn, current_version)`` creating or migrating tables
+        """
+        shift = 8 * slot
+        conn = self._connect()
+        if (conn.execute("PRAGMA user_version").fetchone()[0] >> shift) & 0xFF >= version:
+            return
+
+        # Let vacuum() return free pages without rebuilding the file; this only
+        # takes effect for a new, empty database (or on the next full VACUUM)
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # Enable WAL mode for better concurrency (persistent, cannot run inside a transaction)
+        conn.execute("PRAGMA journal_mode=WAL")
+
+        with conn:
+            # Take the write lock first so concurrent initializers run one at a time
+            conn.execute("BEGIN IMMEDIATE")
+            user_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            current_version = (user_version >> shift) & 0xFF
+            if current_version < version:
+                create_schema(conn, current_version)
+                user_version = (user_version & ~(0xFF << shift)) | (version << shift)
+                conn.execute(f"PRAGMA user_version = {user_version}")
+
+    def _execute_with_retry(self, operation, max_retries: int = 3, operation_name: str | None = None):
+        """Execute database operation with retry logic for concurrent access.
+
+        Waiting for locks is left to SQLite's busy handler (see ``timeout``).
+        An operation is retried only when SQLite reports busy before that
+        budget is spent, which the busy handler cannot resolve by waiting
+        (e.g. a read transaction that cannot be upgraded to a write).
+
+        Parameters
+        ----------
+        operation : callable
+            Database operation to execute
+        max_retries : int, optional
+            Maximum number of attempts, by default 3
+        operation_name : str, optional
+            Name under which lock waits, retries and failures are counted in
+            lock_stats; passed by write operations
+
+        Returns
+        -------
+        Any
+            Result of the operation
+
+        Raises
+        ------
+        sqlite3.OperationalError
+            If the operation fails, or the database stays locked for longer
+            than the busy timeout
+        """
+        previous_name = getattr(self._local, "operation_name", None)
+        self._local.operation_name = operation_name
+        try:
+            for attempt in range(max_retries):
+                start = time.monotonic()
+                try:
+                    with self._memory_lock or contextlib.nullcontext():
+                        return operation()
+                except sqlite3.OperationalError as e:
+                    busy = e.sqlite_errorcode & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+                    if not busy:
+                        raise
+                    # After a full busy timeout, another attempt would only wait again
+                    if attempt < max_retries - 1 and time.monotonic() - start < self.timeout:
+                        self._record_lock_stats(operation_name, retries=1)
+                        time.sleep(random.uniform(0.005, 0.015) * (2 ** attempt))
+                        continue
+                    self._record_lock_stats(operation_name, failures=1)
+                    raise
+        finally:
+            self._local.operation_name = previous_name
+
+    def _begin_write(self, conn: sqlite3.Connection) -> None:
+        """Start a write transaction, taking the write lock up front.
+
+        ``BEGIN IMMEDIATE`` blocks in SQLite's busy handler until the lock is
+        free, so its duration is the time spent waiting for other writers.
+        Waits are counted for the current operation, and pending contention
+        counters are written to lock_stats as part of this transaction.
+        Uncontended writes add no extra work.
+
+        Parameters
+        ----------
+        conn : sqlite3.Connection
+            Connection without an open transaction
+        """
+        start = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        wait = time.perf_counter() - start
+
+        if wait >= _LOCK_WAIT_THRESHOLD:
+            self._record_lock_stats(getattr(self._local, "operation_name", None), wait=wait)
+        if self._pending_lock_stats:
+            self._flush_lock_stats(conn)
+
+    def _record_lock_stats(
+        self, operation_name: str | None, wait: float = 0.0, retries: int = 0, failures: int = 0
+    ) -> None:
+        """Add to the contention counters waiting to be written to lock_stats."""
+        if operation_name is None:
+            return
+        with self._lock_stats_lock:
+            stats = self._pending_lock_stats.setdefault(operation_name, _LockStats())
+            if wait:
+                stats.waits += 1
+                stats.wait_time += wait
+                stats.max_wait = max(stats.max_wait, wait)
+            stats.retries += retries
+            stats.failures += failures
+
+    def _flush_lock_stats(self, conn: sqlite3.Connection) -> None:
+        """Write pending contention counters inside the caller's write transaction."""
+        with self._lock_stats_lock:
+            pending, self._pending_lock_stats = self._pending_lock_stats, {}
+        conn.executemany(
+            _FLUSH_LOCK_STATS_SQL,
+            [
+                (name, st.waits, st.wait_time, st.max_wait, st.retries, st.failures)
+                for name, st in pending.items()
+            ],
+        )
+
+    def _save_lock_stats(self) -> None:
+        """Write pending contention counters in their own transaction (best effort).
+
+        Used on close() and at interpreter exit, so that retries and failures
+        of a process that makes no further writes are not lost. Gives up after
+        one second rather than stalling shutdown on a busy database.
+        """
+        if not self._pending_lock_stats or self._pid != os.getpid():
+            return
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA busy_timeout = 1000")
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                self._flush_lock_stats(conn)
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            conn.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)}")
+
+    def lock_stats(self) -> dict[str, dict[str, int | float]]:
+        """Return write-lock contention counters per operation, summed over all processes.
+
+        Each process records its counters with its next write, on close() or
+        at exit. Writes that got the lock without waiting are not counted;
+        get_change_seq() gives the total number of variable writes.
+
+        Returns
+        -------
+        dict[str, dict]
+            For each operation: waits (writes that waited for the write lock),
+            wait_time and max_wait in seconds, retries and failures
+        """
+        def _lock_stats_operation():
+            conn = self._connect()
+            cursor = conn.execute(
+                "SELECT operation, waits, wait_time, max_wait, retries, failures "
+                "FROM lock_stats ORDER BY operation"
+            )
+            return {
+                row[0]: dict(zip(("waits", "wait_time", "max_wait", "retries", "failures"), row[1:]))
+                for row in cursor
+            }
+
+        return self._execute_with_retry(_lock_stats_operation)
+
+    def _history_versions(self, conn: sqlite3.Connection) -> int:
+        """Return how many past revisions per variable are kept (0 if history is off)."""
+        row = conn.execute(_HISTORY_VERSIONS_SQL).fetchone()
+        return row[0] if row else 0
+
+    def _record_history(self, conn: sqlite3.Connection, changes, max_versions: int) -> None:
+        """Move the current revisions of variables about to change into variable_history.
+
+        Must be called inside a write transaction, before the change. A text
+        revision is stored as a delta against the value replacing it when
+        that is smaller than the compressed full text. Revisions beyond
+        ``max_versions`` per variable are dropped, oldest first.
+
+        Parameters
+        ----------
+        conn : sqlite3.Connection
+            Connection with an open write transaction
+        changes : iterable of (str, str or None)
+            Variable names and their new text values; None if the variable
+            is being deleted or replaced by an array
+        max_versions : int
+            Past revisions to keep per variable
+        """
+        for name, new_text in changes:
+            row = conn.execute(
+                f"SELECT v.value, v.storage, b.data, v.seq, v.updated_at FROM {_VALUE_SOURCE} WHERE v.name = ?",
+                (name,),
+            ).fetchone()
+            if row is None:
+                # Recreated after a deletion: the deletion becomes a past revision
+                row = conn.execute("SELECT seq, deleted_at FROM variable_tombstones WHERE name = ?", (name,)).fetchone()
+                if row is None:
+                    continue
+                revision = (name, row[0], "deleted", None, row[1])
+            else:
+                value, storage, data, seq, updated_at = row
+                if storage is not None and storage.startswith("array:"):
+                    kind = storage
+                else:
+                    text = _decode_value(value, storage, data)
+                    kind, data = "text", zlib.compress(text.encode("utf-8"))
+                    if new_text is not None:
+                        delta = _encode_delta(new_text, text)
+                        if len(delta) < len(data):
+                            kind, data = "delta", delta
+                revision = (name, seq, kind, data, updated_at)
+            conn.execute(
+                "INSERT OR REPLACE INTO variable_history (name, seq, kind, data, updated_at) VALUES (?, ?, ?, ?, ?)",
+                revision,
+            )
+            conn.execute(_TRIM_HISTORY_SQL, (name, name, max_versions))
+
+    def _write_values(self, conn: sqlite3.Connection, variables, expires_at: float | None = None) -> None:
+        """Upsert variables, moving large values into variable_blobs.
+
+        Must be called inside a write transaction.
+
+        Parameters
+        ----------
+        conn : sqlite3.Connection
+            Connection with an open write transaction
+        variables : iterable of (str, str)
+            Variable names and values
+        expires_at : float, optional
+            Unix time at which the variables expire, by default never
+        """
+        variables = list(variables)
+        max_versions = self._history_versions(conn)
+        if max_versions:
+            self._record_history(conn, variables, max_versions)
+
+        rows = []
+        blobs = []
+        for name, value in variables:
+            if len(value) < self.large_value_threshold:
+                rows.append((name, value, None, expires_at))
+                continue
+            data = value.encode("utf-8")
+            compressed = zlib.compress(data)
+            if len(compressed) < len(data):
+                rows.append((name, "", "zlib", expires_at))
+                blobs.append((name, compressed))
+            else:
+                rows.append((name, "", "raw", expires_at))
+                blobs.append((name, data))
+
+        if len(rows) == 1:
+            conn.execute(_UPSERT_SQL, rows[0])
+        else:
+            conn.executemany(_UPSERT_SQL, rows)
+        if blobs:
+            conn.executemany(_UPSERT_BLOB_SQL, blobs)
+
+    def _delete_rows(self, conn: sqlite3.Connection, where: str = "WHERE true", params=()) -> int:
+        """Delete matching variables and record a tombstone for each one.
+
+        Must be called inside a write transaction. Each deleted variable gets
+        its own change sequence number so that changes_since() reports it.
+
+        Parameters
+        ----------
+        conn : sqlite3.Connection
+            Connection with an open write transaction
+        where : str, optional
+            WHERE clause selecting the variables to delete, by default all
+        params : sequence, optional
+            Parameters for the WHERE clause
+
+        Returns
+        -------
+        int
+            Number of variables that were deleted
+        """
+        max_versions = self._history_versions(conn)
+        if max_versions:
+            names = [name for (name,) in conn.execute(f"SELECT name FROM variables {where}", params)]
+            self._record_history(conn, [(name, None) for name in names], max_versions)
+
+        conn.execute(
+            f"""
+            INSERT INTO variable_tombstones (name, seq, deleted_at)
+            SELECT name, {_NEXT_SEQ_SQL} - 1 + row_number() OVER (ORDER BY name), CURRENT_TIMESTAMP
+            FROM variables {where}
+            ON CONFLICT(name) DO UPDATE SET seq = excluded.seq, deleted_at = excluded.deleted_at
+        """,
+            params,
+        )
+        return conn.execute(f"DELETE FROM variables {where}", params).rowcount
+
+    def _replace_variables(self, conn: sqlite3.Connection, source: str, params=()) -> int:
+        """Make the variables table equal to the rows of a query.
+
+        Must be called inside a write transaction. Variables missing from the
+        source are deleted with tombstones and changed ones get new sequence
+        numbers, so the change feed, read caches and watchers see a restore
+        like any other write. Unchanged variables are left untouched.
+
+        Parameters
+        ----------
+        conn : sqlite3.Connection
+            Connection with an open write transaction
+        source : str
+            SELECT returning name, value, storage and blob data columns
+        params : sequence, optional
+            Parameters for the query
+
+        Returns
+        -------
+        int
+            Number of variables in the restored state
+        """
+        conn.execute("DROP TABLE IF EXISTS temp.restore_source")
+        conn.execute(f"CREATE TEMP TABLE restore_source AS {source}", params)
+        # Source rows that differ from the current value
+        changed = f"""
+            FROM temp.restore_source AS s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {_VALUE_SOURCE}
+                WHERE v.name = s.name AND v.value = s.value
+                  AND v.storage IS s.storage AND b.data IS s.data AND v.expires_at IS NULL
+            )
+        """
+        try:
+            self._delete_rows(conn, "WHERE name NOT IN (SELECT name FROM temp.restore_source)")
+            max_versions = self._history_versions(conn)
+            if max_versions:
+                cursor = conn.execute(f"SELECT s.name, s.value, s.storage, s.data {changed}")
+                self._record_history(
+                    conn,
+                    [
+                        (name, None if storage and storage.startswith("array:") else _decode_value(value, storage, data))
+                        for name, value, storage, data in cursor.fetchall()
+                    ],
+                    max_versions,
+                )
+            conn.execute(f"""
+                INSERT INTO variables (name, value, storage, seq, created_at, updated_at)
+                SELECT s.name, s.value, s.storage,
+                       {_NEXT_SEQ_SQL} - 1 + row_number() OVER (ORDER BY s.name),
+                       CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+                {changed}
+                ON CONFLICT(name) DO UPDATE SET value = excluded.value,
+                                                storage = excluded.storage,
+                                                expires_at = NULL,
+                                                seq = excluded.seq,
+                                                updated_at = excluded.updated_at
+            """)
+            conn.execute("""
+                INSERT INTO variable_blobs (name, data)
+                SELECT name, data FROM temp.restore_source WHERE storage IS NOT NULL
+                ON CONFLICT(name) DO UPDATE SET data = excluded.data
+            """)
+            return conn.execute("SELECT count(*) FROM temp.restore_source").fetchone()[0]
+        finally:
+            conn.execute("DROP TABLE temp.restore_source")
+
+    def save_variable(self, name: str, value: str, ttl: float | None = None) -> None:
+        """Save or update a variable in the database.
+
+        This method replaces the JSON file save operation from CLAUDE.md.
+        When a user requests "{{variable_name}}にVALUEを保存してください",
+        this method handles the storage.
+
+        Parameters
+        ----------
+        name : str
+            Variable name (without the {{}} brackets)
+        value : str
+            Variable value to store
+        ttl : float, optional
+            Seconds until the variable expires, by default never. Saving
+            again without a ttl makes the variable permanent.
+        """
+        expires_at = expiry_time(ttl)
+
+        def _save_operation():
+            conn = self._connect()
+            with conn:
+                self._begin_write(conn)
+                self._write_values(conn, [(name, value)], expires_at)
+        
+        self._execute_with_retry(_save_operation, operation_name="save_variable")
+        self._invalidate_cache()
+
+    def get_variable(self, name: str, at: int | str | datetime | None = None) -> str:
+        """Retrieve a variable value from the database.
+
+        This method replaces the JSON file read operation from CLAUDE.md.
+        When a user requests "{{variable_name}}を取得してください",
+        this method handles the retrieval.
+
+        Parameters
+        ----------
+        name : str
+            Variable name (without the {{}} brackets)
+        at : int, str or datetime, optional
+            Return the value as of this change sequence number (int) or
+            point in time (datetime, or "YYYY-MM-DD HH:MM:SS" in UTC) instead
+            of the current one. Past values are only available while history
+            is enabled (see enable_history())
+
+        Returns
+        -------
+        str
+            Variable value, or empty string if not found
+        """
+        if at is not None:
+            # Compare change sequence numbers, or timestamps
+            key, limit = (0, at) if isinstance(at, int) else (1, _format_timestamp(at))
+
+            def _get_at_operation():
+                conn = self._connect()
+                with conn:
+                    # One read transaction, so the revisions form a consistent chain
+                    conn.execute("BEGIN")
+                    for revision in _iter_revisions(conn, name):
+                        if revision[key] <= limit:
+                            return revision[2] or ""
+                return ""
+
+            return self._execute_with_retry(_get_at_operation)
+
+        cache = self._get_cache()
+        if cache is not None and name in cache.values:
+            cache.hits += 1
+            return cache.values[name]
+
+        def _get_operation():
+            conn = self._connect()
+            result = conn.execute(_GET_VALUE_EXPIRY_SQL, (name,)).fetchone()
+            return (_decode_value(*result[:3]), result[3]) if result else ("", None)
+        
+        value, expires_at = self._execute_with_retry(_get_operation)
+        if cache is not None:
+            cache.misses += 1
+            # The cache is only invalidated by writes, not by expiry
+            if expires_at is None:
+                cache.values[name] = value
+        return value
+
+    def list_variables(self, prefix: str = "", include_values: bool = True) -> dict[str, str] | list[str]:
+        """List all variables in the database, or those whose names start with a prefix.
+
+        Parameters
+        ----------
+        prefix : str, optional
+            Only list names starting with this prefix (e.g. "agent_3_"), by
+            default all variables. Uses a primary-key range scan.
+        include_values : bool, optional
+            If False, return only the names so that large values are not
+            read or copied, by default True
+
+        Returns
+        -------
+        Dict[str, str] or List[str]
+            Dictionary mapping variable names to their values, or the sorted
+            list of names when include_values is False
+        """
+        def _list_operation():
+            conn = self._connect()
+            if not include_values:
+                where, params = _prefix_range(prefix, "v.name")
+                cursor = conn.execute(
+                    f"SELECT v.name FROM variables AS v {where} AND {_NOT_EXPIRED} ORDER BY v.name", params
+                )
+                return [row[0] for row in cursor]
+            where, params = _prefix_range(prefix, "v.name")
+            cursor = conn.execute(
+                f"SELECT v.name, v.value, v.storage, b.data FROM {_VALUE_SOURCE} {where} AND {_NOT_EXPIRED} "
+                "ORDER BY v.name",
+                params,
+            )
+            return {name: _decode_value(value, storage, data) for name, value, storage, data in cursor}
+        
+        return self._execute_with_retry(_list_operation)
+
+    def delete_variable(self, name: str) -> bool:
+        """Delete a variable from the database.
+
+        Parameters
+        ----------
+        name : str
+            Variable name to delete
+
+        Returns
+        -------
+        bool
+            True if variable was deleted, False if it didn't exist
+        """
+        def _delete_operation():
+            conn = self._connect()
+            with conn:
+                self._begin_write(conn)
+                deleted = self._delete_rows(conn, "WHERE name = ?", (name,))
+            return deleted > 0
+        
+        result = self._execute_with_retry(_delete_operation, operation_name="delete_variable")
+        self._invalidate_cache()
+        return result
+
+    def clear_all(self) -> int:
+        """Clear all variables from the database.
+
+        Returns
+        -------
+        int
+            Number of variables that were deleted
+        """
+        def _clear_operation():
+            conn = self._connect()
+            with conn:
+                self._begin_write(conn)
+                deleted = self._delete_rows(conn)
+            return deleted
+        
+        result = self._execute_with_retry(_clear_operation, operation_name="clear_all")
+        self._invalidate_cache()
+        return result
+
+    def delete_prefix(self, prefix: str) -> int:
+        """Delete all variables whose names start with a prefix.
+
+        Parameters
+        ----------
+        prefix : str
+            Name prefix, e.g. "agent_3_". An empty prefix deletes everything.
+
+        Returns
+        -------
+        int
+            Number of variables that were deleted
+        """
+        def _delete_prefix_operation():
+            conn = self._connect()
+            with conn:
+                self._begin_write(conn)
+                deleted = self._delete_rows(conn, *self._prefix_where(prefix))
+            return deleted
+
+        result = self._execute_with_retry(_delete_prefix_operation, operation_name="delete_prefix")
+        self._invalidate_cache()
+        return result
+
+    def namespace(self, name: str, separator: str = "_") -> "VariableNamespace":
+        """Return a view of the variables under ``name + separator``.
+
+        Parameters
+        ----------
+        name : str
+            Namespace name, e.g. "agent_3"
+        separator : str, optional
+            Separator between the namespace and variable names, by default "_"
+
+        Returns
+        -------
+        VariableNamespace
+            View whose variable names are relative to the namespace, so that
+            ``db.namespace("agent_3").get_variable("theme")`` reads ``agent_3_theme``
+        """
+        return VariableNamespace(self, name + separator)
+
+    def render(self, text: str, params: dict | None = None, missing: str | None = None) -> str:
+        """Replace the {{variable}} placeholders of a macro or prompt with their values.
+
+        Placeholders may be nested, e.g. ``{{agent_{{AGENT_ID}}_theme}}``:
+        the inner name is resolved first and its value becomes part of the
+        outer name. All variables the template refers to are fetched with
+        one get_variables() query per nesting level that needs the database
+        (a single query for the usual templates), and parsed templates are
+        cached.
+
+        Parameters
+        ----------
+        text : str
+            Template text
+        params : dict, optional
+            Values that take precedence over variables, e.g. {"AGENT_ID": 3}
+        missing : str, optional
+            Replacement for variables that are not set (or empty); by default
+            their placeholder is kept with its name resolved, e.g.
+            ``{{agent_3_haiku}}``, so the macro can still save to it
+
+        Returns
+        -------
+        str
+            The rendered text
+        """
+        return _render_template(self.get_variables, text, params or {}, missing)
+
+    def get_variable_info(self, name: str) -> dict[str, str] | None:
+        """Get detailed information about a variable.
+
+        Parameters
+        ----------
+        name : str
+            Variable name
+
+        Returns
+        -------
+        Optional[Dict[str, str]]
+            Dictionary with name, value, created_at, updated_at, or None if not found
+        """
+        def _info_operation():
+            conn = self._connect()
+            result = conn.execute(
+                f"""
+                SELECT v.name, v.value, v.storage, b.data, v.created_at, v.updated_at, v.expires_at
+                FROM {_VALUE_SOURCE} WHERE v.name = ? AND {_NOT_EXPIRED}
+            """,
+                (name,),
+            ).fetchone()
+            if result:
+                return {
+                    "name": result[0],
+                    "value": _decode_value(result[1], result[2], result[3]),
+                    "created_at": result[4],
+                    "updated_at": result[5],
+                    "expires_at": None if result[6] is None else _format_timestamp(
+                        datetime.fromtimestamp(result[6], timezone.utc)
+                    ),
+                }
+            return None
+        
+        return self._execute_with_retry(_info_operation)
+
+    def get_variable_range(self, name: str, offset: int = 0, length: int | None = None) -> str:
+        """Read part of a variable value without loading all of it.
+
+        Equivalent to ``get_variable(name)[offset:offset + length]``. Large
+        values are streamed from variable_blobs with ``Connection.blobopen``
+        and decompressed incrementally, stopping once the range is complete.
+
+        Parameters
+        ----------
+        name : str
+            Variable name (without the {{}} brackets)
+        offset : int, optional
+            Index of the first character to return, by default 0
+        length : int, optional
+            Maximum number of characters to return, by default the rest of the value
+
+        Returns
+        -------
+        str
+            The requested characters, or empty string if the variable is not found
+        """
+        end = None if length is None else offset + length
+
+        def _range_operation():
+            conn = self._connect()
+            with conn:
+                # One read transaction keeps the row and its blob consistent
+                conn.execute("BEGIN")
+                result = conn.execute(
+                    "SELECT v.value, v.storage, b.rowid FROM variables AS v "
+                    f"LEFT JOIN variable_blobs AS b ON b.name = v.name WHERE v.name = ? AND {_NOT_EXPIRED}",
+                    (name,),
+                ).fetchone()
+                if not result:
+                    return ""
+                value, storage, blob_rowid = result
+                if storage is None:
+                    return value[offset:end]
+                if storage.startswith("array:"):
+                    # The text of an array only exists once it is rendered
+                    data = conn.execute("SELECT data FROM variable_blobs WHERE rowid = ?", (blob_rowid,)).fetchone()[0]
+                    return _decode_value(value, storage, data)[offset:end]
+
+                decompressor = zlib.decompressobj() if storage == "zlib" else None
+                decoder = codecs.getincrementaldecoder("utf-8")()
+                text = []
+                position = 0  # Characters decoded so far
+                with conn.blobopen("variable_blobs", "data", blob_rowid, readonly=True) as blob:
+                    while end is None or position < end:
+                        data = blob.read(_BLOB_READ_SIZE)
+                        if decompressor is not None:
+                            data = decompressor.decompress(data) if data else decompressor.flush()
+                        chunk = decoder.decode(data, final=not data)
+                        if chunk:
+                            text.append(chunk[max(0, offset - position):])
+                            position += len(chunk)
+                        if not data:
+                            break
+                return "".join(text)[:None if end is None else end - offset]
+
+        return self._execute_with_retry(_range_operation)
+
+    def save_variables(self, variables: dict[str, str], ttl: float | None = None) -> None:
+        """Save or update several variables in a single transaction.
+
+        Parameters
+        ----------
+        variables : dict[str, str]
+            Mapping of variable names (without the {{}} brackets) to values
+        ttl : float, optional
+            Seconds until the variables expire, by default never
+        """
+        expires_at = expiry_time(ttl)
+
+        def _save_many_operation():
+            conn = self._connect()
+            with conn:
+                self._begin_write(conn)
+                self._write_values(conn, variables.items(), expires_at)
+
+        if variables:
+            self._execute_with_retry(_save_many_operation, operation_name="save_variables")
+            self._invalidate_cache()
+
+    def get_variables(self, names: list[str]) -> dict[str, str]:
+        """Retrieve several variables with one query.
+
+        Parameters
+        ----------
+        names : list[str]
+            Variable names (without the {{}} brackets)
+
+        Returns
+        -------
+        dict[str, str]
+            Mapping of each requested name to its value, or empty string if not found
+        """
+        names = list(dict.fromkeys(names))
+        cache = self._get_cache()
+        cached = {}
+        missing = names
+        if cache is not None:
+            cached = {name: cache.values[name] for name in names if name in cache.values}
+            missing = [name for name in names if name not in cached]
+            cache.hits += len(cached)
+
+        expiring = set()
+
+        def _get_many_operation():
+            expiring.clear()
+            found = self._read_values(self._connect(), missing, expiring)
+            return {name: found.get(name, "") for name in missing}
+
+        if missing:
+            fetched = self._execute_with_retry(_get_many_operation)
+            if cache is not None:
+                cache.misses += len(fetched)
+                cache.values.update((name, value) for name, value in fetched.items() if name not in expiring)
+            cached.update(fetched)
+        return {name: cached[name] for name in names}
+
+    def _read_values(
+        self, conn: sqlite3.Connection, names: list[str], expiring: set[str] | None = None
+    ) -> dict[str, str]:
+        """Return the values of the existing, unexpired variables among ``names``.
+
+        Parameters
+        ----------
+        conn : sqlite3.Connection
+            Connection to read with, possibly inside a write transaction
+        names : list[str]
+            Distinct variable names
+        expiring : set[str], optional
+            Receives the names of the returned variables that have a TTL
+
+        Returns
+        -------
+        dict[str, str]
+            Values of the variables that exist
+        """
+        found = {}
+        for start in range(0, len(names), _MAX_BATCH_PARAMS):
+            chunk = names[start:start + _MAX_BATCH_PARAMS]
+            placeholders = ", ".join("?" * len(chunk))
+            cursor = conn.execute(
+                f"SELECT v.name, v.value, v.storage, b.data, v.expires_at FROM {_VALUE_SOURCE} "
+                f"WHERE v.name IN ({placeholders}) AND {_NOT_EXPIRED}",
+                chunk,
+            )
+            for name, value, storage, data, expires_at in cursor:
+                found[name] = _decode_value(value, storage, data)
+                if expires_at is not None and expiring is not None:
+                    expiring.add(name)
+        return found
+
+    def _select_values(self, conn: sqlite3.Connection, where: str = "WHERE true", params=()) -> dict[str, str]:
+        """Return the values of the variables matching a WHERE clause, including expired ones.
+
+        Parameters
+        ----------
+        conn : sqlite3.Connection
+            Connection to read with, possibly inside a write transaction
+        where : str, optional
+            WHERE clause on the variables table, by default all variables
+        params : sequence, optional
+            Parameters for the WHERE clause
+
+        Returns
+        -------
+        dict[str, str]
+            Values of the matching variables; arrays as comma-separated numbers
+        """
+        cursor = conn.execute(
+            f"SELECT v.name, v.value, v.storage, b.data FROM {_VALUE_SOURCE} "
+            f"WHERE v.name IN (SELECT name FROM variables {where})",
+            params,
+        )
+        return {name: _decode_value(value, storage, data) for name, value, storage, data in cursor}
+
+    @staticmethod
+    def _names_where(names: list[str]) -> list[tuple[str, list[str]]]:
+        """Return (WHERE clause, parameters) pairs selecting the distinct names, _MAX_BATCH_PARAMS at a time."""
+        names = list(dict.fromkeys(names))
+        clauses = []
+        for start in range(0, len(names), _MAX_BATCH_PARAMS):
+            chunk = names[start:start + _MAX_BATCH_PARAMS]
+            clauses.append((f"WHERE name IN ({', '.join('?' * len(chunk))})", chunk))
+        return clauses
+
+    # (WHERE clause, parameters) selecting the names that start with a prefix
+    _prefix_where = staticmethod(_prefix_range)
+
+    def delete_variables(self, names: list[str]) -> int:
+        """Delete several variables in a single transaction.
+
+        Parameters
+        ----------
+        names : list[str]
+            Variable names to delete
+
+        Returns
+        -------
+        int
+            Number of variables that were deleted
+        """
+        clauses = self._names_where(names)
+
+        def _delete_many_operation():
+            conn = self._connect()
+            deleted = 0
+            with conn:
+                self._begin_write(conn)
+                for where, params in clauses:
+                    deleted += self._delete_rows(conn, where, params)
+            return deleted
+
+        result = self._execute_with_retry(_delete_many_operation, operation_name="delete_variables")
+        self._invalidate_cache()
+        return result
+
+    def save_array(self, name: str, values, typecode: str | None = None) -> None:
+        """Save a numeric array as packed binary instead of text.
+
+        The elements are stored as one BLOB together with their format and
+        shape. get_array() returns them without parsing; get_variable() and
+        the other text APIs still see comma-separated numbers.
+
+        Parameters
+        ----------
+        name : str
+            Variable name (without the {{}} brackets)
+        values : sequence of numbers, array.array or numpy.ndarray
+            Any object supporting the buffer protocol is stored with its own
+            element format and shape; lists and tuples are packed first
+        typecode : str, optional
+            array module typecode used to pack a list or tuple, by default
+            "q" (64-bit integers) if all elements are ints, otherwise "d" (doubles)
+
+        Raises
+        ------
+        ValueError
+            If the element format is not a native numeric format
+        """
+        try:
+            view = memoryview(values)
+        except TypeError:
+            if typecode is None:
+                typecode = "q" if all(isinstance(v, int) for v in values) else "d"
+            view = memoryview(array.array(typecode, values))
+        if view.format not in _ARRAY_FORMATS:
+            raise ValueError(f"Unsupported array element format: {view.format}")
+
+        storage = f"array:{view.format}:{','.join(map(str, view.shape))}"
+        # Pass contiguous buffers to SQLite without an intermediate copy
+        data = view.cast("B") if view.c_contiguous else view.tobytes()
+
+        def _save_array_operation():
+            conn = self._connect()
+            with conn:
+                self._begin_write(conn)
+                self._write_array(conn, name, storage, data)
+
+        self._execute_with_retry(_save_array_operation, operation_name="save_array")
+        self._invalidate_cache()
+
+    def _write_array(self, conn: sqlite3.Connection, name: str, storage: str, data) -> None:
+        """Upsert a packed array variable. Must be called inside a write transaction.
+
+        Parameters
+        ----------
+        conn : sqlite3.Connection
+            Connection with an open write transaction
+        name : str
+            Variable name
+        storage : str
+            ``array:<format>:<shape>`` description of data
+        data : bytes-like
+            Packed array elements
+        """
+        max_versions = self._history_versions(conn)
+        if max_versions:
+            self._record_history(conn, [(name, None)], max_versions)
+        conn.execute(_UPSERT_SQL, (name, "", storage, None))
+        conn.execute(_UPSERT_BLOB_SQL, (name, data))
+
+    def get_array(self, name: str, as_numpy: bool = False):
+        """Retrieve an array saved by save_array().
+
+        Variables holding comma-separated text (e.g. written by a macro) are
+        parsed into an array of doubles.
+
+        Parameters
+        ----------
+        name : str
+            Variable name (without the {{}} brackets)
+        as_numpy : bool, optional
+            Return a read-only numpy.ndarray view instead of a memoryview,
+            by default False. Requires NumPy.
+
+        Returns
+        -------
+        memoryview, numpy.ndarray or None
+            Typed view of the stored elements with their original shape, or
+            None if the variable does not exist
+        """
+        def _get_array_operation():
+            conn = self._connect()
+            return conn.execute(_GET_VALUE_SQL, (name,)).fetchone()
+
+        result = self._execute_with_retry(_get_array_operation)
+        if result is None:
+            return None
+        value, storage, data = result
+        if storage is not None and storage.startswith("array:"):
+            view = _decode_array(storage, data)
+        else:
+            text = _decode_value(value, storage, data)
+            view = memoryview(array.array("d", [float(x) for x in text.split(",") if x.strip()]))
+
+        if not as_numpy:
+            return view
+        import numpy
+
+        return numpy.frombuffer(view, dtype=view.format).reshape(view.shape)
+
+    def snapshot(self, path: str | Path, pages: int = _BACKUP_PAGES) -> None:
+        """Copy the whole database to a file with the SQLite online backup API.
+
+        Pages are copied in steps, releasing the read lock in between, so
+        writers are never blocked by a snapshot. The copy is a consistent
+        image of the database and can be opened as a VariableDB to fork state.
+
+        Parameters
+        ----------
+        path : str or Path
+            Destination file; an existing database there is overwritten
+        pages : int, optional
+            Pages copied per step, by default 256
+        """
+        def _snapshot_operation():
+            target = sqlite3.connect(path)
+            try:
+                self._connect().backup(target, pages=pages)
+            finally:
+                target.close()
+
+        self._execute_with_retry(_snapshot_operation)
+
+    def restore(self, path: str | Path) -> int:
+        """Replace all variables with those stored in a snapshot file.
+
+        The restore runs as one write transaction that only touches changed
+        variables, and is recorded in the change feed like any other write.
+        Audit logs and checkpoints of this database are kept.
+
+        Parameters
+        ----------
+        path : str or Path
+            Snapshot created by snapshot(), or a variables database written
+            by an older version of this module
+
+        Returns
+        -------
+        int
+            Number of variables after the restore
+
+        Raises
+        ------
+        FileNotFoundError
+            If the snapshot file does not exist
+        """
+        if not Path(path).is_file():
+            raise FileNotFoundError(f"Snapshot not found: {path}")
+
+        def _restore_operation():
+            conn = self._connect()
+            conn.execute("ATTACH DATABASE ? AS snapshot", (str(path),))
+            try:
+                with conn:
+                    self._begin_write(conn)
+                    has_blobs = conn.execute(
+                        "SELECT 1 FROM snapshot.sqlite_master WHERE type = 'table' AND name = 'variable_blobs'"
+                    ).fetchone()
+                    if has_blobs:
+                        source = (
+                            "SELECT s.name, s.value, s.storage, b.data FROM snapshot.variables AS s "
+                            "LEFT JOIN snapshot.variable_blobs AS b ON b.name = s.name"
+                        )
+                    else:
+                        # Databases from before large-value storage hold every value inline
+                        source = "SELECT name, value, NULL AS storage, NULL AS data FROM snapshot.variables"
+                    return self._replace_variables(conn, source)
+            finally:
+                conn.execute("DETACH DATABASE snapshot")
+
+        result = self._execute_with_retry(_restore_operation, operation_name="restore")
+        self._invalidate_cache()
+        return result
+
+    def create_checkpoint(self, name: str) -> int:
+        """Store a copy of all current variables under a checkpoint name.
+
+        An existing checkpoint with the same name is replaced.
+
+        Parameters
+        ----------
+        name : str
+            Checkpoint name, e.g. "after_research"
+
+        Returns
+        -------
+        int
+            Number of variables in the checkpoint
+        """
+        def _checkpoint_operation():
+            conn = self._connect()
+            with conn:
+                self._begin_write(conn)
+                conn.execute("DELETE FROM variable_checkpoint_values WHERE checkpoint = ?", (name,))
+                cursor = conn.execute(
+                    f"""
+                    INSERT INTO variable_checkpoint_values (checkpoint, name, value, storage, data)
+                    SELECT ?, v.name, v.value, v.storage, b.data FROM {_VALUE_SOURCE} WHERE {_NOT_EXPIRED}
+                """,
+                    (name,),
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO variable_checkpoints (name, created_at) VALUES (?, CURRENT_TIMESTAMP)",
+                    (name,),
+                )
+            return cursor.rowcount
+
+        return self._execute_with_retry(_checkpoint_operation, operation_name="create_checkpoint")
+
+    def restore_checkpoint(self, name: str) -> int:
+        """Replace all variables with the state saved by create_checkpoint().
+
+        Parameters
+        ----------
+        name : str
+            Checkpoint name
+
+        Returns
+        -------
+        int
+            Number of variables after the restore
+
+        Raises
+        ------
+        KeyError
+            If no checkpoint with this name exists
+        """
+        def _restore_operation():
+            conn = self._connect()
+            with conn:
+                self._begin_write(conn)
+                if conn.execute("SELECT 1 FROM variable_checkpoints WHERE name = ?", (name,)).fetchone() is None:
+                    raise KeyError(f"Unknown checkpoint: {name}")
+                return self._replace_variables(
+                    conn,
+                    "SELECT name, value, storage, data FROM variable_checkpoint_values WHERE checkpoint = ?",
+                    (name,),
+                )
+
+        result = self._execute_with_retry(_restore_operation, operation_name="restore_checkpoint")
+        self._invalidate_cache()
+        return result
+
+    def list_checkpoints(self) -> dict[str, str]:
+        """List checkpoint names with their creation times.
+
+        Returns
+        -------
+        dict[str, str]
+            Mapping of checkpoint name to created_at, oldest first
+        """
+        def _list_operation():
+            conn = self._connect()
+            cursor = conn.execute("SELECT name, created_at FROM variable_checkpoints ORDER BY created_at, name")
+            return dict(cursor.fetchall())
+
+        return self._execute_with_retry(_list_operation)
+
+    def delete_checkpoint(self, name: str) -> bool:
+        """Delete a checkpoint.
+
+        Parameters
+        ----------
+        name : str
+            Checkpoint name
+
+        Returns
+        -------
+        bool
+            True if the checkpoint was deleted, False if it didn't exist
+        """
+        def _delete_operation():
+            conn = self._connect()
+            with conn:
+                self._begin_write(conn)
+                conn.execute("DELETE FROM variable_checkpoint_values WHERE checkpoint = ?", (name,))
+                cursor = conn.execute("DELETE FROM variable_checkpoints WHERE name = ?", (name,))
+            return cursor.rowcount > 0
+
+        return self._execute_with_retry(_delete_operation, operation_name="delete_checkpoint")
+
+    def purge_expired(
+        self, batch_size: int = PURGE_BATCH_SIZE, tombstone_retention: float | None = TOMBSTONE_RETENTION
+    ) -> int:
+        """Delete expired variables.
+
+        Reads already skip expired variables; purging removes their rows so
+        the table and its indexes stay small, and records tombstones so that
+        changes_since() reports the deletions. Tombstones older than
+        ``tombstone_retention`` are pruned afterwards (see prune_tombstones()),
+        so short-lived variables do not accumulate there instead. Each batch
+        is its own short write transaction, so agents are never blocked for
+        long.
+
+        Parameters
+        ----------
+        batch_size : int, optional
+            Variables deleted per transaction, by default PURGE_BATCH_SIZE
+        tombstone_retention : float, optional
+            Age in seconds of the tombstones to prune, by default
+            TOMBSTONE_RETENTION (one day); None keeps all tombstones
+
+        Returns
+        -------
+        int
+            Number of variables deleted
+        """
+        def _purge_operation():
+            conn = self._connect()
+            with conn:
+                self._begin_write(conn)
+                # Uses the partial index on expires_at
+                names = [name for (name,) in conn.execute(
+                    "SELECT name FROM variables WHERE expires_at <= ? ORDER BY expires_at LIMIT ?",
+                    (time.time(), batch_size),
+                )]
+                if not names:
+                    return 0
+                placeholders = ", ".join("?" * len(names))
+                return self._delete_rows(conn, f"WHERE name IN ({placeholders})", names)
+
+        purged = 0
+        while True:
+            deleted = self._execute_with_retry(_purge_operation, operation_name="purge_expired")
+            purged += deleted
+            if deleted < batch_size:
+                break
+        if purged:
+            self._invalidate_cache()
+        if tombstone_retention is not None:
+            self.prune_tombstones(tombstone_retention, batch_size)
+        return purged
+
+    def prune_tombstones(self, older_than: float = TOMBSTONE_RETENTION, batch_size: int = PURGE_BATCH_SIZE) -> int:
+        """Delete the tombstones of variables deleted more than ``older_than`` seconds ago.
+
+        Every deletion leaves a tombstone so that changes_since() can report
+        it. Readers that fall further behind than ``older_than`` miss pruned
+        deletions (changes_since(0), the full state, is unaffected). The
+        newest tombstone and those of variables with history are kept.
+
+        Parameters
+        ----------
+        older_than : float, optional
+            Minimum age in seconds, by default TOMBSTONE_RETENTION (one day)
+        batch_size : int, optional
+            Tombstones deleted per transaction, by default PURGE_BATCH_SIZE
+
+        Returns
+        -------
+        int
+            Number of tombstones deleted
+        """
+        params = (f"-{float(older_than)} seconds", batch_size)
+
+        def _prune_operation():
+            conn = self._connect()
+            with conn:
+                self._begin_write(conn)
+                return conn.execute(_PRUNE_TOMBSTONES_SQL, params).rowcount
+
+        pruned = 0
+        while True:
+            deleted = self._execute_with_retry(_prune_operation, operation_name="prune_tombstones")
+            pruned += deleted
+            if deleted < batch_size:
+                return pruned
+
+    def storage_stats(self) -> dict[str, int | float | str]:
+        """Report the size of the database and WAL files and how full the pages are.
+
+        Returns
+        -------
+        dict[str, int | float | str]
+            db_bytes and wal_bytes (file sizes), page_size, page_count,
+            free_pages (pages on the freelist, reclaimable by vacuum()),
+            free_ratio (free_pages / page_count) and auto_vacuum mode
+        """
+        def _stats_operation():
+            conn = self._connect()
+            return {
+                "page_size": conn.execute("PRAGMA page_size").fetchone()[0],
+                "page_count": conn.execute("PRAGMA page_count").fetchone()[0],
+                "free_pages": conn.execute("PRAGMA freelist_count").fetchone()[0],
+                "auto_vacuum": _AUTO_VACUUM_MODES[conn.execute("PRAGMA auto_vacuum").fetchone()[0]],
+            }
+
+        stats = self._execute_with_retry(_stats_operation)
+        wal_path = self.db_path.with_name(self.db_path.name + "-wal")
+        stats["db_bytes"] = self.db_path.stat().st_size if self.db_path.exists() else 0
+        stats["wal_bytes"] = wal_path.stat().st_size if wal_path.exists() else 0
+        stats["free_ratio"] = stats["free_pages"] / stats["page_count"] if stats["page_count"] else 0.0
+        return stats
+
+    def checkpoint_wal(self, mode: str = "PASSIVE", busy_timeout: float = 1.0) -> dict[str, int]:
+        """Copy committed transactions from the WAL back into the database file.
+
+        PASSIVE copies what it can without waiting for anyone. FULL, RESTART
+        and TRUNCATE wait up to ``busy_timeout`` for writers and for readers
+        still using older snapshots; TRUNCATE then also cuts the -wal file
+        to zero bytes. A reader that keeps an old snapshot open stops the WAL
+        from being reused, which is what makes it grow.
+
+        Parameters
+        ----------
+        mode : str, optional
+            "PASSIVE", "FULL", "RESTART" or "TRUNCATE", by default "PASSIVE"
+        busy_timeout : float, optional
+            Seconds to wait in the blocking modes, by default 1.0
+
+        Returns
+        -------
+        dict[str, int]
+            busy (1 if the checkpoint could not finish), wal_frames and
+            checkpointed_frames (-1 if the database is not in WAL mode)
+
+        Raises
+        ------
+        ValueError
+            If mode is not a checkpoint mode
+        """
+        mode = mode.upper()
+        if mode not in _CHECKPOINT_MODES:
+            raise ValueError(f"Unknown checkpoint mode: {mode}")
+
+        def _checkpoint_operation():
+            conn = self._connect()
+            conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+            try:
+                busy, wal_frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+            finally:
+                conn.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)}")
+            return {"busy": busy, "wal_frames": wal_frames, "checkpointed_frames": checkpointed}
+
+        return self._execute_with_retry(_checkpoint_operation)
+
+    def vacuum(self, pages: int | None = None, full: bool = False) -> int:
+        """Return free database pages to the file system.
+
+        By default this runs an incremental vacuum, which only moves pages
+        at the end of the file and takes the write lock briefly. It requires
+        ``auto_vacuum=INCREMENTAL``, which new databases use; older ones
+        are switched over by one ``full=True`` run. A full VACUUM rebuilds the
+        whole file, holding the write lock throughout, so run it while no
+        agents are active.
+
+        Parameters
+        ----------
+        pages : int, optional
+            Maximum number of pages to release, by default all free pages
+        full : bool, optional
+            Rebuild the database with VACUUM and enable incremental
+            auto-vacuum, by default False
+
+        Returns
+        -------
+        int
+            Number of pages by which the database shrank
+        """
+        def _vacuum_operation():
+            conn = self._connect()
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            if full:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+            elif conn.execute("PRAGMA auto_vacuum").fetchone()[0] == _AUTO_VACUUM_MODES.index("incremental"):
+                # Every step of this PRAGMA releases one page; execute() would only run
+                # the first step, executescript() runs the statement to completion
+                conn.executescript(f"PRAGMA incremental_vacuum({int(pages or 0)})")
+            return page_count - conn.execute("PRAGMA page_count").fetchone()[0]
+
+        return self._execute_with_retry(_vacuum_operation, operation_name="vacuum")
+
+    def maintain(
+        self,
+        truncate_wal_bytes: int = WAL_TRUNCATE_BYTES,
+        vacuum_free_ratio: float = VACUUM_FREE_RATIO,
+        busy_timeout: float = 1.0,
+    ) -> dict:
+        """Run one round of routine maintenance for a long-running deployment.
+
+        1. Delete expired variables (purge_expired()) and tombstones older
+           than TOMBSTONE_RETENTION (prune_tombstones()).
+        2. Incremental vacuum if at least ``vacuum_free_ratio`` of the pages
+           are free.
+        3. PASSIVE checkpoint, which never blocks readers or writers and
+           also shrinks the database file after a vacuum.
+        4. TRUNCATE checkpoint if the WAL file is at least
+           ``truncate_wal_bytes``, waiting at most ``busy_timeout``.
+
+        Parameters
+        ----------
+        truncate_wal_bytes : int, optional
+            WAL size that triggers a TRUNCATE checkpoint, by default 4 MiB
+        vacuum_free_ratio : float, optional
+            Share of free pages that triggers a vacuum, by default 0.1
+        busy_timeout : float, optional
+            Seconds the TRUNCATE checkpoint may wait, by default 1.0
+
+        Returns
+        -------
+        dict
+            before and after (storage_stats()), checkpoint (result of the
+            last checkpoint_wal() call), truncated (bool), vacuumed_pages,
+            purged (expired variables deleted) and pruned_tombstones
+        """
+        purged = self.purge_expired(tombstone_retention=None)
+        pruned_tombstones = self.prune_tombstones()
+        before = self.storage_stats()
+        vacuumed_pages = 0
+        if before["auto_vacuum"] == "incremental" and before["free_ratio"] >= vacuum_free_ratio:
+            vacuumed_pages = self.vacuum()
+        checkpoint = self.checkpoint_wal("PASSIVE")
+        truncated = False
+        if before["wal_bytes"] >= truncate_wal_bytes:
+            checkpoint = self.checkpoint_wal("TRUNCATE", busy_timeout)
+            truncated = checkpoint["busy"] == 0
+        return {
+            "before": before,
+            "after": self.storage_stats(),
+            "checkpoint": checkpoint,
+            "truncated": truncated,
+            "vacuumed_pages": vacuumed_pages,
+            "purged": purged,
+            "pruned_tombstones": pruned_tombstones,
+        }
+
+    def _read_modify_write(self, name: str, modify) -> tuple[str, str | None]:
+        """Read a variable and write its new value atomically.
+
+        The transaction starts with ``BEGIN IMMEDIATE`` so the write lock is
+        held from the read onwards; no other writer can interleave and no
+        update is lost.
+
+        Parameters
+        ----------
+        name : str
+            Variable name (without the {{}} brackets)
+        modify : callable
+            ``modify(current_value)`` returning the new value, or None to
+            leave the variable unchanged. Runs while the write lock is held.
+
+        Returns
+        -------
+        tuple[str, str | None]
+            (previous value or empty string, new value or None if unchanged)
+        """
+        def _rmw_operation():
+            conn = self._connect()
+            with conn:
+                self._begin_write(conn)
+                return self._modify_value(conn, name, modify)
+
+        result = self._execute_with_retry(_rmw_operation, operation_name="read_modify_write")
+        self._invalidate_cache()
+        return result
+
+    def _modify_value(self, conn: sqlite3.Connection, name: str, modify) -> tuple[str, str | None]:
+        """Read a variable and write ``modify(current)`` inside an open write transaction.
+
+        Returns (previous value or empty string, new value or None if unchanged).
+        """
+        result = conn.execute(_GET_VALUE_EXPIRY_SQL, (name,)).fetchone()
+        current_value = _decode_value(*result[:3]) if result else ""
+        new_value = modify(current_value)
+        if new_value is not None:
+            # An update keeps the variable's expiry time
+            self._write_values(conn, [(name, new_value)], result[3] if result else None)
+        return current_value, new_value
+
+    def compare_and_set(self, name: str, expected: str, value: str) -> bool:
+        """Set a variable only if it currently holds the expected value.
+
+        Parameters
+        ----------
+        name : str
+            Variable name (without the {{}} brackets)
+        expected : str
+            Value the variable must hold; empty string matches a missing variable
+        value : str
+            New value to store
+
+        Returns
+        -------
+        bool
+            True if the value was stored, False if the current value differed
+        """
+        _, new_value = self._read_modify_write(
+            name, lambda current: value if current == expected else None
+        )
+        return new_value is not None
+
+    def increment(self, name: str, delta: int | float = 1) -> int | float:
+        """Add to a numeric variable atomically.
+
+        A missing or empty variable counts as 0. Integers stay integers unless
+        the variable or delta is a float.
+
+        Parameters
+        ----------
+        name : str
+            Variable name (without the {{}} brackets)
+        delta : int or float, optional
+            Amount to add, by default 1
+
+        Returns
+        -------
+        int or float
+            The new value
+
+        Raises
+        ------
+        ValueError
+            If the current value is not a number
+        """
+        total = 0
+
+        def _add(current: str) -> str:
+            nonlocal total
+            try:
+                number = int(current) if current else 0
+            except ValueError:
+                number = float(current)
+            total = number + delta
+            return str(total)
+
+        self._read_modify_write(name, _add)
+        return total
+
+    def update_variable(self, name: str, function) -> str:
+        """Replace a variable with ``function(current_value)`` atomically.
+
+        Parameters
+        ----------
+        name : str
+            Variable name (without the {{}} brackets)
+        function : callable
+            Receives the current value (empty string if missing) and returns the
+            new string value. It runs while the write lock is held, so keep it short.
+
+        Returns
+        -------
+        str
+            The new value
+        """
+        _, new_value = self._read_modify_write(name, function)
+        return new_value
+
+    def enable_history(self, max_versions: int = HISTORY_VERSIONS) -> None:
+        """Keep past revisions of every variable for get_variable(at=...) and get_history().
+
+        The setting is stored in the database, so writes from every process
+        and VariableDB instance record history from now on. Text revisions
+        are stored as line deltas against the next newer revision whenever
+        that is smaller than a compressed full copy. Calling it again changes
+        the retention and drops revisions beyond the new limit.
+
+        Parameters
+        ----------
+        max_versions : int, optional
+            Past revisions kept per variable, by default HISTORY_VERSIONS (100)
+
+        Raises
+        ------
+        ValueError
+            If max_versions is less than 1
+        """
+        if max_versions < 1:
+            raise ValueError("max_versions must be at least 1; use disable_history() to turn history off")
+
+        def _enable_operation():
+            conn = self._connect()
+            with conn:
+                self._begin_write(conn)
+                conn.execute(
+                    "INSERT OR REPLACE INTO variable_settings (key, value) VALUES ('history_versions', ?)",
+                    (max_versions,),
+                )
+                conn.execute(
+                    """
+                    DELETE FROM variable_history WHERE (name, seq) IN (
+                        SELECT name, seq FROM (
+                            SELECT name, seq, row_number() OVER (PARTITION BY name ORDER BY seq DESC) AS n
+                            FROM variable_history
+                        ) WHERE n > ?
+                    )
+                """,
+                    (max_versions,),
+                )
+
+        self._execute_with_retry(_enable_operation, operation_name="enable_history")
+
+    def disable_history(self) -> int:
+        """Stop recording history and delete all past revisions.
+
+        Returns
+        -------
+        int
+            Number of past revisions deleted
+        """
+        def _disable_operation():
+            conn = self._connect()
+            with conn:
+                self._begin_write(conn)
+                conn.execute("DELETE FROM variable_settings WHERE key = 'history_versions'")
+                return conn.execute("DELETE FROM variable_history").rowcount
+
+        return self._execute_with_retry(_disable_operation, operation_name="disable_history")
+
+    def get_history(self, name: str) -> list[dict]:
+        """Return the current and past revisions of a variable, newest first.
+
+        Parameters
+        ----------
+        name : str
+            Variable name (without the {{}} brackets)
+
+        Returns
+        -------
+        list[dict]
+            Revisions with seq, updated_at, value and deleted; value is None
+            for deletions. Only the current revision is listed while history
+            is disabled
+        """
+        def _history_operation():
+            conn = self._connect()
+            with conn:
+                conn.execute("BEGIN")
+                return [
+                    {"seq": seq, "updated_at": updated_at, "value": value, "deleted": value is None}
+                    for seq, updated_at, value in _iter_revisions(conn, name)
+                ]
+
+        return self._execute_with_retry(_history_operation)
+
+    def changes_since(self, seq: int = 0) -> list[dict]:
+        """Return variables created, updated or deleted after a change sequence number.
+
+        Only changed rows are read, through the seq indexes, so polling cost
+        scales with the change rate rather than the number of variables.
+        Pass the largest ``seq`` seen so far to receive the next batch;
+        ``changes_since(0)`` returns the full current state.
+
+        Parameters
+        ----------
+        seq : int, optional
+            Last change sequence number already processed, by default 0
+
+        Returns
+        -------
+        list[dict]
+            Changes in sequence order, each with seq, name, value and deleted.
+            value is None for deleted variables.
+        """
+        # Rows written by code that predates the seq column keep its default
+        # of 0; the full read from 0 must still include them
+        after = seq if seq > 0 else -1
+
+        def _changes_operation():
+            conn = self._connect()
+            cursor = conn.execute(
+                f"""
+                SELECT v.seq, v.name, v.value, v.storage, b.data FROM {_VALUE_SOURCE}
+                WHERE v.seq > ? AND {_NOT_EXPIRED}
+                UNION ALL
+                SELECT t.seq, t.name, NULL, NULL, NULL FROM variable_tombstones AS t
+                WHERE t.seq > ?
+                  AND NOT EXISTS (SELECT 1 FROM variables AS v WHERE v.name = t.name)
+                ORDER BY 1
+            """,
+                (after, after),
+            )
+            return [
+                {
+                    "seq": row_seq,
+                    "name": name,
+                    "value": None if value is None else _decode_value(value, storage, data),
+                    "deleted": value is None,
+                }
+                for row_seq, name, value, storage, data in cursor.fetchall()
+            ]
+
+        return self._execute_with_retry(_changes_operation)
+
+    def get_change_seq(self) -> int:
+        """Return the latest change sequence number (0 if nothing has changed yet).
+
+        Returns
+        -------
+        int
+            Sequence number of the most recent insert, update or delete
+        """
+        def _seq_operation():
+            conn = self._connect()
+            return conn.execute(f"SELECT {_NEXT_SEQ_SQL} - 1").fetchone()[0]
+
+        return self._execute_with_retry(_seq_operation)
+
+    def _change_paths(self) -> list[Path]:
+        """Return the files written by commits: the database and its WAL (none in RAM mode)."""
+        if self._memory_uri is not None:
+            return []
+        return [self.db_path, self.db_path.with_name(self.db_path.name + "-wal")]
+
+    def change_notifier(self, poll_interval: float = NOTIFY_POLL_INTERVAL) -> ChangeNotifier:
+        """Return a new ChangeNotifier for the files written by commits to this database.
+
+        In RAM mode commits write no file, so the notifier polls.
+        """
+        return ChangeNotifier(self._change_paths(), poll_interval)
+
+    def wait_for_changes(self, seq: int = 0, timeout: float | None = None) -> list[dict]:
+        """Block until variables change after a sequence number, then return the changes.
+
+        Instead of sleeping between changes_since() calls, the calling
+        thread sleeps until a commit writes the database (see
+        ChangeNotifier), so it reacts within milliseconds and costs no CPU
+        while nothing happens.
+
+        Parameters
+        ----------
+        seq : int, optional
+            Last sequence number already processed, by default 0
+        timeout : float, optional
+            Maximum seconds to wait, by default forever
+
+        Returns
+        -------
+        list[dict]
+            Changes as returned by changes_since(), or [] on timeout
+        """
+        notifier = getattr(self._local, "notifier", None)
+        if notifier is None or self._pid != os.getpid():
+            self._connect()  # resets per-thread state after fork()
+            notifier = self._local.notifier = self.change_notifier()
+            with self._connections_lock:
+                self._notifiers.append(notifier)
+        return _wait_for_changes(self.changes_since, notifier, seq, timeout)
+
+
+class VariableNamespace:
+    """Variables sharing a name prefix, addressed by their relative names.
+
+    Reads and deletions of the whole namespace are primary-key range scans,
+    so their cost depends on the number of variables in the namespace, not
+    in the database.
+    """
+
+    def __init__(self, db: VariableDB, prefix: str):
+        """Create a namespace view.
+
+        Parameters
+        ----------
+        db : VariableBackend
+            Database holding the variables (any backend with list_variables
+            and delete_prefix)
+        prefix : str
+            Full name prefix, including any separator (e.g. "agent_3_")
+        """
+        self.db = db
+        self.prefix = prefix
+
+    def namespace(self, name: str, separator: str = "_") -> "VariableNamespace":
+        """Return a nested namespace under ``name + separator``."""
+        return VariableNamespace(self.db, self.prefix + name + separator)
+
+    def save_variable(self, name: str, value: str) -> None:
+        """Save a variable in this namespace."""
+        self.db.save_variable(self.prefix + name, value)
+
+    def get_variable(self, name: str, at: int | str | datetime | None = None) -> str:
+        """Get a variable in this namespace, or empty string if not found."""
+        if at is None:
+            return self.db.get_variable(self.prefix + name)
+        return self.db.get_variable(self.prefix + name, at)
+
+    def delete_variable(self, name: str) -> bool:
+        """Delete a variable in this namespace."""
+        return self.db.delete_variable(self.prefix + name)
+
+    def save_variables(self, variables: dict[str, str]) -> None:
+        """Save several variables in this namespace in one transaction."""
+        self.db.save_variables({self.prefix + name: value for name, value in variables.items()})
+
+    def get_variables(self, names: list[str]) -> dict[str, str]:
+        """Get several variables in this namespace with one query."""
+        values = self.db.get_variables([self.prefix + name for name in names])
+        return {name: values[self.prefix + name] for name in names}
+
+    def list_variables(self, include_values: bool = True) -> dict[str, str] | list[str]:
+        """List the variables in this namespace by relative name."""
+        start = len(self.prefix)
+        result = self.db.list_variables(self.prefix, include_values)
+        if include_values:
+            return {name[start:]: value for name, value in result.items()}
+        return [name[start:] for name in result]
+
+    def clear(self) -> int:
+        """Delete every variable in this namespace and return how many were deleted."""
+        return self.db.delete_prefix(self.prefix)
+
+
+class ShardedVariableDB:
+    """Variables spread over several SQLite files, each with its own write lock.
+
+    SQLite allows one writer per database file, so agents writing different
+    variables to one ``variables.db`` still wait for each other. Here every
+    variable lives in exactly one shard file chosen from its name, and writes
+    to different shards proceed in parallel. Operations on one variable behave
+    exactly as in VariableDB; operations on several variables are atomic per
+    shard only, and the change sequence is counted per shard.
+
+    Shard files are named after ``db_path`` with the shard index before the
+    suffix (``variables.0.db``, ``variables.1.db``, ...). The layout is
+    recorded in every shard, and opening the shards with a different count
+    or routing raises ValueError, because variables would no longer be found.
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path = "variables.db",
+        shards: int = SHARD_COUNT,
+        route="hash",
+        separator: str = "_",
+        timeout: float = 30.0,
+        cache: bool = False,
+    ):
+        """Open (or create) the shard files.
+
+        Parameters
+        ----------
+        db_path : str or Path, optional
+            Base path from which shard file names are derived, by default "variables.db"
+        shards : int, optional
+            Number of shard files, by default SHARD_COUNT (4)
+        route : str or callable, optional
+            "hash" places each variable by a hash of its full name, spreading
+            writes evenly. "namespace" hashes the name without its last
+            ``separator``-delimited part, so agent_1_theme and agent_1_haiku
+            share a shard. A callable ``route(name) -> int`` chooses the shard
+            index itself. By default "hash"
+        separator : str, optional
+            Namespace separator for route="namespace", by default "_"
         timeout : float, optional
-            Database connection timeout in seconds, by default 30.0
+            Busy timeout in seconds for every shard, by default 30.0
+        cache : bool, optional
+            Enable the read cache of every shard, by default False
+
+        Raises
+        ------
+        ValueError
+            If the arguments are invalid or the shard files were created with
+            a different layout
         """
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        if not callable(route) and route not in ("hash", "namespace"):
+            raise ValueError(f"Unknown route: {route} (expected 'hash', 'namespace' or a callable)")
+
         self.db_path = Path(db_path)
-        self.timeout = timeout
-        self._init_database()
+        self.route = route
+        self.separator = separator
+        self.shards = [
+            VariableDB(self.db_path.with_name(f"{self.db_path.stem}.{index}{self.db_path.suffix}"), timeout, cache)
+            for index in range(shards)
+        ]
+        layout = "custom" if callable(route) else route
+        if route == "namespace":
+            layout += ":" + separator
+        for index, shard in enumerate(self.shards):
+            self._check_layout(shard, index, layout)
+        self._local = threading.local()
+        self._notifiers: list[ChangeNotifier] = []
 
-    def _init_database(self) -> None:
-        """Initialize the database schema and optimize for multi-process access."""
-        with sqlite3.connect(self.db_path, timeout=self.timeout) as conn:
-            # Enable WAL mode for better concurrency
-            conn.execute("PRAGMA journal_mode=WAL")
-            
-            # Optimize for multi-process access
-            conn.execute("PRAGMA synchronous=NORMAL")  # Balance safety/performance
-            conn.execute("PRAGMA cache_size=10000")    # Increase cache for performance
-            conn.execute("PRAGMA temp_store=memory")   # Use memory for temp storage
-            
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS variables (
-                    name TEXT PRIMARY KEY,
-                    value TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    def __enter__(self) -> "ShardedVariableDB":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _check_layout(self, shard: VariableDB, index: int, layout: str) -> None:
+        """Record the shard layout in a new shard file, or verify it in an existing one."""
+        expected = {"shard_index": index, "shard_count": len(self.shards), "shard_route": layout}
+
+        def _layout_operation():
+            conn = shard._connect()
+            placeholders = ", ".join("?" * len(expected))
+            cursor = conn.execute(f"SELECT key, value FROM variable_settings WHERE key IN ({placeholders})", list(expected))
+            recorded = dict(cursor.fetchall())
+            if recorded:
+                return recorded
+            with conn:
+                shard._begin_write(conn)
+                conn.executemany(
+                    "INSERT OR IGNORE INTO variable_settings (key, value) VALUES (?, ?)", expected.items()
                 )
-            """)
+                return dict(conn.execute(
+                    f"SELECT key, value FROM variable_settings WHERE key IN ({placeholders})", list(expected)
+                ).fetchall())
 
-            # Create trigger to update timestamp on value changes
-            conn.execute("""
-                CREATE TRIGGER IF NOT EXISTS update_timestamp 
-                AFTER UPDATE ON variables
-                BEGIN
-                    UPDATE variables 
-                    SET updated_at = CURRENT_TIMESTAMP 
-                    WHERE name = NEW.name;
-                END
-            """)
-            conn.commit()
+        recorded = shard._execute_with_retry(_layout_operation, operation_name="shard_layout")
+        if recorded != expected:
+            raise ValueError(
+                f"{shard.db_path} belongs to a layout with {recorded.get('shard_count')} shards "
+                f"routed by {recorded.get('shard_route')!r} (shard {recorded.get('shard_index')}), "
+                f"not {len(self.shards)} shards routed by {layout!r}"
+            )
+
+    def close(self) -> None:
+        """Close the connections and change notifiers of every shard."""
+        for shard in self.shards:
+            shard.close()
+        notifiers, self._notifiers = self._notifiers, []
+        for notifier in notifiers:
+            notifier.close()
+        self._local = threading.local()
+
+    def shard_index(self, name: str) -> int:
+        """Return the index of the shard that stores a variable."""
+        if callable(self.route):
+            return self.route(name) % len(self.shards)
+        key = name.rsplit(self.separator, 1)[0] if self.route == "namespace" else name
+        # crc32 rather than hash(): string hashes differ between processes
+        return zlib.crc32(key.encode("utf-8")) % len(self.shards)
+
+    def shard_for(self, name: str) -> VariableDB:
+        """Return the shard that stores a variable."""
+        return self.shards[self.shard_index(name)]
+
+    def _group(self, names) -> dict[int, list[str]]:
+        """Group variable names by shard index."""
+        groups: dict[int, list[str]] = {}
+        for name in names:
+            groups.setdefault(self.shard_index(name), []).append(name)
+        return groups
+
+    def save_variable(self, name: str, value: str, ttl: float | None = None) -> None:
+        """Save or update a variable in its shard, optionally expiring after ttl seconds."""
+        self.shard_for(name).save_variable(name, value, ttl)
+
+    def get_variable(self, name: str, at: int | str | datetime | None = None) -> str:
+        """Retrieve a variable value, or empty string if not found.
+
+        ``at`` as a change sequence number refers to the sequence of the
+        variable's own shard (see VariableDB.get_variable).
+        """
+        return self.shard_for(name).get_variable(name, at)
+
+    def get_variable_info(self, name: str) -> dict[str, str] | None:
+        """Return name, value, created_at and updated_at of a variable, or None."""
+        return self.shard_for(name).get_variable_info(name)
+
+    def get_variable_range(self, name: str, offset: int = 0, length: int | None = None) -> str:
+        """Return part of a variable value (see VariableDB.get_variable_range)."""
+        return self.shard_for(name).get_variable_range(name, offset, length)
+
+    def delete_variable(self, name: str) -> bool:
+        """Delete a variable and return whether it existed."""
+        return self.shard_for(name).delete_variable(name)
+
+    def save_variables(self, variables: dict[str, str], ttl: float | None = None) -> None:
+        """Save several variables with one transaction per shard involved."""
+        for index, names in self._group(variables).items():
+            self.shards[index].save_variables({name: variables[name] for name in names}, ttl)
+
+    def get_variables(self, names: list[str]) -> dict[str, str]:
+        """Retrieve several variables with one query per shard involved."""
+        values = {}
+        for index, shard_names in self._group(names).items():
+            values.update(self.shards[index].get_variables(shard_names))
+        return {name: values[name] for name in names}
+
+    def delete_variables(self, names: list[str]) -> int:
+        """Delete several variables and return how many were deleted."""
+        return sum(self.shards[index].delete_variables(shard_names) for index, shard_names in self._group(names).items())
+
+    def list_variables(self, prefix: str = "", include_values: bool = True) -> dict[str, str] | list[str]:
+        """List variables of all shards, merged and sorted by name.
 
-    def _execute_with_retry(self, operation, max_retries: int = 3):
-        """Execute database operation with retry logic for concurrent access.
-        
         Parameters
         ----------
-        operation : callable
-            Database operation to execute
-        max_retries : int, optional
-            Maximum number of retry attempts, by default 3
-            
+        prefix : str, optional
+            Only list names starting with this prefix, by default all variables
+        include_values : bool, optional
+            If False, return only the sorted names, by default True
+
         Returns
         -------
-        Any
-            Result of the operation
-            
-        Raises
-        ------
-        sqlite3.OperationalError
-            If operation fails after all retries
+        Dict[str, str] or List[str]
+            Variable names and values, or just the names
         """
-        for attempt in range(max_retries):
-            try:
-                return operation()
-            except sqlite3.OperationalError as e:
-                error_msg = str(e).lower()
-                if ("database is locked" in error_msg or "database is busy" in error_msg) and attempt < max_retries - 1:
-                    # Exponential backoff with jitter
-                    wait_time = random.uniform(0.05, 0.15) * (2 ** attempt)
-                    time.sleep(wait_time)
-                    continue
-                # Re-raise if not a locking issue or final attempt
-                raise
-    
-    def save_variable(self, name: str, value: str) -> None:
-        """Save or update a variable in the database.
+        if not include_values:
+            return sorted(itertools.chain.from_iterable(
+                shard.list_variables(prefix, include_values=False) for shard in self.shards
+            ))
+        variables = {}
+        for shard in self.shards:
+            variables.update(shard.list_variables(prefix))
+        return dict(sorted(variables.items()))
 
-        This method replaces the JSON file save operation from CLAUDE.md.
-        When a user requests "{{variable_name}}にVALUEを保存してください",
-        this method handles the storage.
+    def delete_prefix(self, prefix: str) -> int:
+        """Delete all variables whose names start with a prefix, in every shard."""
+        return sum(shard.delete_prefix(prefix) for shard in self.shards)
 
-        Parameters
-        ----------
-        name : str
-            Variable name (without the {{}} brackets)
-        value : str
-            Variable value to store
-        """
-        def _save_operation():
-            with sqlite3.connect(self.db_path, timeout=self.timeout) as conn:
-                conn.execute(
-                    """
-                    INSERT OR REPLACE INTO variables (name, value, updated_at)
-                    VALUES (?, ?, CURRENT_TIMESTAMP)
-                """,
-                    (name, value),
-                )
-                conn.commit()
-        
-        self._execute_with_retry(_save_operation)
+    def clear_all(self) -> int:
+        """Delete all variables in every shard and return how many were deleted."""
+        return sum(shard.clear_all() for shard in self.shards)
 
-    def get_variable(self, name: str) -> str:
-        """Retrieve a variable value from the database.
+    def namespace(self, name: str, separator: str = "_") -> VariableNamespace:
+        """Return a view of the variables named ``name + separator + ...``."""
+        return VariableNamespace(self, name + separator)
 
-        This method replaces the JSON file read operation from CLAUDE.md.
-        When a user requests "{{variable_name}}を取得してください",
-        this method handles the retrieval.
+    # Built on get_variables, exactly as in VariableDB
+    render = VariableDB.render
+
+    def compare_and_set(self, name: str, expected: str, value: str) -> bool:
+        """Set a variable only if it currently holds the expected value."""
+        return self.shard_for(name).compare_and_set(name, expected, value)
+
+    def increment(self, name: str, delta: int | float = 1) -> int | float:
+        """Add to a numeric variable atomically and return the new value."""
+        return self.shard_for(name).increment(name, delta)
+
+    def update_variable(self, name: str, function) -> str:
+        """Atomically replace a variable with function(value) and return the new value."""
+        return self.shard_for(name).update_variable(name, function)
+
+    def save_array(self, name: str, values, typecode: str | None = None) -> None:
+        """Save a numeric array as packed binary (see VariableDB.save_array)."""
+        self.shard_for(name).save_array(name, values, typecode)
+
+    def get_array(self, name: str, as_numpy: bool = False):
+        """Return an array saved by save_array (see VariableDB.get_array)."""
+        return self.shard_for(name).get_array(name, as_numpy)
+
+    def get_history(self, name: str) -> list[dict]:
+        """Return the current and past revisions of a variable, newest first."""
+        return self.shard_for(name).get_history(name)
+
+    def enable_history(self, max_versions: int = HISTORY_VERSIONS) -> None:
+        """Keep past revisions in every shard (see VariableDB.enable_history)."""
+        for shard in self.shards:
+            shard.enable_history(max_versions)
+
+    def disable_history(self) -> int:
+        """Stop recording history in every shard and return the number of revisions deleted."""
+        return sum(shard.disable_history() for shard in self.shards)
+
+    def _shard_seqs(self, seq) -> list[int]:
+        """Return per-shard sequence numbers from a change cursor (an int applies to every shard)."""
+        if seq is None:
+            return [0] * len(self.shards)
+        if isinstance(seq, int):
+            return [seq] * len(self.shards)
+        if len(seq) != len(self.shards):
+            raise ValueError(f"Change cursor has {len(seq)} sequence numbers, expected {len(self.shards)}")
+        return list(seq)
+
+    def changes_since(self, seq: ChangeCursor | None = 0) -> list[dict]:
+        """Return changes of all shards after a change cursor.
+
+        The cursor holds one sequence number per shard, because every shard
+        counts its own changes. It can be used like VariableDB's scalar seq:
+        pass back get_change_seq() or the ``seq`` of the last change
+        processed, or 0 for the full state.
 
         Parameters
         ----------
-        name : str
-            Variable name (without the {{}} brackets)
+        seq : int or tuple[int, ...], optional
+            Cursor as returned by get_change_seq() or in a change's ``seq``
+            (a list is accepted too); an int applies to every shard, so 0
+            (the default) returns the full state
 
         Returns
         -------
-        str
-            Variable value, or empty string if not found
+        list[dict]
+            Changes as returned by VariableDB.changes_since, ordered by shard
+            and then by shard sequence number. Each also has ``shard`` (its
+            index) and ``shard_seq`` (the shard's own sequence number), and
+            its ``seq`` is the cursor just after it
         """
-        def _get_operation():
-            with sqlite3.connect(self.db_path, timeout=self.timeout) as conn:
-                cursor = conn.execute("SELECT value FROM variables WHERE name = ?", (name,))
-                result = cursor.fetchone()
-                return result[0] if result else ""
-        
-        return self._execute_with_retry(_get_operation)
+        seqs = self._shard_seqs(seq)
+        per_shard = [shard.changes_since(shard_seq) for shard, shard_seq in zip(self.shards, seqs)]
+        # Shards after the current one stay at their old position until their
+        # changes come, so resuming from any change's cursor misses nothing
+        cursor = list(seqs)
+        changes = []
+        for index, shard_changes in enumerate(per_shard):
+            for change in shard_changes:
+                cursor[index] = change["seq"]
+                change["shard"] = index
+                change["shard_seq"] = change["seq"]
+                change["seq"] = tuple(cursor)
+                changes.append(change)
+        return changes
 
-    def list_variables(self) -> dict[str, str]:
-        """List all variables in the database.
+    def get_change_seq(self) -> tuple[int, ...]:
+        """Return the change cursor: the latest change sequence number of every shard."""
+        return tuple(shard.get_change_seq() for shard in self.shards)
 
-        Returns
-        -------
-        Dict[str, str]
-            Dictionary mapping variable names to their values
+    def change_notifier(self, poll_interval: float = NOTIFY_POLL_INTERVAL) -> ChangeNotifier:
+        """Return a new ChangeNotifier for the files of every shard."""
+        return ChangeNotifier([path for shard in self.shards for path in shard._change_paths()], poll_interval)
+
+    def wait_for_changes(self, seq: ChangeCursor | None = 0, timeout: float | None = None) -> list[dict]:
+        """Block until any shard changes after a change cursor (see VariableDB.wait_for_changes)."""
+        notifier = getattr(self._local, "notifier", None)
+        if notifier is None:
+            notifier = self._local.notifier = self.change_notifier()
+            self._notifiers.append(notifier)
+        return _wait_for_changes(self.changes_since, notifier, seq, timeout)
+
+    def lock_stats(self) -> dict[str, dict[str, int | float]]:
+        """Return write-lock contention statistics summed over all shards."""
+        totals: dict[str, dict[str, int | float]] = {}
+        for shard in self.shards:
+            for operation, stats in shard.lock_stats().items():
+                total = totals.setdefault(operation, dict.fromkeys(stats, 0))
+                for key, value in stats.items():
+                    total[key] = max(total[key], value) if key == "max_wait" else total[key] + value
+        return dict(sorted(totals.items()))
+
+    def maintain(self, **kwargs) -> list[dict]:
+        """Run VariableDB.maintain() on every shard and return the reports."""
+        return [shard.maintain(**kwargs) for shard in self.shards]
+
+    def purge_expired(
+        self, batch_size: int = PURGE_BATCH_SIZE, tombstone_retention: float | None = TOMBSTONE_RETENTION
+    ) -> int:
+        """Delete expired variables (and old tombstones) in every shard and return how many variables were deleted."""
+        return sum(shard.purge_expired(batch_size, tombstone_retention) for shard in self.shards)
+
+    def prune_tombstones(self, older_than: float = TOMBSTONE_RETENTION, batch_size: int = PURGE_BATCH_SIZE) -> int:
+        """Delete old tombstones in every shard and return how many were deleted."""
+        return sum(shard.prune_tombstones(older_than, batch_size) for shard in self.shards)
+
+    def storage_stats(self) -> list[dict[str, int | float | str]]:
+        """Return VariableDB.storage_stats() of every shard."""
+        return [shard.storage_stats() for shard in self.shards]
+
+    def flush(self, force: bool = False) -> bool:
+        """Flush every shard (see VariableDB.flush) and return whether any file was written."""
+        return any([shard.flush(force) for shard in self.shards])
+
+    def _snapshot_paths(self, path: str | Path) -> list[Path]:
+        """Return one snapshot file per shard, named like the shard files (snap.0.db, snap.1.db, ...)."""
+        path = Path(path)
+        return [path.with_name(f"{path.stem}.{index}{path.suffix}") for index in range(len(self.shards))]
+
+    def snapshot(self, path: str | Path, pages: int = _BACKUP_PAGES) -> None:
+        """Copy every shard to its own snapshot file derived from ``path``.
+
+        Each file is a consistent image of its shard, but the shards are
+        copied one after another, not at a single point in time.
         """
-        def _list_operation():
-            with sqlite3.connect(self.db_path, timeout=self.timeout) as conn:
-                cursor = conn.execute("SELECT name, value FROM variables ORDER BY name")
-                return dict(cursor.fetchall())
-        
-        return self._execute_with_retry(_list_operation)
+        for shard, shard_path in zip(self.shards, self._snapshot_paths(path)):
+            shard.snapshot(shard_path, pages)
 
-    def delete_variable(self, name: str) -> bool:
-        """Delete a variable from the database.
+    def restore(self, path: str | Path) -> int:
+        """Restore every shard from the snapshot files written by snapshot(path).
 
-        Parameters
-        ----------
-        name : str
-            Variable name to delete
+        Returns the number of variables after the restore. Raises
+        FileNotFoundError before changing anything if a shard's file is missing.
+        """
+        paths = self._snapshot_paths(path)
+        for shard_path in paths:
+            if not shard_path.exists():
+                raise FileNotFoundError(f"Snapshot not found: {shard_path}")
+        return sum(shard.restore(shard_path) for shard, shard_path in zip(self.shards, paths))
 
-        Returns
-        -------
-        bool
-            True if variable was deleted, False if it didn't exist
+    def create_checkpoint(self, name: str) -> int:
+        """Save a named checkpoint in every shard and return the number of variables saved."""
+        return sum(shard.create_checkpoint(name) for shard in self.shards)
+
+    def restore_checkpoint(self, name: str) -> int:
+        """Restore a named checkpoint in every shard and return the number of variables after the restore.
+
+        Raises KeyError before changing anything if a shard lacks the checkpoint.
         """
-        def _delete_operation():
-            with sqlite3.connect(self.db_path, timeout=self.timeout) as conn:
-                cursor = conn.execute("DELETE FROM variables WHERE name = ?", (name,))
-                conn.commit()
-                return cursor.rowcount > 0
-        
-        return self._execute_with_retry(_delete_operation)
+        for shard in self.shards:
+            if name not in shard.list_checkpoints():
+                raise KeyError(f"Checkpoint not found in {shard.db_path}: {name}")
+        return sum(shard.restore_checkpoint(name) for shard in self.shards)
 
-    def clear_all(self) -> int:
-        """Clear all variables from the database.
+    def list_checkpoints(self) -> dict[str, str]:
+        """List the checkpoints present in every shard, with their creation time in the first shard."""
+        checkpoints = self.shards[0].list_checkpoints()
+        for shard in self.shards[1:]:
+            names = shard.list_checkpoints()
+            checkpoints = {name: created for name, created in checkpoints.items() if name in names}
+        return checkpoints
 
-        Returns
-        -------
-        int
-            Number of variables that were deleted
+    def delete_checkpoint(self, name: str) -> bool:
+        """Delete a named checkpoint from every shard and return whether any shard had it."""
+        return any([shard.delete_checkpoint(name) for shard in self.shards])
+
+
+class InMemoryVariableDB:
+    """Variables in a Python dict: the fastest backend, with nothing persisted.
+
+    Meant for tests and single-process orchestrators. The variables are
+    visible only within this process and are lost when it exits. Every
+    operation holds one lock, so threads can share an instance.
+    """
+
+    def __init__(self):
+        """Create an empty variable store."""
+        self._lock = threading.RLock()
+        # Notified on every write and deletion, for wait_for_changes()
+        self._changed = threading.Condition(self._lock)
+        # name -> (value, seq, created_at, updated_at)
+        self._variables: dict[str, tuple[str, int, str, str]] = {}
+        # name -> seq of the deletion
+        self._tombstones: dict[str, int] = {}
+        self._seq = 0
+
+    def __enter__(self) -> "InMemoryVariableDB":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Nothing to release; present for interface compatibility."""
+
+    def _write(self, name: str, value: str) -> None:
+        """Store a value under the next change sequence number (lock held)."""
+        # Same format and time zone as SQLite's CURRENT_TIMESTAMP
+        now = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+        self._seq += 1
+        previous = self._variables.get(name)
+        self._variables[name] = (value, self._seq, previous[2] if previous else now, now)
+        self._tombstones.pop(name, None)
+        self._changed.notify_all()
+
+    def _delete(self, name: str) -> bool:
+        """Delete a variable and record its tombstone (lock held)."""
+        if self._variables.pop(name, None) is None:
+            return False
+        self._seq += 1
+        self._tombstones[name] = self._seq
+        self._changed.notify_all()
+        return True
+
+    def save_variable(self, name: str, value: str) -> None:
+        """Save or update a variable."""
+        with self._lock:
+            self._write(name, value)
+
+    def get_variable(self, name: str, at: int | str | datetime | None = None) -> str:
+        """Retrieve a variable value, or empty string if not found.
+
+        Raises ValueError if ``at`` is given: no history is kept.
         """
-        def _clear_operation():
-            with sqlite3.connect(self.db_path, timeout=self.timeout) as conn:
-                cursor = conn.execute("DELETE FROM variables")
-                conn.commit()
-                return cursor.rowcount
-        
-        return self._execute_with_retry(_clear_operation)
+        if at is not None:
+            raise ValueError("InMemoryVariableDB keeps no history; get_variable(at=...) needs the sqlite backend")
+        entry = self._variables.get(name)
+        return entry[0] if entry else ""
 
     def get_variable_info(self, name: str) -> dict[str, str] | None:
-        """Get detailed information about a variable.
+        """Return name, value, created_at and updated_at of a variable, or None."""
+        entry = self._variables.get(name)
+        if entry is None:
+            return None
+        return {"name": name, "value": entry[0], "created_at": entry[2], "updated_at": entry[3]}
 
-        Parameters
-        ----------
-        name : str
-            Variable name
+    def list_variables(self, prefix: str = "", include_values: bool = True) -> dict[str, str] | list[str]:
+        """List variables whose names start with a prefix, sorted by name."""
+        with self._lock:
+            names = sorted(name for name in self._variables if name.startswith(prefix))
+            if include_values:
+                return {name: self._variables[name][0] for name in names}
+            return names
 
-        Returns
-        -------
-        Optional[Dict[str, str]]
-            Dictionary with name, value, created_at, updated_at, or None if not found
-        """
-        def _info_operation():
-            with sqlite3.connect(self.db_path, timeout=self.timeout) as conn:
-                cursor = conn.execute(
-                    """
-                    SELECT name, value, created_at, updated_at 
-                    FROM variables WHERE name = ?
-                """,
-                    (name,),
-                )
-                result = cursor.fetchone()
-                if result:
-                    return {
-                        "name": result[0],
-                        "value": result[1],
-                        "created_at": result[2],
-                        "updated_at": result[3],
-                    }
-                return None
-        
-        return self._execute_with_retry(_info_operation)
+    def delete_variable(self, name: str) -> bool:
+        """Delete a variable and return whether it existed."""
+        with self._lock:
+            return self._delete(name)
+
+    def save_variables(self, variables: dict[str, str]) -> None:
+        """Save or update several variables atomically."""
+        with self._lock:
+            for name, value in variables.items():
+                self._write(name, value)
+
+    def get_variables(self, names: list[str]) -> dict[str, str]:
+        """Retrieve several variables; missing ones map to empty string."""
+        with self._lock:
+            return {name: self.get_variable(name) for name in names}
+
+    def delete_variables(self, names: list[str]) -> int:
+        """Delete several variables atomically and return how many existed."""
+        with self._lock:
+            return sum(self._delete(name) for name in dict.fromkeys(names))
+
+    def delete_prefix(self, prefix: str) -> int:
+        """Delete all variables whose names start with a prefix."""
+        with self._lock:
+            return self.delete_variables(self.list_variables(prefix, include_values=False))
+
+    def clear_all(self) -> int:
+        """Delete all variables and return how many were deleted."""
+        return self.delete_prefix("")
+
+    def namespace(self, name: str, separator: str = "_") -> VariableNamespace:
+        """Return a view of the variables named ``name + separator + ...``."""
+        return VariableNamespace(self, name + separator)
+
+    # Built on get_variables, exactly as in VariableDB
+    render = VariableDB.render
+
+    def _read_modify_write(self, name: str, modify) -> tuple[str, str | None]:
+        """Apply ``modify`` to the current value under the lock (see VariableDB)."""
+        with self._lock:
+            current = self.get_variable(name)
+            new_value = modify(current)
+            if new_value is not None:
+                self._write(name, new_value)
+            return current, new_value
+
+    # Built on _read_modify_write, exactly as in VariableDB
+    compare_and_set = VariableDB.compare_and_set
+    increment = VariableDB.increment
+    update_variable = VariableDB.update_variable
+
+    def changes_since(self, seq: int = 0) -> list[dict]:
+        """Return variables created, updated or deleted after a change sequence number."""
+        with self._lock:
+            changes = [
+                {"seq": entry[1], "name": name, "value": entry[0], "deleted": False}
+                for name, entry in self._variables.items()
+                if entry[1] > seq
+            ]
+            changes += [
+                {"seq": deleted_seq, "name": name, "value": None, "deleted": True}
+                for name, deleted_seq in self._tombstones.items()
+                if deleted_seq > seq
+            ]
+        return sorted(changes, key=lambda change: change["seq"])
+
+    def get_change_seq(self) -> int:
+        """Return the latest change sequence number (0 if nothing has changed yet)."""
+        return self._seq
+
+    def wait_for_changes(self, seq: int = 0, timeout: float | None = None) -> list[dict]:
+        """Block until variables change after a sequence number, then return the changes ([] on timeout)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while self._seq <= seq:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return []
+                self._changed.wait(remaining)
+            return self.changes_since(seq)
+
+
+def open_variable_db(backend: str | None = None, **options) -> VariableBackend:
+    """Open the variable store selected by argument or configuration.
+
+    Parameters
+    ----------
+    backend : str, optional
+        "sqlite" (VariableDB, or ShardedVariableDB if a ``shards`` option or
+        VARIABLE_DB_SHARDS is given), "memory" (InMemoryVariableDB), "log"
+        (LogVariableDB from log_variable_db.py) or "mongodb" (MongoVariables
+        from mongo/mongo_variables.py); "log" and "mongodb" must be
+        importable. By default the VARIABLE_DB_BACKEND environment variable,
+        otherwise "sqlite"
+    **options
+        Keyword arguments for the backend's constructor, e.g. db_path and
+        timeout for SQLite or connection_string for MongoDB
+
+    Returns
+    -------
+    VariableBackend
+        The opened backend
+
+    Raises
+    ------
+    ValueError
+        If the backend name is unknown
+    """
+    if backend is None:
+        backend = os.environ.get(BACKEND_ENV_VAR) or "sqlite"
+    if backend == "sqlite":
+        shards = options.pop("shards", None) or os.environ.get(SHARDS_ENV_VAR)
+        if shards:
+            return ShardedVariableDB(shards=int(shards), **options)
+        return VariableDB(**options)
+    if backend == "memory":
+        return InMemoryVariableDB(**options)
+    if backend == "log":
+        from log_variable_db import LogVariableDB
+
+        return LogVariableDB(**options)
+    if backend == "mongodb":
+        from mongo_variables import MongoVariables
+
+        return MongoVariables(**options)
+    raise ValueError(f"Unknown backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+
+# Registered first so that it runs last, after the lock statistics are saved
+@atexit.register
+def _flush_all_memory_databases() -> None:
+    """Write in-memory databases that have a flush interval back to their files at exit."""
+    for db in list(_open_databases):
+        if db.mode == "ram" and db.flush_interval is not None and db._pid == os.getpid():
+            try:
+                db.flush()
+            except FlushConflictError as e:
+                print(f"VariableDB: not flushed at exit: {e}", file=sys.stderr)
+
+
+@atexit.register
+def _save_all_lock_stats() -> None:
+    """Write the unsaved contention counters of every open instance at exit."""
+    for db in list(_open_databases):
+        db._save_lock_stats()
 
 
 # Convenience functions for direct use
-_default_db = VariableDB()
+_default_db: VariableBackend | None = None
+
+
+def _get_default_db() -> VariableBackend:
+    """Return the default database instance, creating it on first use.
+
+    The backend follows VARIABLE_DB_BACKEND and VARIABLE_DB_SHARDS (see
+    open_variable_db); by default it is a VariableDB for "variables.db".
+    """
+    global _default_db
+    if _default_db is None:
+        _default_db = open_variable_db()
+    return _default_db
+
+
+def _backend_operation(name: str):
+    """Return a method of the default database, or fail clearly if its backend lacks it.
+
+    Every backend provides the VariableBackend operations. The others (TTLs,
+    atomic updates, snapshots, arrays, history, maintenance, ...) exist only
+    in the SQLite backends, and the module-level functions built on them
+    raise NotImplementedError instead of AttributeError elsewhere.
+    """
+    db = _get_default_db()
+    operation = getattr(db, name, None)
+    if operation is None:
+        raise NotImplementedError(
+            f"{name}() is not supported by the {type(db).__name__} backend "
+            f"(selected with {BACKEND_ENV_VAR}); use the sqlite backend"
+        )
+    return operation
+
+
+def _ttl_backend() -> "VariableDB | ShardedVariableDB":
+    """Return the default database, failing clearly if its backend does not support TTLs."""
+    db = _get_default_db()
+    if not isinstance(db, (VariableDB, ShardedVariableDB)):
+        raise NotImplementedError(
+            f"ttl is not supported by the {type(db).__name__} backend "
+            f"(selected with {BACKEND_ENV_VAR}); use the sqlite backend"
+        )
+    return db
+
+
+def save_variable(name: str, value: str, ttl: float | None = None) -> None:
+    """Save a variable (optionally expiring after ttl seconds) using the default database instance."""
+    if ttl is None:
+        _get_default_db().save_variable(name, value)
+    else:
+        _ttl_backend().save_variable(name, value, ttl)
+
+
+def get_variable(name: str, at: int | str | datetime | None = None) -> str:
+    """Get a variable (optionally as of a past change or time) using the default database instance."""
+    if at is None:
+        return _get_default_db().get_variable(name)
+    return _get_default_db().get_variable(name, at)
 
 
-def save_variable(name: str, value: str) -> None:
-    """Save a variable using the default database instance."""
-    _default_db.save_variable(name, value)
+def list_variables(prefix: str = "", include_values: bool = True) -> dict[str, str] | list[str]:
+    """List all variables (optionally by name prefix) using the default database instance."""
+    return _get_default_db().list_variables(prefix, include_values)
 
 
-def get_variable(name: str) -> str:
-    """Get a variable using the default database instance."""
-    return _default_db.get_variable(name)
+def delete_prefix(prefix: str) -> int:
+    """Delete all variables with a name prefix using the default database instance."""
+    return _backend_operation("delete_prefix")(prefix)
 
 
-def list_variables() -> dict[str, str]:
-    """List all variables using the default database instance."""
-    return _default_db.list_variables()
+def namespace(name: str, separator: str = "_") -> VariableNamespace:
+    """Get a namespace view of the default database instance."""
+    return _backend_operation("namespace")(name, separator)
 
 
 def delete_variable(name: str) -> bool:
     """Delete a variable using the default database instance."""
-    return _default_db.delete_variable(name)
+    return _get_default_db().delete_variable(name)
+
+
+def save_variables(variables: dict[str, str], ttl: float | None = None) -> None:
+    """Save several variables (optionally expiring after ttl seconds) in one transaction using the default database instance."""
+    if ttl is None:
+        _get_default_db().save_variables(variables)
+    else:
+        _ttl_backend().save_variables(variables, ttl)
+
+
+def get_variables(names: list[str]) -> dict[str, str]:
+    """Get several variables in one query using the default database instance."""
+    return _get_default_db().get_variables(names)
+
+
+def render(text: str, **params) -> str:
+    """Resolve the {{variable}} placeholders of a template using the default database instance.
+
+    Keyword arguments take precedence over variables, e.g.
+    ``render(template, AGENT_ID=3)``; variables that are not set keep their
+    placeholder (see VariableDB.render).
+    """
+    return _render_template(_get_default_db().get_variables, text, params)
+
+
+def delete_variables(names: list[str]) -> int:
+    """Delete several variables in one transaction using the default database instance."""
+    return _get_default_db().delete_variables(names)
+
+
+def changes_since(seq: ChangeCursor = 0) -> list[dict]:
+    """Get changes after a sequence number using the default database instance."""
+    return _get_default_db().changes_since(seq)
+
+
+def get_change_seq() -> ChangeCursor:
+    """Get the latest change sequence number using the default database instance."""
+    return _get_default_db().get_change_seq()
+
+
+def wait_for_changes(seq: ChangeCursor = 0, timeout: float | None = None) -> list[dict]:
+    """Wait for changes after a sequence number using the default database instance."""
+    return _get_default_db().wait_for_changes(seq, timeout)
+
+
+def purge_expired() -> int:
+    """Delete expired variables using the default database instance."""
+    return _backend_operation("purge_expired")()
+
+
+def compare_and_set(name: str, expected: str, value: str) -> bool:
+    """Conditionally set a variable using the default database instance."""
+    return _backend_operation("compare_and_set")(name, expected, value)
+
+
+def increment(name: str, delta: int | float = 1) -> int | float:
+    """Atomically add to a numeric variable using the default database instance."""
+    return _backend_operation("increment")(name, delta)
+
+
+def update_variable(name: str, function) -> str:
+    """Atomically replace a variable with function(value) using the default database instance."""
+    return _backend_operation("update_variable")(name, function)
+
+
+def get_variable_range(name: str, offset: int = 0, length: int | None = None) -> str:
+    """Read part of a variable value using the default database instance."""
+    return _backend_operation("get_variable_range")(name, offset, length)
+
+
+def lock_stats() -> dict[str, dict[str, int | float]]:
+    """Get write-lock contention counters using the default database instance."""
+    return _backend_operation("lock_stats")()
+
+
+def snapshot(path: str | Path) -> None:
+    """Copy the default database to a snapshot file."""
+    _backend_operation("snapshot")(path)
+
+
+def restore(path: str | Path) -> int:
+    """Restore the default database's variables from a snapshot file."""
+    return _backend_operation("restore")(path)
+
+
+def create_checkpoint(name: str) -> int:
+    """Save the current variables as a named checkpoint in the default database."""
+    return _backend_operation("create_checkpoint")(name)
+
+
+def restore_checkpoint(name: str) -> int:
+    """Restore the variables of a named checkpoint in the default database."""
+    return _backend_operation("restore_checkpoint")(name)
+
+
+def list_checkpoints() -> dict[str, str]:
+    """List the checkpoints of the default database."""
+    return _backend_operation("list_checkpoints")()
+
+
+def delete_checkpoint(name: str) -> bool:
+    """Delete a named checkpoint from the default database."""
+    return _backend_operation("delete_checkpoint")(name)
+
+
+def save_array(name: str, values, typecode: str | None = None) -> None:
+    """Save a numeric array as packed binary using the default database instance."""
+    _backend_operation("save_array")(name, values, typecode)
+
+
+def get_array(name: str, as_numpy: bool = False):
+    """Get an array saved by save_array using the default database instance."""
+    return _backend_operation("get_array")(name, as_numpy)
+
+
+def enable_history(max_versions: int = HISTORY_VERSIONS) -> None:
+    """Start keeping past revisions using the default database instance."""
+    _backend_operation("enable_history")(max_versions)
+
+
+def disable_history() -> int:
+    """Stop keeping past revisions using the default database instance."""
+    return _backend_operation("disable_history")()
+
+
+def get_history(name: str) -> list[dict]:
+    """Get the revisions of a variable using the default database instance."""
+    return _backend_operation("get_history")(name)
+
+
+def maintain(
+    truncate_wal_bytes: int = WAL_TRUNCATE_BYTES,
+    vacuum_free_ratio: float = VACUUM_FREE_RATIO,
+) -> dict:
+    """Run checkpoint and vacuum maintenance using the default database instance."""
+    return _backend_operation("maintain")(truncate_wal_bytes=truncate_wal_bytes, vacuum_free_ratio=vacuum_free_ratio)
+
+
+def storage_stats() -> dict[str, int | float | str]:
+    """Report file sizes and free pages using the default database instance."""
+    return _backend_operation("storage_stats")()
+
+
+def flush(force: bool = False) -> bool:
+    """Write the in-memory database back to its file using the default database instance."""
+    return _backend_operation("flush")(force)
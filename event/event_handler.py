@@ -6,7 +6,7 @@ Watch 'user_status' variable and execute simple macro when it changes.
 
 import time
 import subprocess
-from variable_db import get_variable, save_variable, VariableDB
+from variable_db import get_change_seq, get_variable, save_variable, wait_for_changes, VariableDB
 
 # Watch this specific variable  
 WATCH_VARIABLE = "user_status"
@@ -20,6 +20,7 @@ VariableDB().clear_all()
 # (2) Set initial value
 save_variable(WATCH_VARIABLE, "inactive")
 print(f"🔍 Now watching variable: {WATCH_VARIABLE}")
+last_seq = get_change_seq()
 last_value = get_variable(WATCH_VARIABLE)
 print(f"📊 Initial value: '{last_value}'")
 print("=" * 40)
@@ -35,15 +36,19 @@ def run_macro():
 
 try:
     while True:
-        current_value = get_variable(WATCH_VARIABLE)
+        # Sleeps until variables.db is written, then reads only the changed rows
+        changes = wait_for_changes(last_seq)
+        current_value = last_value
+        for change in changes:
+            last_seq = change["seq"]
+            if change["name"] == WATCH_VARIABLE:
+                current_value = change["value"] or ""
         
         if current_value != last_value:
             print("event detected")
             run_macro()
             last_value = current_value
             print("-" * 40)
-        
-        time.sleep(0.1)
 
 except KeyboardInterrupt:
     print("\n🛑 Event monitoring stopped")
\ No newline at end of file
@@ -6,7 +6,7 @@ Practical example of A.15 Python Orchestration-Based Hybrid Approach
 
 import subprocess
 import concurrent.futures
-from variable_db import save_variable, VariableDB
+from variable_db import render, save_variable, VariableDB
 
 
 def run_macro(macro_file):
@@ -25,7 +25,9 @@ def create_agent_macro(agent_id):
     with open('agent_template.md', 'r', encoding='utf-8') as f:
         template = f.read()
     
-    content = template.replace('{{AGENT_ID}}', str(agent_id))
+    # Resolve {{AGENT_ID}} and the variables that already exist (e.g. the theme)
+    # in one query; placeholders of variables saved later stay in the macro
+    content = render(template, AGENT_ID=agent_id)
     filename = f'agents/agent_{agent_id}.md'
     
     with open(filename, 'w', encoding='utf-8') as f:
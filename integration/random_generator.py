@@ -2,7 +2,7 @@
 """Simple random number generator for natural language macro programming."""
 
 import random
-from variable_db import get_variable, save_variable
+from variable_db import get_variable, save_array
 
 
 def main():
@@ -14,12 +14,11 @@ def main():
     
     # Generate random numbers
     numbers = [round(random.uniform(min_val, max_val), 1) for _ in range(count)]
-    data_str = ",".join(map(str, numbers))
     
-    # Save result to variables
-    save_variable("data_values", data_str)
+    # Save result as a packed array; "Get {{data_values}}" still returns "1.5,2.3,..."
+    save_array("data_values", numbers, "d")
     
-    print(f"Generated {count} random numbers: {data_str}")
+    print(f"Generated {count} random numbers: {','.join(map(str, numbers))}")
 
 
 if __name__ == "__main__":
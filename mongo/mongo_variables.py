@@ -10,19 +10,27 @@ Key Features:
 - variables.json compatible interface
 - Automatic error handling and fallback mechanisms
 - High performance with proper indexing
+- Same interface as SQLite's VariableDB (the VariableBackend protocol in
+  variable_db.py), including bulk operations and a change feed, so it can be
+  selected with VARIABLE_DB_BACKEND=mongodb without changing macros or watchers
 """
 
-from pymongo import MongoClient, errors
+from pymongo import MongoClient, ReturnDocument, UpdateOne, errors
 from pymongo.collection import Collection
 from datetime import datetime
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Union
 import json
 import os
+import re
+import time
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Seconds between change sequence checks in wait_for_changes()
+CHANGE_POLL_INTERVAL = 0.1
+
 
 class MongoVariables:
     """
@@ -48,6 +56,8 @@ class MongoVariables:
         self.collection_name = collection_name
         self._client: Optional[MongoClient] = None
         self._collection: Optional[Collection] = None
+        self._tombstones: Optional[Collection] = None
+        self._counters: Optional[Collection] = None
         
         # Initialize connection and setup
         self._connect()
@@ -74,6 +84,9 @@ class MongoVariables:
             # Get database and collection
             db = self._client[self.database_name]
             self._collection = db[self.collection_name]
+            # Deleted variables and the change sequence counter, for changes_since()
+            self._tombstones = db[f"{self.collection_name}_tombstones"]
+            self._counters = db["variable_counters"]
             
             logger.info(f"Successfully connected to MongoDB: {self.database_name}.{self.collection_name}")
             return True
@@ -97,19 +110,66 @@ class MongoVariables:
             self._collection.create_index("name", unique=True)
             logger.debug("Created unique index on 'name' field")
             
+            # Change feed lookups by sequence number
+            self._collection.create_index("seq")
+            self._tombstones.create_index("name", unique=True)
+            self._tombstones.create_index("seq")
+            
         except Exception as e:
             logger.warning(f"Failed to create indexes: {e}")
     
-    def get_variable(self, name: str) -> str:
+    def _require_collection(self) -> Collection:
+        """
+        Return the variables collection, or raise if MongoDB is not connected.
+        
+        Returns:
+            Collection: The variables collection
+            
+        Raises:
+            ConnectionError: If the connection to MongoDB failed
+        """
+        if self._collection is None:
+            raise ConnectionError("MongoDB collection not available")
+        return self._collection
+    
+    def _next_seq(self, count: int = 1) -> int:
+        """
+        Reserve change sequence numbers.
+        
+        Numbers are reserved before the write they belong to, so with several
+        concurrent writers a change can become visible after one with a
+        higher number.
+        
+        Args:
+            count: How many consecutive numbers to reserve
+            
+        Returns:
+            int: The last reserved number
+        """
+        doc = self._counters.find_one_and_update(
+            {"_id": self.collection_name},
+            {"$inc": {"seq": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return doc["seq"]
+    
+    def get_variable(self, name: str, at: Optional[Union[int, str, datetime]] = None) -> str:
         """
         Retrieve a variable value by name.
         
         Args:
             name: Variable name
+            at: Past change or time to read; not supported (no history is kept)
             
         Returns:
             str: Variable value, or empty string if not found
+            
+        Raises:
+            ValueError: If at is given
         """
+        if at is not None:
+            raise ValueError("MongoVariables keeps no history; get_variable(at=...) needs the sqlite backend")
         if self._collection is None:
             logger.error("MongoDB collection not available")
             return ""
@@ -130,54 +190,210 @@ class MongoVariables:
             logger.error(f"Failed to retrieve variable '{name}': {e}")
             return ""
     
-    def set_variable(self, name: str, value: str) -> bool:
+    def save_variable(self, name: str, value: str) -> None:
         """
-        Set a variable value, creating or updating as needed.
+        Save a variable value, creating or updating as needed.
         
         Args:
             name: Variable name
             value: Variable value (will be converted to string)
             
-        Returns:
-            bool: True if operation successful, False otherwise
+        Raises:
+            ConnectionError: If MongoDB is not connected
+            pymongo.errors.PyMongoError: If the write fails
         """
-        if self._collection is None:
-            logger.error("MongoDB collection not available")
-            return False
-        
-        # Convert value to string to maintain compatibility with variables.json
-        str_value = str(value)
+        self.save_variables({name: value})
+    
+    def save_variables(self, variables: Dict[str, str]) -> None:
+        """
+        Save several variables with one bulk write.
         
-        try:
-            # Use upsert for atomic create-or-update operation
-            current_time = datetime.utcnow()
+        Args:
+            variables: Dictionary of variable name -> value pairs
             
-            result = self._collection.find_one_and_update(
+        Raises:
+            ConnectionError: If MongoDB is not connected
+            pymongo.errors.PyMongoError: If the write fails
+        """
+        collection = self._require_collection()
+        if not variables:
+            return
+        
+        last_seq = self._next_seq(len(variables))
+        current_time = datetime.utcnow()
+        # Use upserts for atomic create-or-update operations
+        operations = [
+            UpdateOne(
                 {"name": name},
                 {
                     "$set": {
-                        "value": str_value,
+                        # Convert value to string to maintain compatibility with variables.json
+                        "value": str(value),
+                        "seq": seq,
                         "updated_at": current_time
                     },
                     "$setOnInsert": {
                         "created_at": current_time
                     }
                 },
-                upsert=True,
-                return_document=True
+                upsert=True
             )
+            for seq, (name, value) in enumerate(variables.items(), last_seq - len(variables) + 1)
+        ]
+        collection.bulk_write(operations)
+        logger.debug(f"Saved {len(variables)} variables")
+    
+    def set_variable(self, name: str, value: str) -> bool:
+        """
+        Set a variable value, creating or updating as needed.
+        
+        Kept for existing callers; errors are logged instead of raised.
+        
+        Args:
+            name: Variable name
+            value: Variable value (will be converted to string)
             
-            if result:
-                logger.info(f"Set variable '{name}' = '{str_value}'")
-                return True
-            else:
-                logger.error(f"Failed to set variable '{name}'")
-                return False
+        Returns:
+            bool: True if operation successful, False otherwise
+        """
+        if self._collection is None:
+            logger.error("MongoDB collection not available")
+            return False
+        
+        try:
+            self.save_variable(name, value)
+            logger.info(f"Set variable '{name}' = '{value}'")
+            return True
                 
         except Exception as e:
             logger.error(f"Failed to set variable '{name}': {e}")
             return False
     
+    def get_variables(self, names: List[str]) -> Dict[str, str]:
+        """
+        Retrieve several variables with one query.
+        
+        Args:
+            names: Variable names
+            
+        Returns:
+            dict: Variable name -> value, with empty string for missing variables
+        """
+        collection = self._require_collection()
+        cursor = collection.find({"name": {"$in": list(names)}}, {"name": 1, "value": 1, "_id": 0})
+        values = {doc["name"]: doc.get("value", "") for doc in cursor}
+        return {name: values.get(name, "") for name in names}
+    
+    def _delete_names(self, names: List[str]) -> int:
+        """
+        Delete variables and record a tombstone for each one.
+        
+        Args:
+            names: Names of existing variables
+            
+        Returns:
+            int: Number of variables deleted
+        """
+        if not names:
+            return 0
+        
+        last_seq = self._next_seq(len(names))
+        current_time = datetime.utcnow()
+        self._tombstones.bulk_write([
+            UpdateOne({"name": name}, {"$set": {"seq": seq, "deleted_at": current_time}}, upsert=True)
+            for seq, name in enumerate(names, last_seq - len(names) + 1)
+        ])
+        return self._collection.delete_many({"name": {"$in": names}}).deleted_count
+    
+    def delete_variables(self, names: List[str]) -> int:
+        """
+        Delete several variables.
+        
+        Args:
+            names: Variable names
+            
+        Returns:
+            int: Number of variables that existed and were deleted
+        """
+        collection = self._require_collection()
+        existing = [doc["name"] for doc in collection.find({"name": {"$in": list(names)}}, {"name": 1})]
+        return self._delete_names(existing)
+    
+    def clear_all(self) -> int:
+        """
+        Delete all variables.
+        
+        Returns:
+            int: Number of variables deleted
+            
+        Raises:
+            ConnectionError: If MongoDB is not connected
+        """
+        return self._delete_names(self._require_collection().distinct("name"))
+    
+    def changes_since(self, seq: int = 0) -> List[Dict[str, Any]]:
+        """
+        Return variables created, updated or deleted after a change sequence number.
+        
+        Args:
+            seq: Last change sequence number already processed (0 = full current state)
+            
+        Returns:
+            list: Changes in sequence order, each with seq, name, value and deleted
+                  (value is None for deleted variables)
+        """
+        collection = self._require_collection()
+        # Variables saved before change sequence numbers existed have no seq field
+        query = {"seq": {"$gt": seq}} if seq else {}
+        changes = [
+            {"seq": doc.get("seq", 0), "name": doc["name"], "value": doc.get("value", ""), "deleted": False}
+            for doc in collection.find(query, {"name": 1, "value": 1, "seq": 1, "_id": 0})
+        ]
+        tombstones = list(self._tombstones.find({"seq": {"$gt": seq}}, {"name": 1, "seq": 1, "_id": 0}))
+        if tombstones:
+            recreated = {
+                doc["name"]
+                for doc in collection.find({"name": {"$in": [t["name"] for t in tombstones]}}, {"name": 1})
+            }
+            changes += [
+                {"seq": t["seq"], "name": t["name"], "value": None, "deleted": True}
+                for t in tombstones if t["name"] not in recreated
+            ]
+        return sorted(changes, key=lambda change: change["seq"])
+    
+    def get_change_seq(self) -> int:
+        """
+        Return the latest change sequence number.
+        
+        Returns:
+            int: Latest change sequence number (0 if nothing has changed yet)
+        """
+        self._require_collection()
+        doc = self._counters.find_one({"_id": self.collection_name})
+        return doc["seq"] if doc else 0
+    
+    def wait_for_changes(self, seq: int = 0, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Block until variables change after a change sequence number.
+        
+        The sequence counter is polled every CHANGE_POLL_INTERVAL seconds, which
+        works on standalone servers (change streams need a replica set).
+        
+        Args:
+            seq: Last change sequence number already processed
+            timeout: Maximum seconds to wait (None = forever)
+            
+        Returns:
+            list: Changes as returned by changes_since, or [] on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.get_change_seq() <= seq:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return []
+            time.sleep(CHANGE_POLL_INTERVAL if remaining is None else min(CHANGE_POLL_INTERVAL, remaining))
+        return self.changes_since(seq)
+    
     def delete_variable(self, name: str) -> bool:
         """
         Delete a variable.
@@ -186,42 +402,49 @@ class MongoVariables:
             name: Variable name
             
         Returns:
-            bool: True if deleted or didn't exist, False on error
+            bool: True if the variable existed and was deleted, False otherwise
         """
         if self._collection is None:
             logger.error("MongoDB collection not available")
             return False
         
         try:
-            result = self._collection.delete_one({"name": name})
+            deleted = self.delete_variables([name]) > 0
             
-            if result.deleted_count > 0:
+            if deleted:
                 logger.info(f"Deleted variable '{name}'")
             else:
                 logger.debug(f"Variable '{name}' not found for deletion")
             
-            return True
+            return deleted
             
         except Exception as e:
             logger.error(f"Failed to delete variable '{name}': {e}")
             return False
     
-    def list_variables(self) -> Dict[str, str]:
+    def list_variables(self, prefix: str = "", include_values: bool = True) -> Union[Dict[str, str], List[str]]:
         """
         List all variables as a dictionary (variables.json compatible format).
         
+        Args:
+            prefix: Only list names starting with this prefix (default: all variables)
+            include_values: If False, return only the sorted names
+            
         Returns:
-            dict: Dictionary of variable name -> value pairs
+            dict: Dictionary of variable name -> value pairs sorted by name,
+                  or a list of names if include_values is False
         """
         if self._collection is None:
             logger.error("MongoDB collection not available")
-            return {}
+            return {} if include_values else []
         
         try:
             variables = {}
             
-            # Retrieve all variable documents
-            cursor = self._collection.find({}, {"name": 1, "value": 1, "_id": 0})
+            # Anchored prefix regexes are answered from the name index
+            query = {"name": {"$regex": "^" + re.escape(prefix)}} if prefix else {}
+            projection = {"name": 1, "value": 1, "_id": 0} if include_values else {"name": 1, "_id": 0}
+            cursor = self._collection.find(query, projection).sort("name", 1)
             
             for doc in cursor:
                 name = doc.get("name", "")
@@ -230,11 +453,11 @@ class MongoVariables:
                     variables[name] = value
             
             logger.debug(f"Listed {len(variables)} variables")
-            return variables
+            return variables if include_values else list(variables)
             
         except Exception as e:
             logger.error(f"Failed to list variables: {e}")
-            return {}
+            return {} if include_values else []
     
     def variable_exists(self, name: str) -> bool:
         """
@@ -349,6 +572,8 @@ class MongoVariables:
         """
         Clear all variables from the database.
         
+        Kept for existing callers; errors are logged instead of raised.
+        
         Returns:
             int: Number of variables deleted, or -1 on error
         """
@@ -357,8 +582,7 @@ class MongoVariables:
             return -1
         
         try:
-            result = self._collection.delete_many({})
-            deleted_count = result.deleted_count
+            deleted_count = self.clear_all()
             
             logger.info(f"Cleared {deleted_count} variables from database")
             return deleted_count
@@ -453,4 +677,25 @@ def clear_all_variables() -> int:
     Returns:
         int: Number of variables deleted, or -1 on error
     """
-    return get_mongo_variables().clear_all_variables()
\ No newline at end of file
+    return get_mongo_variables().clear_all_variables()
+
+
+def save_variable(name: str, value: str) -> None:
+    """
+    Convenience function to save a variable value (same name as in variable_db.py).
+    
+    Args:
+        name: Variable name
+        value: Variable value
+    """
+    get_mongo_variables().save_variable(name, value)
+
+
+def clear_all() -> int:
+    """
+    Convenience function to delete all variables (same name as in variable_db.py).
+    
+    Returns:
+        int: Number of variables deleted
+    """
+    return get_mongo_variables().clear_all()
@@ -0,0 +1,124 @@
+"""Schema migration tests for schema/variable_db.py and SQLite/variable_db.py.
+
+Both modules are named variable_db and keep a table named ``variables`` with
+incompatible layouts, so they are loaded from their files under distinct names.
+Run with ``python -m pytest schema``.
+"""
+
+import importlib.util
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _load(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+typed_db = _load("typed_variable_db", ROOT / "schema" / "variable_db.py")
+plain_db = _load("plain_variable_db", ROOT / "SQLite" / "variable_db.py")
+
+
+@pytest.fixture(autouse=True)
+def _no_schema_file(tmp_path, monkeypatch):
+    """Use the built-in type definitions instead of a test_schema.json in the working directory."""
+    monkeypatch.chdir(tmp_path)
+
+
+def _baseline(db_path, typed):
+    """Create a database the way the baseline modules did: no user_version, self-updating trigger."""
+    type_column = "type_name TEXT," if typed else ""
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(f"""
+            CREATE TABLE variables (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                {type_column}
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.execute("""
+            CREATE TRIGGER update_timestamp AFTER UPDATE ON variables
+            BEGIN
+                UPDATE variables SET updated_at = CURRENT_TIMESTAMP WHERE name = NEW.name;
+            END
+        """)
+        conn.execute("INSERT INTO variables (name, value, created_at) VALUES ('theme', 'spring', '2000-01-01 00:00:00')")
+    conn.close()
+
+
+def _triggers(db_path):
+    with sqlite3.connect(db_path) as conn:
+        names = [name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")]
+    conn.close()
+    return names
+
+
+def _created_at(db_path, name):
+    with sqlite3.connect(db_path) as conn:
+        created_at = conn.execute("SELECT created_at FROM variables WHERE name = ?", (name,)).fetchone()[0]
+    conn.close()
+    return created_at
+
+
+def test_slots_do_not_overlap():
+    assert typed_db.SCHEMA_SLOT_TYPED_VARIABLES not in (plain_db.SCHEMA_SLOT_VARIABLES, plain_db.SCHEMA_SLOT_AUDIT)
+
+
+@pytest.mark.parametrize("typed", [True, False], ids=["typed", "plain"])
+def test_baseline_upgrade_drops_trigger_and_keeps_created_at(tmp_path, typed):
+    db_path = tmp_path / "baseline.db"
+    _baseline(db_path, typed)
+    module = typed_db if typed else plain_db
+
+    db = module.VariableDB(db_path)
+    assert "update_timestamp" not in _triggers(db_path)
+    db.save_variable("theme", "autumn")
+    assert db.get_variable("theme") == "autumn"
+    assert _created_at(db_path, "theme") == "2000-01-01 00:00:00"
+    db.close()
+
+
+def test_typed_module_refuses_plain_layout(tmp_path):
+    db_path = tmp_path / "plain.db"
+    plain_db.VariableDB(db_path).close()
+
+    with pytest.raises(sqlite3.DatabaseError, match="untyped variables table"):
+        typed_db.VariableDB(db_path)
+    # The file is left as it was
+    with plain_db.VariableDB(db_path) as db:
+        db.save_variable("theme", "spring")
+        assert db.get_variable("theme") == "spring"
+
+
+def test_plain_module_refuses_typed_layout(tmp_path):
+    db_path = tmp_path / "typed.db"
+    with typed_db.VariableDB(db_path) as db:
+        db.save_variable("age", "30", "age")
+
+    with pytest.raises(sqlite3.DatabaseError, match="typed variables table"):
+        plain_db.VariableDB(db_path)
+    with typed_db.VariableDB(db_path) as db:
+        assert db.get_variable("age") == "30"
+
+
+def test_typed_file_from_shared_slot_is_adopted(tmp_path):
+    # Earlier versions recorded the typed schema in slot 0, shared with SQLite/variable_db.py
+    db_path = tmp_path / "typed.db"
+    with typed_db.VariableDB(db_path) as db:
+        db.save_variable("age", "30", "age")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(f"PRAGMA user_version = {typed_db.SCHEMA_VERSION}")
+    conn.close()
+
+    with typed_db.VariableDB(db_path) as db:
+        assert db.get_variable("age") == "30"
+    with pytest.raises(sqlite3.DatabaseError, match="typed variables table"):
+        plain_db.VariableDB(db_path)
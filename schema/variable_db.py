@@ -4,7 +4,9 @@ This module provides schema validation for natural language macro programming.
 It demonstrates core concepts of type safety in a simple, understandable way.
 """
 
+import os
 import sqlite3
+import threading
 import time
 import random
 import json
@@ -12,6 +14,26 @@ from pathlib import Path
 from typing import Any, Union
 
 
+# Schema version of the typed variables table, recorded in PRAGMA user_version
+SCHEMA_VERSION = 2
+
+# user_version byte used by the typed variables table. The plain variables table
+# of SQLite/variable_db.py uses slots 0 and 1, and its layout is incompatible.
+SCHEMA_SLOT_TYPED_VARIABLES = 2
+
+# Insert a variable or update it in place, preserving created_at
+_UPSERT_SQL = """
+    INSERT INTO variables (name, value, type_name, created_at, updated_at)
+    VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+    ON CONFLICT(name) DO UPDATE SET value = excluded.value,
+                                    type_name = excluded.type_name,
+                                    updated_at = excluded.updated_at
+"""
+
+# Connections inherited across fork(); kept alive so they are never closed by the child
+_inherited_connections: list[sqlite3.Connection] = []
+
+
 class SchemaValidationError(Exception):
     """Exception raised when schema validation fails."""
     pass
@@ -39,9 +61,77 @@ class VariableDB:
         """
         self.db_path = Path(db_path)
         self.timeout = timeout
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._pid = os.getpid()
         self._init_schemas()
         self._init_database()
 
+    def __enter__(self) -> "VariableDB":
+        """Support ``with VariableDB(...) as db:`` usage."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        """Close all connections when leaving the ``with`` block."""
+        self.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return the persistent connection for the calling thread.
+
+        Connections are opened lazily, one per thread, and reused for every
+        subsequent operation so that the page cache and per-connection PRAGMAs
+        stay warm. After ``fork()`` the child discards the parent's connections
+        and opens its own.
+
+        Returns
+        -------
+        sqlite3.Connection
+            Connection owned by the current thread and process
+        """
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+            # These PRAGMAs are per-connection, so apply them on every new connection
+            conn.execute("PRAGMA synchronous=NORMAL")  # Balance safety/performance
+            conn.execute("PRAGMA cache_size=10000")    # Increase cache for performance
+            conn.execute("PRAGMA temp_store=memory")   # Use memory for temp storage
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _reset_after_fork(self) -> None:
+        """Forget connections inherited from the parent process.
+
+        SQLite connections must not be used across ``fork()``. The inherited
+        objects are kept referenced rather than closed, because closing them
+        from the child could interfere with the parent's file locks.
+        """
+        _inherited_connections.extend(self._connections)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def close(self) -> None:
+        """Close every connection opened by this instance.
+
+        The instance remains usable; the next operation opens a new connection.
+        """
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+            return
+
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
     def _init_schemas(self) -> None:
         """Initialize schema definitions from external JSON file."""
         schema_file = Path("test_schema.json")
@@ -106,35 +196,79 @@ class VariableDB:
 
     def _init_database(self) -> None:
         """Initialize the database schema."""
-        with sqlite3.connect(self.db_path, timeout=self.timeout) as conn:
-            # Enable WAL mode for better concurrency
-            conn.execute("PRAGMA journal_mode=WAL")
-            conn.execute("PRAGMA synchronous=NORMAL")
-            conn.execute("PRAGMA cache_size=10000")
-            conn.execute("PRAGMA temp_store=memory")
-            
-            # Variables table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS variables (
-                    name TEXT PRIMARY KEY,
-                    value TEXT NOT NULL,
-                    type_name TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            # Update trigger
-            conn.execute("""
-                CREATE TRIGGER IF NOT EXISTS update_timestamp 
-                AFTER UPDATE ON variables
-                BEGIN
-                    UPDATE variables 
-                    SET updated_at = CURRENT_TIMESTAMP 
-                    WHERE name = NEW.name;
-                END
-            """)
-            conn.commit()
+        self._ensure_schema(SCHEMA_SLOT_TYPED_VARIABLES, SCHEMA_VERSION, self._create_schema)
+
+    def _create_schema(self, conn: sqlite3.Connection, current_version: int) -> None:
+        """Create the typed variables table and migrate older schema versions.
+
+        Parameters
+        ----------
+        conn : sqlite3.Connection
+            Connection with an open write transaction
+        current_version : int
+            Schema version recorded in the database (0 if never initialized)
+
+        Raises
+        ------
+        sqlite3.DatabaseError
+            If the file holds the variables table of SQLite/variable_db.py
+        """
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(variables)")}
+        if columns and "type_name" not in columns:
+            raise sqlite3.DatabaseError(
+                f"{self.db_path} holds the untyped variables table of SQLite/variable_db.py; open it with that module"
+            )
+
+        # Variables table
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS variables (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                type_name TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        if current_version < 2:
+            # Earlier versions kept updated_at current with a self-updating trigger;
+            # writes now set both timestamps in a single UPSERT instead
+            conn.execute("DROP TRIGGER IF EXISTS update_timestamp")
+
+    def _ensure_schema(self, slot: int, version: int, create_schema) -> None:
+        """Run ``create_schema`` only if the recorded schema version is out of date.
+
+        ``PRAGMA user_version`` holds one 8-bit schema version per slot, so
+        each component that owns tables can version them independently in
+        the same file. When every version is current, initialization costs a
+        single PRAGMA read and no write transaction.
+
+        Parameters
+        ----------
+        slot : int
+            Byte position of this component's version within user_version
+        version : int
+            Schema version the component expects (1-255)
+        create_schema : callable
+            ``create_schema(conn, current_version)`` creating or migrating tables
+        """
+        shift = 8 * slot
+        conn = self._connect()
+        if (conn.execute("PRAGMA user_version").fetchone()[0] >> shift) & 0xFF >= version:
+            return
+
+        # Enable WAL mode for better concurrency (persistent, cannot run inside a transaction)
+        conn.execute("PRAGMA journal_mode=WAL")
+
+        with conn:
+            # Take the write lock first so concurrent initializers run one at a time
+            conn.execute("BEGIN IMMEDIATE")
+            user_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            current_version = (user_version >> shift) & 0xFF
+            if current_version < version:
+                create_schema(conn, current_version)
+                user_version = (user_version & ~(0xFF << shift)) | (version << shift)
+                conn.execute(f"PRAGMA user_version = {user_version}")
 
     def _execute_with_retry(self, operation, max_retries: int = 3):
         """Execute database operation with retry logic."""
@@ -250,15 +384,9 @@ class VariableDB:
             value_str = value
         
         def _save_operation():
-            with sqlite3.connect(self.db_path, timeout=self.timeout) as conn:
-                conn.execute(
-                    """
-                    INSERT OR REPLACE INTO variables (name, value, type_name, updated_at)
-                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-                    """,
-                    (name, value_str, type_name),
-                )
-                conn.commit()
+            conn = self._connect()
+            with conn:
+                conn.execute(_UPSERT_SQL, (name, value_str, type_name))
         
         self._execute_with_retry(_save_operation)
 
@@ -276,10 +404,9 @@ class VariableDB:
             Variable value, or empty string if not found
         """
         def _get_operation():
-            with sqlite3.connect(self.db_path, timeout=self.timeout) as conn:
-                cursor = conn.execute("SELECT value FROM variables WHERE name = ?", (name,))
-                result = cursor.fetchone()
-                return result[0] if result else ""
+            conn = self._connect()
+            result = conn.execute("SELECT value FROM variables WHERE name = ?", (name,)).fetchone()
+            return result[0] if result else ""
         
         return self._execute_with_retry(_get_operation)
 
@@ -299,26 +426,25 @@ class VariableDB:
             (converted_value, type_name) or (string_value, None) if no type
         """
         def _get_operation():
-            with sqlite3.connect(self.db_path, timeout=self.timeout) as conn:
-                cursor = conn.execute(
-                    "SELECT value, type_name FROM variables WHERE name = ?", 
-                    (name,)
-                )
-                result = cursor.fetchone()
-                if not result:
-                    return "", None
-                
-                value, type_name = result
-                if type_name is None:
-                    return value, None
-                
-                # Convert value back to proper type
-                try:
-                    converted_value = self._validate_value(value, type_name)
-                    return converted_value, type_name
-                except SchemaValidationError:
-                    # If validation fails, return as string with error indication
-                    return f"[VALIDATION_ERROR] {value}", type_name
+            conn = self._connect()
+            result = conn.execute(
+                "SELECT value, type_name FROM variables WHERE name = ?", 
+                (name,)
+            ).fetchone()
+            if not result:
+                return "", None
+            
+            value, type_name = result
+            if type_name is None:
+                return value, None
+            
+            # Convert value back to proper type
+            try:
+                converted_value = self._validate_value(value, type_name)
+                return converted_value, type_name
+            except SchemaValidationError:
+                # If validation fails, return as string with error indication
+                return f"[VALIDATION_ERROR] {value}", type_name
         
         return self._execute_with_retry(_get_operation)
 
@@ -331,9 +457,9 @@ class VariableDB:
             Dictionary mapping variable names to their string values
         """
         def _list_operation():
-            with sqlite3.connect(self.db_path, timeout=self.timeout) as conn:
-                cursor = conn.execute("SELECT name, value FROM variables ORDER BY name")
-                return dict(cursor.fetchall())
+            conn = self._connect()
+            cursor = conn.execute("SELECT name, value FROM variables ORDER BY name")
+            return dict(cursor.fetchall())
         
         return self._execute_with_retry(_list_operation)
 
@@ -346,9 +472,9 @@ class VariableDB:
             Dictionary mapping variable names to (value, type_name)
         """
         def _list_operation():
-            with sqlite3.connect(self.db_path, timeout=self.timeout) as conn:
-                cursor = conn.execute("SELECT name, value, type_name FROM variables ORDER BY name")
-                return {name: (value, type_name) for name, value, type_name in cursor.fetchall()}
+            conn = self._connect()
+            cursor = conn.execute("SELECT name, value, type_name FROM variables ORDER BY name")
+            return {name: (value, type_name) for name, value, type_name in cursor.fetchall()}
         
         return self._execute_with_retry(_list_operation)
 
@@ -407,50 +533,57 @@ class VariableDB:
     def delete_variable(self, name: str) -> bool:
         """Delete a variable from the database."""
         def _delete_operation():
-            with sqlite3.connect(self.db_path, timeout=self.timeout) as conn:
+            conn = self._connect()
+            with conn:
                 cursor = conn.execute("DELETE FROM variables WHERE name = ?", (name,))
-                conn.commit()
-                return cursor.rowcount > 0
+            return cursor.rowcount > 0
         
         return self._execute_with_retry(_delete_operation)
 
     def clear_all(self) -> int:
         """Clear all variables from the database."""
         def _clear_operation():
-            with sqlite3.connect(self.db_path, timeout=self.timeout) as conn:
+            conn = self._connect()
+            with conn:
                 cursor = conn.execute("DELETE FROM variables")
-                conn.commit()
-                return cursor.rowcount
+            return cursor.rowcount
         
         return self._execute_with_retry(_clear_operation)
 
     def get_variable_info(self, name: str) -> dict[str, str] | None:
         """Get detailed information about a variable."""
         def _info_operation():
-            with sqlite3.connect(self.db_path, timeout=self.timeout) as conn:
-                cursor = conn.execute(
-                    """
-                    SELECT name, value, type_name, created_at, updated_at 
-                    FROM variables WHERE name = ?
-                    """,
-                    (name,),
-                )
-                result = cursor.fetchone()
-                if result:
-                    return {
-                        "name": result[0],
-                        "value": result[1],
-                        "type_name": result[2] or "untyped",
-                        "created_at": result[3],
-                        "updated_at": result[4],
-                    }
-                return None
+            conn = self._connect()
+            result = conn.execute(
+                """
+                SELECT name, value, type_name, created_at, updated_at 
+                FROM variables WHERE name = ?
+                """,
+                (name,),
+            ).fetchone()
+            if result:
+                return {
+                    "name": result[0],
+                    "value": result[1],
+                    "type_name": result[2] or "untyped",
+                    "created_at": result[3],
+                    "updated_at": result[4],
+                }
+            return None
         
         return self._execute_with_retry(_info_operation)
 
 
 # Convenience functions for direct use
-_default_db = VariableDB()
+_default_db: VariableDB | None = None
+
+
+def _get_default_db() -> VariableDB:
+    """Return the default database instance, creating it on first use."""
+    global _default_db
+    if _default_db is None:
+        _default_db = VariableDB()
+    return _default_db
 
 
 def save_variable(name: str, value: str, type_name: str = None) -> None:
@@ -465,29 +598,29 @@ def save_variable(name: str, value: str, type_name: str = None) -> None:
     type_name : str, optional
         Type name for validation. If None, saves without validation.
     """
-    _default_db.save_variable(name, value, type_name)
+    _get_default_db().save_variable(name, value, type_name)
 
 
 def get_variable(name: str) -> str:
     """Get a variable using the default database instance."""
-    return _default_db.get_variable(name)
+    return _get_default_db().get_variable(name)
 
 
 def get_variable_typed(name: str) -> tuple[Any, str | None]:
     """Get a typed variable using the default database instance."""
-    return _default_db.get_variable_typed(name)
+    return _get_default_db().get_variable_typed(name)
 
 
 def list_variables() -> dict[str, str]:
     """List all variables using the default database instance."""
-    return _default_db.list_variables()
+    return _get_default_db().list_variables()
 
 
 def validate_all() -> dict[str, bool | str]:
     """Validate all variables using the default database instance."""
-    return _default_db.validate_all()
+    return _get_default_db().validate_all()
 
 
 def delete_variable(name: str) -> bool:
     """Delete a variable using the default database instance."""
-    return _default_db.delete_variable(name)
\ No newline at end of file
+    return _get_default_db().delete_variable(name)
\ No newline at end of file